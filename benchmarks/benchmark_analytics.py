@@ -0,0 +1,57 @@
+# Compares aggregations over a numpy snapshot of statistics with the same loops over Book objects.
+# Run from the repository root: python -m benchmarks.benchmark_analytics
+
+import os
+import tempfile
+from reading_statistics.Database import Database
+from reading_statistics.analytics import get_snapshot, moving_average, percentiles, speed_trend, totals_by, histogram
+from reading_statistics.sqlite import create_tables, iter_books_info
+from .common import timed
+
+ROWS = 1000000
+
+
+def fill(rows: int):
+    Database.connection.exec_driver_sql("insert into authors (author_id, name) values (1, 'Author')")
+    Database.connection.exec_driver_sql(
+        "insert into series (series_id, name, author_id) values (1, 'Series', 1)")
+    Database.connection.exec_driver_sql(
+        f"with recursive n(i) as (select 1 union all select i + 1 from n where i < {rows}) insert into books (isbn, series_id, title) select i, 1, 'Title ' || i from n")
+    Database.connection.exec_driver_sql(
+        f"with recursive n(i) as (select 1 union all select i + 1 from n where i < {rows}) insert into statistics (isbn, chapters, pages, released, finished, speed, time) select i, 10 + i % 40, 100 + i % 900, date('2000-01-01', '+' || (i % 9000) || ' days'), date('2000-01-01', '+' || (i % 9000 + 30) || ' days'), 100 + i % 300, (i % 50) / 4.0 from n")
+
+
+def python_totals():
+    pages = {}
+    for book in iter_books_info("", "", "", "", page_size=10000):
+        year = book.finished[:4]
+        pages[year] = pages.get(year, 0) + book.pages
+    return pages
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        Database.open(os.path.join(directory, "database.db"))
+        with Database.transaction():
+            create_tables()
+            fill(ROWS)
+        load = timed(get_snapshot)
+        cached = timed(get_snapshot)
+        snapshot = get_snapshot()
+        results = {"moving average": timed(moving_average, "speed", 100, snapshot),
+                   "percentiles": timed(percentiles, "speed", (25, 50, 75, 90), snapshot),
+                   "speed trend": timed(speed_trend, snapshot),
+                   "pages per year": timed(totals_by, "finished_year", "pages", snapshot),
+                   "histogram": timed(histogram, "pages", 10, 2010, snapshot)}
+        loop = timed(python_totals)
+        Database.dispose()
+    print(f"\n{ROWS} books")
+    print(f"{'snapshot load [ms]':<28}{load * 1000:>10.2f}")
+    print(f"{'unchanged snapshot [ms]':<28}{cached * 1000:>10.2f}")
+    for name, elapsed in results.items():
+        print(f"{name + ' [ms]':<28}{elapsed * 1000:>10.2f}")
+    print(f"{'pages per year, Books [ms]':<28}{loop * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
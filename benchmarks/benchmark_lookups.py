@@ -0,0 +1,52 @@
+# Compares the scalar lookups used during imports against the previous fetch of every
+# matching row followed by a copy of the list.
+# Run from the repository root: python -m benchmarks.benchmark_lookups
+
+import timeit
+from sqlalchemy import create_engine
+from reading_statistics.Database import Database
+from reading_statistics.statements import SELECT_AUTHOR_ID, SELECT_SERIES_ID, SELECT_BOOK_ISBN, SELECT_STATISTICS_ISBN
+from reading_statistics.sqlite import create_tables, bulk_insert_books, get_author_id, get_series_id, get_book_isbn, get_statistics_isbn
+from reading_statistics.Book import Book
+from .common import uncached
+
+NUMBER = 20000
+ROWS = 1000
+
+
+def setup():
+    db = Database
+    db.engine = create_engine("sqlite+pysqlite:///:memory:")
+    db.connection = db.engine.connect()
+    create_tables()
+    bulk_insert_books(Book(f"Author {i}", f"Series {i}", i, f"Title {i}", 1, None, None, None, None, None, None)
+                      for i in range(ROWS))
+    return db
+
+
+def fetch_all_copy(statement, parameters):
+    result = Database.connection.execute(statement, parameters)
+    rows = result.all().copy()
+    if rows.__len__() == 0:
+        return None
+    else:
+        return rows[0][0]
+
+
+def main():
+    db = setup()
+    cases = [("get_author_id", uncached(lambda: fetch_all_copy(SELECT_AUTHOR_ID, {"name": "Author 500"})), uncached(lambda: get_author_id("Author 500"))),
+             ("get_series_id", uncached(lambda: fetch_all_copy(SELECT_SERIES_ID, {"name": "Series 500", "author_id": 501})), uncached(lambda: get_series_id("Series 500", 501))),
+             ("get_book_isbn", lambda: fetch_all_copy(SELECT_BOOK_ISBN, {"isbn": 500}), lambda: get_book_isbn(500)),
+             ("get_statistics_isbn", lambda: fetch_all_copy(SELECT_STATISTICS_ISBN, {"isbn": 500}), lambda: get_statistics_isbn(500))]
+    print(f"{'function':<22}{'all().copy() [us]':>20}{'scalar [us]':>14}{'speedup':>10}")
+    for name, before, after in cases:
+        assert before() == after()
+        old = min(timeit.repeat(before, number=NUMBER, repeat=7)) / NUMBER * 1e6
+        new = min(timeit.repeat(after, number=NUMBER, repeat=7)) / NUMBER * 1e6
+        print(f"{name:<22}{old:>20.2f}{new:>14.2f}{old / new:>9.2f}x")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Compares reading the yearly report views from views.json computed on every select with reading
+# them materialized with the on_commit policy, and measures what refreshing them adds to a commit.
+# The historical estimates comparison is left out, its query grows with the square of the books.
+# Run from the repository root: python -m benchmarks.benchmark_materialized_views
+
+import itertools
+import json
+import os
+import tempfile
+from reading_statistics.constants import VIEWS_LOCATION, MATERIALIZED_SOURCE_SUFFIX, REFRESH_ON_COMMIT
+from reading_statistics.Database import Database
+from reading_statistics.sqlite import create_tables, create_views, load_library_from_json, update_statistics_pages, get_materialized_views
+from .benchmark_sync import ROWS, write_library
+from .common import timed
+
+REPEATS = 5
+# Every change writes a new value, updates that change nothing don't make the views stale
+PAGES = itertools.count(1)
+
+
+def read(name: str):
+    Database.connection.exec_driver_sql(f'select * from "{name}"').all()
+
+
+def change(isbn: int):
+    update_statistics_pages(isbn, next(PAGES))
+    Database.commit()
+
+
+def main():
+    with open(VIEWS_LOCATION, "r") as file:
+        views = json.load(file)
+    views["views"] = [view for view in views["views"]
+                      if "Historical" not in view["view"]]
+    for view in views["views"]:
+        if "by Year" in view["view"]:
+            view["materialized"] = REFRESH_ON_COMMIT
+    with tempfile.TemporaryDirectory() as directory:
+        library = os.path.join(directory, "library.json")
+        views_location = os.path.join(directory, "views.json")
+        write_library(library, 0)
+        with open(views_location, "w") as file:
+            json.dump(views, file)
+        Database.open(os.path.join(directory, "database.db"))
+        with Database.transaction():
+            create_tables()
+        load_library_from_json(library)
+        create_views(views_location)
+        names = [view.name for view in get_materialized_views()]
+        results = [(name, timed(read, name + MATERIALIZED_SOURCE_SUFFIX, repeats=REPEATS), timed(read, name, repeats=REPEATS))
+                   for name in names]
+        hooks = Database.commit_hooks
+        Database.commit_hooks = []
+        without = timed(change, 1, repeats=REPEATS)
+        Database.commit_hooks = hooks
+        refreshed = timed(change, 2, repeats=REPEATS)
+        Database.dispose()
+    print(f"\n{ROWS} books")
+    print(f"{'view':<32}{'query [ms]':>12}{'table [ms]':>12}")
+    for name, query, table in results:
+        print(f"{name:<32}{query * 1000:>12.2f}{table * 1000:>12.2f}")
+    print(f"{'commit without refresh [ms]':<32}{without * 1000:>12.2f}")
+    print(f"{'commit with refresh [ms]':<32}{refreshed * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# Compares loading a JSON Lines library parsed in this process with parsing it in worker processes.
+# Run from the repository root: python -m benchmarks.benchmark_parallel_load
+
+import json
+import os
+import tempfile
+from reading_statistics.Database import Database
+from reading_statistics.sqlite import create_tables, load_library_from_files
+from .common import timed
+
+ROWS = 300000
+WORKERS = [1, 2, 4]
+
+
+def write_library(location: str):
+    with open(location, "w") as file:
+        for i in range(ROWS):
+            file.write(json.dumps({"author_name": f"Author {i % 5000}", "series_name": f"Series {i % 20000}", "isbn": i,
+                                   "title": f"Title {i}", "series_index": 1, "chapters": 10, "pages": 100,
+                                   "released": "2000-01-01", "finished": None, "speed": None, "time": None}) + "\n")
+
+
+def main():
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        library = os.path.join(directory, "library.jsonl")
+        write_library(library)
+        for workers in WORKERS:
+            location = os.path.join(directory, f"database_{workers}.db")
+            Database.open(location)
+            with Database.transaction():
+                create_tables()
+            results[workers] = timed(load_library_from_files, [library], workers)
+            Database.dispose()
+    print(f"\n{ROWS} books, {os.cpu_count()} cores")
+    for workers, elapsed in results.items():
+        print(f"{f'{workers} workers [s]':<28}{elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Compares write throughput and read latency under a concurrent writer between the bare
+# SQLite defaults (rollback journal, synchronous=FULL) and the PRAGMA profiles.
+# Run from the repository root: python -m benchmarks.benchmark_pragmas
+
+import os
+import statistics
+import tempfile
+import threading
+import time
+from reading_statistics.Database import Database
+from reading_statistics.constants import BULK_LOAD_PRAGMA_PROFILE
+from reading_statistics.sqlite import create_tables, bulk_insert_books, insert_book, get_book
+from reading_statistics.Book import Book
+
+ROWS = 100000
+BATCH_SIZE = 1000
+WRITES = 300
+READS = 2000
+
+
+def books(start: int, count: int):
+    return (Book(f"Author {i % 1000}", f"Series {i % 3000}", i, f"Title {i}", 1, 10, 100, "2000-01-01", None, None, None)
+            for i in range(start, start + count))
+
+
+def open_database(location: str, profile: str):
+    Database.open(location, profile=profile)
+    with Database.session():
+        create_tables()
+
+
+def bulk_load(bulk: bool) -> float:
+    start = time.perf_counter()
+    if bulk:
+        with Database.pragma_profile(BULK_LOAD_PRAGMA_PROFILE):
+            bulk_insert_books(books(0, ROWS), BATCH_SIZE, commit=True)
+    else:
+        bulk_insert_books(books(0, ROWS), BATCH_SIZE, commit=True)
+    return ROWS / (time.perf_counter() - start)
+
+
+def small_writes() -> float:
+    start = time.perf_counter()
+    for i in range(WRITES):
+        insert_book(ROWS + i, None, None, "Title")
+        Database.commit()
+    return WRITES / (time.perf_counter() - start)
+
+
+def concurrent_reads() -> list[float]:
+    done = threading.Event()
+
+    def writer():
+        with Database.session():
+            i = 0
+            while not done.is_set():
+                insert_book(2 * ROWS + i, None, None, "Title")
+                Database.commit()
+                i += 1
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    latencies = []
+    for i in range(READS):
+        start = time.perf_counter()
+        get_book(i * 37 % ROWS)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    done.set()
+    thread.join()
+    return latencies
+
+
+def main():
+    print(f"{'profile':<20}{'bulk [rows/s]':>15}{'commits/s':>12}{'read p50 [us]':>15}{'read p99 [us]':>15}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, profile, bulk in [("none", "none", False), ("default", "default", False), ("default + bulk_load", "default", True)]:
+            open_database(os.path.join(directory, f"{name}.db"), profile)
+            rate = bulk_load(bulk)
+            commits = small_writes()
+            latencies = sorted(concurrent_reads())
+            print(f"{name:<20}{rate:>15.0f}{commits:>12.0f}{statistics.median(latencies):>15.1f}{latencies[int(READS * 0.99)]:>15.1f}")
+            Database.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# Compares reading per-author totals from the rollup tables with aggregating every book, and
+# measures what keeping the rollups up to date costs a bulk load.
+# Run from the repository root: python -m benchmarks.benchmark_rollups
+
+import os
+import tempfile
+from reading_statistics.Database import Database
+from reading_statistics.schema import ROLLUP_TRIGGERS
+from reading_statistics.sqlite import create_tables, load_library_from_json, get_author_rollups
+from .benchmark_sync import ROWS, write_library
+from .common import timed
+
+AGGREGATE = "select s.author_id, count(*), sum(st.pages), avg(st.speed) from statistics as st join books as b on b.isbn = st.isbn join series as s on s.series_id = b.series_id group by s.author_id"
+
+
+def load(directory: str, library: str, triggers: bool) -> float:
+    Database.open(os.path.join(directory, f"database_{triggers}.db"))
+    with Database.transaction():
+        create_tables()
+        if not triggers:
+            for name in ROLLUP_TRIGGERS:
+                Database.connection.exec_driver_sql(f"drop trigger {name}")
+    return timed(load_library_from_json, library)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        library = os.path.join(directory, "library.json")
+        write_library(library, 0)
+        without = load(directory, library, False)
+        Database.dispose()
+        loaded = load(directory, library, True)
+        rollups = timed(get_author_rollups)
+        aggregate = timed(
+            lambda: Database.connection.exec_driver_sql(AGGREGATE).all())
+        Database.dispose()
+    print(f"\n{ROWS} books")
+    print(f"{'load without rollups [s]':<28}{without:>8.2f}")
+    print(f"{'load with rollups [s]':<28}{loaded:>8.2f}")
+    print(f"{'totals per author [ms]':<28}{aggregate * 1000:>8.2f}")
+    print(f"{'rollups per author [ms]':<28}{rollups * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
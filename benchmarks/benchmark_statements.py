@@ -0,0 +1,54 @@
+# Compares per-call cost of the precompiled, bound-parameter statements in statements.py
+# against the f-string SQL that sqlite.py used before.
+# Run from the repository root: python -m benchmarks.benchmark_statements
+
+import timeit
+from sqlalchemy import create_engine, text
+from reading_statistics.Database import Database
+from reading_statistics.sqlite import create_tables, insert_author, get_author_id, get_book_title, insert_book
+from .common import uncached
+
+NUMBER = 20000
+ROWS = 1000
+
+
+def setup():
+    db = Database
+    db.engine = create_engine("sqlite+pysqlite:///:memory:")
+    db.connection = db.engine.connect()
+    create_tables()
+    for i in range(ROWS):
+        insert_author(f"Author {i}")
+        insert_book(i, None, None, f"Title {i}")
+    return db
+
+
+def get_author_id_fstring(name: str):
+    result = Database.connection.execute(
+        text(f"select author_id from authors where name = \"{name}\""))
+    rows = result.all().copy()
+    return None if rows.__len__() == 0 else rows[0][0]
+
+
+def get_book_title_fstring(isbn: int):
+    result = Database.connection.execute(
+        text(f"select title from books where isbn = {isbn}"))
+    rows = result.all().copy()
+    return None if rows.__len__() == 0 else rows[0][0]
+
+
+def main():
+    db = setup()
+    keys = iter(range(10 ** 9))
+    cases = [("get_author_id", uncached(lambda: get_author_id_fstring(f"Author {next(keys) % ROWS}")), uncached(lambda: get_author_id(f"Author {next(keys) % ROWS}"))),
+             ("get_book_title", lambda: get_book_title_fstring(next(keys) % ROWS), lambda: get_book_title(next(keys) % ROWS))]
+    print(f"{'function':<20}{'f-string [us]':>16}{'bound [us]':>16}{'speedup':>10}")
+    for name, before, after in cases:
+        old = min(timeit.repeat(before, number=NUMBER, repeat=3)) / NUMBER * 1e6
+        new = min(timeit.repeat(after, number=NUMBER, repeat=3)) / NUMBER * 1e6
+        print(f"{name:<20}{old:>16.2f}{new:>16.2f}{old / new:>9.2f}x")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
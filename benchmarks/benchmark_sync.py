@@ -0,0 +1,44 @@
+# Compares a full re-import of a mostly unchanged library with an incremental sync.
+# Run from the repository root: python -m benchmarks.benchmark_sync
+
+import json
+import os
+import tempfile
+from reading_statistics.Database import Database
+from reading_statistics.sqlite import create_tables, load_library_from_json, sync_library_from_json
+from .common import timed
+
+ROWS = 300000
+CHANGED = 100
+
+
+def write_library(location: str, changed: int):
+    with open(location, "w") as file:
+        json.dump({"books": [{"author_name": f"Author {i % 5000}", "series_name": f"Series {i % 20000}", "isbn": i,
+                              "title": f"Title {i}{' (revised)' if i < changed else ''}", "series_index": 1, "chapters": 10,
+                              "pages": 100, "released": "2000-01-01", "finished": None, "speed": None, "time": None}
+                             for i in range(ROWS)]}, file)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        original = os.path.join(directory, "original.json")
+        changed = os.path.join(directory, "changed.json")
+        write_library(original, 0)
+        write_library(changed, CHANGED)
+        Database.open(os.path.join(directory, "database.db"))
+        with Database.transaction():
+            create_tables()
+        first = timed(sync_library_from_json, original)
+        reload = timed(load_library_from_json, changed)
+        reload_back = timed(load_library_from_json, original)
+        sync = timed(sync_library_from_json, changed)
+        Database.dispose()
+    print(f"\n{ROWS} books, {CHANGED} changed")
+    print(f"{'first sync [s]':<28}{first:>8.2f}")
+    print(f"{'full re-import [s]':<28}{(reload + reload_back) / 2:>8.2f}")
+    print(f"{'incremental sync [s]':<28}{sync:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
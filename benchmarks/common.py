@@ -0,0 +1,21 @@
+# Helpers shared by the benchmarks, run them from the repository root with python -m benchmarks.<name>
+
+import time
+from reading_statistics.Database import Database
+
+
+def timed(function, *args, repeats: int = 1) -> float:
+    # Average over the repeats, in seconds
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function(*args)
+    return (time.perf_counter() - start) / repeats
+
+
+def uncached(function):
+    # Author and series IDs are answered from the identity caches after the first lookup, clearing
+    # them first keeps the query in every call, both sides pay for it so the comparison stays fair
+    def call():
+        Database.clear_caches()
+        return function()
+    return call
@@ -1,13 +1,407 @@
+import asyncio
 import sqlalchemy
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Hashable, Iterator, Optional
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool, SingletonThreadPool
+from .constants import DATABASE_LOCATION, IDENTITY_CACHE_SIZE, POOL_SIZE, POOL_MAX_OVERFLOW, POOL_TIMEOUT, PRAGMA_PROFILES, DEFAULT_PRAGMA_PROFILE
+from .IdentityCache import IdentityCache, PendingEntries
 
+# Connections are stored with the thread or asyncio task that opened them, tasks start with a
+# copy of their parent's context and would otherwise share its connection
+_connection: ContextVar[Optional[tuple[Hashable, sqlalchemy.Connection]]] = ContextVar(
+    "connection", default=None)
+_session: ContextVar[Optional[tuple[Hashable, sqlalchemy.Connection]]] = ContextVar(
+    "session", default=None)
 
-class Database:
-    location: str
-    engine: sqlalchemy.Engine
-    connection: sqlalchemy.Connection
+
+def context_owner() -> Hashable:
+    """Identify the running asyncio task, or the thread outside of one
+
+    Returns:
+        Hashable: Running task or ID of the running thread
+    """
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return task if task != None else threading.get_ident()
+
+
+def owned(variable: ContextVar) -> Optional[sqlalchemy.Connection]:
+    """Read a connection from a context variable if the running thread or task set it
+
+    Args:
+        variable (ContextVar): _connection or _session
+
+    Returns:
+        Optional[sqlalchemy.Connection]: Connection or None if it's not set or belongs to a parent task
+    """
+    value = variable.get()
+    if value == None or value[0] != context_owner():
+        return None
+    return value[1]
+
+
+def pragma_statements(pragmas: dict) -> list[str]:
+    """Turn PRAGMA settings into statements
+
+    Args:
+        pragmas (dict): Values keyed by PRAGMA name
+
+    Returns:
+        list[str]: One statement per PRAGMA, in the order given
+    """
+    return [f"PRAGMA {name} = {value}" for name, value in pragmas.items()]
+
+
+def create_database_engine(location: str, pool_size: int = POOL_SIZE, max_overflow: int = POOL_MAX_OVERFLOW, timeout: int = POOL_TIMEOUT, profile: str = DEFAULT_PRAGMA_PROFILE) -> sqlalchemy.Engine:
+    """Create an engine with a connection pool suited to the database location
+
+    Every connection the pool opens is tuned with the PRAGMAs of the profile.
+
+    Args:
+        location (str): Path of the database file or ":memory:"
+        pool_size (int, optional): Connections kept open by the pool. Defaults to POOL_SIZE.
+        max_overflow (int, optional): Connections opened above pool_size under load. Defaults to POOL_MAX_OVERFLOW.
+        timeout (int, optional): Seconds to wait for a free connection or a database lock. Defaults to POOL_TIMEOUT.
+        profile (str, optional): Key of PRAGMA_PROFILES applied on connect. Defaults to DEFAULT_PRAGMA_PROFILE.
+
+    Returns:
+        sqlalchemy.Engine: Engine for the database
+    """
+    statements = pragma_statements(PRAGMA_PROFILES[profile])
+    url = f"sqlite+pysqlite:///{location}"
+    if location == "" or location == ":memory:":
+        # Every connection to an in-memory database sees a different one, so each thread keeps its own
+        engine = sqlalchemy.create_engine(
+            url, poolclass=SingletonThreadPool, pool_size=pool_size)
+    else:
+        engine = sqlalchemy.create_engine(url,
+                                          poolclass=QueuePool,
+                                          pool_size=pool_size,
+                                          max_overflow=max_overflow,
+                                          pool_timeout=timeout,
+                                          connect_args={"check_same_thread": False, "timeout": timeout})
+
+    @event.listens_for(engine, "connect")
+    def apply_profile(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+
+    return engine
+
+
+class DatabaseMeta(type):
+    @property
+    def engine(cls) -> sqlalchemy.Engine:
+        """Engine for the configured location, created on first use"""
+        if cls._engine == None:
+            cls.engine = create_database_engine(cls.location, **cls.pool)
+        return cls._engine
+
+    @engine.setter
+    def engine(cls, engine: sqlalchemy.Engine):
+        cls._engine = engine
+        for hook in cls.open_hooks:
+            with engine.connect() as connection:
+                hook(connection)
+
+    @property
+    def connection(cls) -> sqlalchemy.Connection:
+        """Connection of the running thread or task, checked out from the pool on first use
+
+        A connection checked out by an asyncio task is closed when the task finishes.
+        """
+        connection = owned(_connection)
+        if connection == None or connection.closed:
+            owner = context_owner()
+            connection = cls.engine.connect()
+            _connection.set((owner, connection))
+            if isinstance(owner, asyncio.Task):
+                owner.add_done_callback(lambda task: connection.close())
+        return connection
+
+    @connection.setter
+    def connection(cls, connection: sqlalchemy.Connection):
+        _connection.set((context_owner(), connection))
+
+
+class Database(metaclass=DatabaseMeta):
+    location: str = DATABASE_LOCATION
+    pool: dict = {}
+    _engine: Optional[sqlalchemy.Engine] = None
+    # Author IDs keyed by name and series IDs keyed by (name, author_id), shared by all connections
+    # once the transaction that read them commits
+    authors_cache = IdentityCache(
+        IDENTITY_CACHE_SIZE, lambda cache: Database.pending_ids(cache))
+    series_cache = IdentityCache(
+        IDENTITY_CACHE_SIZE, lambda cache: Database.pending_ids(cache))
+    # Tables that passed check_tables since the schema last changed
+    schema_cache: set[str] = set()
+    # Run inside the transaction right before transaction() or commit() commits it
+    commit_hooks: list[Callable[[], None]] = []
+    # Run with a connection of their own whenever an engine for a database is set up
+    open_hooks: list[Callable[[sqlalchemy.Connection], None]] = []
+
+    def open(location: str, **pool):
+        """Point the database at a new location, the engine and connections are created when first used
+
+        The connection of the running thread and the previous engine's pool are closed.
+
+        Args:
+            location (str): Path of the database file or ":memory:"
+            **pool: Settings passed to create_database_engine
+        """
+        Database.close()
+        _connection.set(None)
+        if Database._engine != None:
+            Database._engine.dispose()
+        Database.location = location
+        Database.pool = pool
+        Database._engine = None
+
+    @contextmanager
+    def session() -> Iterator[sqlalchemy.Connection]:
+        """Run a block on a connection of its own inside a transaction
+
+        Functions from sqlite.py called inside the block use the session's connection. It's
+        committed when the block finishes and rolled back if it raises. Sessions entered again
+        inside the block reuse the outer one.
+
+        Yields:
+            Iterator[sqlalchemy.Connection]: Connection of the session
+        """
+        current = owned(_session)
+        if current != None:
+            yield current
+            return
+        connection = Database.engine.connect()
+        owner = context_owner()
+        connection_token = _connection.set((owner, connection))
+        session_token = _session.set((owner, connection))
+        try:
+            with Database.transaction():
+                yield connection
+        finally:
+            _session.reset(session_token)
+            _connection.reset(connection_token)
+            connection.close()
+
+    @contextmanager
+    def transaction() -> Iterator[sqlalchemy.Connection]:
+        """Run a block as one atomic unit on the current connection
+
+        The outermost block commits once when it finishes and rolls everything back if it raises.
+        Blocks nested inside it become savepoints, so a failing inner step can be caught and
+        undone without losing the rest. Database.commit() called inside the block is deferred
+        to the end of the outermost one.
+
+        Yields:
+            Iterator[sqlalchemy.Connection]: Connection the transaction runs on
+        """
+        connection = Database.connection
+        depth = connection.info.get("transaction_depth", 0)
+        connection.info["transaction_depth"] = depth + 1
+        try:
+            if depth == 0:
+                # pysqlite only begins a transaction before a write, without it a savepoint taken
+                # first would start one of its own and releasing it would already commit
+                if not connection.connection.driver_connection.in_transaction:
+                    connection.exec_driver_sql("BEGIN")
+                try:
+                    yield connection
+                    Database.run_commit_hooks()
+                except BaseException:
+                    connection.rollback()
+                    Database.clear_caches()
+                    raise
+                connection.commit()
+                Database.publish_ids()
+            else:
+                savepoint = connection.begin_nested()
+                try:
+                    yield connection
+                except BaseException:
+                    savepoint.rollback()
+                    Database.discard_ids(depth + 1)
+                    raise
+                savepoint.commit()
+                Database.release_ids(depth + 1)
+        finally:
+            connection.info["transaction_depth"] = depth
+
+    def in_transaction() -> bool:
+        """Check if the current connection is inside a transaction() block
+
+        Returns:
+            bool: True inside the block
+        """
+        return Database.connection.info.get("transaction_depth", 0) > 0
+
+    @contextmanager
+    def pragma_profile(name: str) -> Iterator[sqlalchemy.Connection]:
+        """Switch the current connection to another PRAGMA profile for the duration of a block
+
+        The previous values are read before switching and restored afterwards. SQLite refuses to
+        change some of them inside a transaction, so the block has to be entered after a commit
+        and work left uncommitted at its end is committed before restoring them. Inside a
+        transaction() block the profile is left as it is.
+
+        Args:
+            name (str): Key of PRAGMA_PROFILES
+
+        Yields:
+            Iterator[sqlalchemy.Connection]: Connection the profile was applied to
+        """
+        connection = Database.connection
+        if Database.in_transaction():
+            yield connection
+            return
+        pragmas = PRAGMA_PROFILES[name]
+        # Run on the driver's connection, through SQLAlchemy the first PRAGMA would begin a transaction
+        driver_connection = connection.connection.driver_connection
+        previous = {pragma: driver_connection.execute(f"PRAGMA {pragma}").fetchone()[0]
+                    for pragma in pragmas}
+        for statement in pragma_statements(pragmas):
+            driver_connection.execute(statement)
+        try:
+            yield connection
+        except BaseException:
+            # The unfinished transaction would keep the previous values from being restored
+            connection.rollback()
+            Database.clear_caches()
+            raise
+        else:
+            connection.commit()
+            Database.publish_ids()
+        finally:
+            for statement in pragma_statements(previous):
+                driver_connection.execute(statement)
+
+    def run_commit_hooks():
+        """Run the commit hooks on the current connection
+
+        Hooks are skipped while they're already running, so commits made by a hook don't run
+        them again, and inside deferred_commit_hooks().
+        """
+        connection = Database.connection
+        if connection.info.get("commit_hooks_paused", False):
+            return
+        connection.info["commit_hooks_paused"] = True
+        try:
+            for hook in Database.commit_hooks:
+                hook()
+        finally:
+            connection.info["commit_hooks_paused"] = False
+
+    @contextmanager
+    def deferred_commit_hooks() -> Iterator[sqlalchemy.Connection]:
+        """Skip commit hooks for the commits made inside a block and run them once when it finishes
+
+        Meant for bulk loads committing after every batch, the block ends with Database.commit().
+
+        Yields:
+            Iterator[sqlalchemy.Connection]: Current connection
+        """
+        connection = Database.connection
+        paused = connection.info.get("commit_hooks_paused", False)
+        connection.info["commit_hooks_paused"] = True
+        try:
+            yield connection
+        finally:
+            connection.info["commit_hooks_paused"] = paused
+        Database.commit()
 
     def commit():
-        Database.connection.commit()
+        if not Database.in_transaction():
+            Database.run_commit_hooks()
+            Database.connection.commit()
+            Database.publish_ids()
+
+    def rollback():
+        Database.connection.rollback()
+        Database.clear_caches()
+
+    def pending_ids(cache: IdentityCache) -> Optional[PendingEntries]:
+        """Return the IDs an identity cache holds back for the transaction of the current connection
+
+        Args:
+            cache (IdentityCache): authors_cache or series_cache
+
+        Returns:
+            Optional[PendingEntries]: Pending entries or None if the connection has no open transaction
+        """
+        connection = Database.connection
+        pending = connection.info.setdefault("pending_ids", {})
+        if not connection.connection.driver_connection.in_transaction:
+            # Left by a commit or rollback made directly on the connection, they may not be valid
+            pending.clear()
+            return None
+        depth = connection.info.get("transaction_depth", 0)
+        level = pending.get(cache)
+        if level == None or level.depth < depth:
+            pending[cache] = PendingEntries({}, [], level, depth)
+        return pending[cache]
+
+    def release_ids(depth: int):
+        """Hand the IDs read inside a released savepoint over to the level around it
+
+        Args:
+            depth (int): Transaction depth of the savepoint
+        """
+        pending = Database.connection.info.get("pending_ids", {})
+        for cache, level in list(pending.items()):
+            if level.depth != depth:
+                continue
+            if level.parent != None and level.parent.depth == depth - 1:
+                level.parent.entries.update(level.entries)
+                level.parent.invalidated.extend(level.invalidated)
+                pending[cache] = level.parent
+            else:
+                pending[cache] = level._replace(depth=depth - 1)
+
+    def discard_ids(depth: int):
+        """Forget the IDs read inside a savepoint that was rolled back, the rest of the transaction keeps its own
+
+        Args:
+            depth (int): Transaction depth of the savepoint
+        """
+        pending = Database.connection.info.get("pending_ids", {})
+        for cache, level in list(pending.items()):
+            if level.depth != depth:
+                continue
+            if level.parent == None:
+                del pending[cache]
+            else:
+                pending[cache] = level.parent
+
+    def publish_ids():
+        """Share the IDs read by the transaction the current connection just committed"""
+        for cache, level in Database.connection.info.pop("pending_ids", {}).items():
+            for entries in reversed(list(level.levels())):
+                cache.publish(entries)
+
+    def clear_caches():
+        Database.authors_cache.clear()
+        Database.series_cache.clear()
+        Database.schema_cache.clear()
+        connection = owned(_connection)
+        if connection != None and not connection.closed:
+            connection.info.pop("pending_ids", None)
 
     def close():
-        Database.connection.close()
+        connection = owned(_connection)
+        if connection != None:
+            connection.close()
+        Database.clear_caches()
+
+    def dispose():
+        """Close the connection of the running thread and every pooled connection"""
+        Database.close()
+        if Database._engine != None:
+            Database._engine.dispose()
@@ -0,0 +1,162 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterator, NamedTuple, Optional
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class PendingEntries(NamedTuple):
+    # IDs cached and IDs invalidated by a transaction that hasn't committed yet, savepoints nested
+    # in it get a level of their own on top of the level of the transaction or savepoint around them
+    entries: dict[Hashable, Any]
+    invalidated: list[Callable[[Hashable, Any], bool]]
+    parent: Optional["PendingEntries"] = None
+    depth: int = 0
+
+    def levels(self) -> Iterator["PendingEntries"]:
+        """Iterate over this level and the levels around it, innermost first"""
+        level = self
+        while level != None:
+            yield level
+            level = level.parent
+
+
+class IdentityCache:
+    """Bounded LRU mapping of natural keys (names) to row IDs
+
+    Only IDs of rows that exist are stored, lookups of unknown keys always go to the database.
+    A lock keeps the cache consistent when it's shared by connections of several threads.
+
+    IDs read inside a transaction that hasn't committed yet may be rolled back, they go to the
+    pending entries of that transaction, returned by the pending callable, instead. Only its own
+    connection sees them until they're published after the commit.
+    """
+
+    def __init__(self, maxsize: int, pending: Optional[Callable[["IdentityCache"], Optional[PendingEntries]]] = None):
+        self.maxsize = maxsize
+        self.entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.pending = pending
+
+    def pending_entries(self) -> Optional[PendingEntries]:
+        """Return the pending entries of the running transaction
+
+        Returns:
+            Optional[PendingEntries]: Pending entries or None outside of a transaction
+        """
+        return self.pending(self) if self.pending != None else None
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached ID and mark it as recently used
+
+        Args:
+            key (Hashable): Natural key of the row
+
+        Returns:
+            Optional[Any]: Cached ID or None if the key is not cached
+        """
+        pending = self.pending_entries()
+        with self.lock:
+            value = next((level.entries[key] for level in pending.levels()
+                          if key in level.entries), None) if pending != None else None
+            if value == None:
+                value = self.entries.get(key)
+            if value == None:
+                self.misses += 1
+                return None
+            if key in self.entries:
+                self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        """Cache an ID, evicting the least recently used one when full
+
+        Args:
+            key (Hashable): Natural key of the row
+            value (Any): ID of the row, None is not cached
+        """
+        if value == None or self.maxsize <= 0:
+            return
+        pending = self.pending_entries()
+        if pending != None:
+            pending.entries[key] = value
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if self.entries.__len__() > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, value: Any):
+        """Remove every key pointing at an ID
+
+        Args:
+            value (Any): ID of the changed or deleted row
+        """
+        self.remove_where(lambda k, v: v == value)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]):
+        """Remove every key matching a predicate
+
+        Args:
+            predicate (Callable[[Hashable], bool]): Called with every cached key
+        """
+        self.remove_where(lambda k, v: predicate(k))
+
+    def remove_where(self, predicate: Callable[[Hashable, Any], bool]):
+        """Remove every shared and pending entry matching a predicate
+
+        Inside a transaction the predicate is applied again when the transaction publishes its
+        entries, so IDs cached by other connections in the meantime are removed as well.
+
+        Args:
+            predicate (Callable[[Hashable, Any], bool]): Called with every cached key and ID
+        """
+        pending = self.pending_entries()
+        if pending != None:
+            for level in pending.levels():
+                for key in [k for k, v in level.entries.items() if predicate(k, v)]:
+                    del level.entries[key]
+            pending.invalidated.append(predicate)
+        with self.lock:
+            for key in [k for k, v in self.entries.items() if predicate(k, v)]:
+                del self.entries[key]
+
+    def publish(self, pending: PendingEntries):
+        """Apply what a committed transaction invalidated and cache the IDs it read
+
+        Args:
+            pending (PendingEntries): Pending entries of the committed transaction
+        """
+        with self.lock:
+            for predicate in pending.invalidated:
+                for key in [k for k, v in self.entries.items() if predicate(k, v)]:
+                    del self.entries[key]
+            for key, value in pending.entries.items():
+                self.entries[key] = value
+                self.entries.move_to_end(key)
+            while self.entries.__len__() > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """Remove all entries and reset the counters"""
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> CacheInfo:
+        """Report cache statistics in the shape of functools.lru_cache's cache_info
+
+        Returns:
+            CacheInfo: Hits, misses, maximum and current size
+        """
+        return CacheInfo(self.hits, self.misses, self.maxsize, self.entries.__len__())
@@ -4,6 +4,12 @@ from .reading_statistics import *
 import curses
 import json
 import os
+import sys
+
+# Any arguments switch to the non-interactive command line mode
+if sys.argv.__len__() > 1:
+    from .batch import main
+    sys.exit(main(sys.argv[1:]))
 
 
 def clear_terminal():
@@ -119,8 +125,11 @@ def processmenu(menu, parent=None):
 
 
 # Main program
+# Materialized views with the timer policy are refreshed in the background while the menu is open
+view_refresher = start_view_refresher()
 processmenu(menu_data)
 # VITAL!  This closes out the menu system and returns you to the bash prompt.
 curses.endwin()
+view_refresher.set()
 db.close()
 os.system("cls" if os.name == "nt" else "clear")
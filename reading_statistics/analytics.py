@@ -0,0 +1,260 @@
+import threading
+from typing import Optional
+from .constants import *
+from .Database import Database
+from .statements import SELECT_ANALYTICS_SNAPSHOT
+
+# numpy is optional, it's only needed by this module
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+db = Database
+
+# One row per statistics row, missing numbers are NaN and missing IDs and years are -1
+SNAPSHOT_DTYPE = [("isbn", "i8"),
+                  ("author_id", "i8"),
+                  ("series_id", "i8"),
+                  ("chapters", "f8"),
+                  ("pages", "f8"),
+                  ("speed", "f8"),
+                  ("time", "f8"),
+                  ("released_day", "f8"),
+                  ("finished_day", "f8"),
+                  ("finished_year", "i8")]
+snapshot_lock = threading.Lock()
+snapshot_cache = {"version": None, "snapshot": None}
+
+
+def require_numpy():
+    """Make sure numpy can be used
+
+    Raises:
+        ImportError: numpy is not installed
+    """
+    if np == None:
+        raise ImportError(
+            "numpy is required for analytics, install it with pip install numpy")
+
+
+def data_version() -> tuple:
+    """Identify the current state of the data without reading any rows
+
+    PRAGMA data_version changes when another connection commits and total_changes() when this
+    one writes, so the pair changes whenever the result of a query could have changed.
+
+    Returns:
+        tuple: Version to compare with the one a snapshot was built at
+    """
+    driver_connection = db.connection.connection.driver_connection
+    (version,) = driver_connection.execute("PRAGMA data_version").fetchone()
+    return (id(driver_connection), version, driver_connection.total_changes)
+
+
+def to_days(dates: tuple) -> "np.ndarray":
+    """Convert ISO 8601 dates to days since 1970-01-01
+
+    Args:
+        dates (tuple): YYYY-MM-DD strings or None
+
+    Returns:
+        np.ndarray: Day numbers as floats, NaN for None and dates that don't exist
+    """
+    try:
+        days = np.array(dates, dtype="datetime64[D]")
+    except ValueError:
+        days = np.empty(dates.__len__(), dtype="datetime64[D]")
+        for index, date in enumerate(dates):
+            try:
+                days[index] = np.datetime64(date, "D")
+            except ValueError:
+                days[index] = np.datetime64("NaT")
+    result = days.astype("i8").astype("f8")
+    result[np.isnat(days)] = np.nan
+    return result
+
+
+def load_snapshot() -> "np.ndarray":
+    """Read books and their statistics into a structured array with a single query
+
+    Returns:
+        np.ndarray: Array with SNAPSHOT_DTYPE fields, one element per statistics row
+    """
+    require_numpy()
+    rows = db.connection.connection.driver_connection.execute(
+        SELECT_ANALYTICS_SNAPSHOT.text).fetchall()
+    snapshot = np.empty(rows.__len__(), dtype=SNAPSHOT_DTYPE)
+    if rows.__len__() == 0:
+        return snapshot
+    columns = list(zip(*rows))
+    # Converting whole columns lets numpy turn every None into NaN at once
+    for (name, kind), column in zip(SNAPSHOT_DTYPE[:7], columns):
+        snapshot[name] = np.array(column, dtype=kind)
+    snapshot["released_day"] = to_days(columns[7])
+    snapshot["finished_day"] = to_days(columns[8])
+    years = snapshot["finished_day"].astype("datetime64[D]").astype("datetime64[Y]")
+    snapshot["finished_year"] = np.where(
+        np.isnan(snapshot["finished_day"]), -1, years.astype("i8") + 1970)
+    return snapshot
+
+
+def get_snapshot(refresh: bool = False) -> "np.ndarray":
+    """Return the snapshot of statistics, rebuilt only if the data changed since it was loaded
+
+    Inside an open transaction with writes the snapshot is rebuilt on every call.
+
+    Args:
+        refresh (bool, optional): Rebuild even if nothing changed. Defaults to False.
+
+    Returns:
+        np.ndarray: Array with SNAPSHOT_DTYPE fields, it must not be modified
+    """
+    require_numpy()
+    version = data_version()
+    # Neither version changes on rollback, a snapshot of uncommitted rows is never cached
+    pending = db.connection.connection.driver_connection.in_transaction
+    with snapshot_lock:
+        if refresh or snapshot_cache["version"] != version:
+            snapshot = load_snapshot()
+            if pending:
+                return snapshot
+            snapshot_cache["snapshot"] = snapshot
+            snapshot_cache["version"] = version
+        return snapshot_cache["snapshot"]
+
+
+def clear_snapshot():
+    """Drop the cached snapshot, the next call of get_snapshot reloads it
+    """
+    with snapshot_lock:
+        snapshot_cache["version"] = None
+        snapshot_cache["snapshot"] = None
+
+
+def finished(snapshot: "np.ndarray", column: str) -> tuple["np.ndarray", "np.ndarray"]:
+    """Select finish days and values of a column of finished books that have the value
+
+    Only the two columns are copied, sorting whole records would be several times slower.
+
+    Args:
+        snapshot (np.ndarray): Snapshot returned by get_snapshot
+        column (str): Numeric field of SNAPSHOT_DTYPE
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Finish days and values ordered by finish date and ISBN
+    """
+    days = snapshot["finished_day"]
+    values = snapshot[column]
+    selected = ~np.isnan(days) & ~np.isnan(values)
+    days = days[selected]
+    order = np.lexsort((snapshot["isbn"][selected], days))
+    return days[order], values[selected][order]
+
+
+def moving_average(column: str = "speed", window: int = ANALYTICS_WINDOW, snapshot: Optional["np.ndarray"] = None) -> tuple["np.ndarray", "np.ndarray"]:
+    """Average a column over the last window finished books, books missing the value are skipped
+
+    Args:
+        column (str, optional): Numeric field of SNAPSHOT_DTYPE. Defaults to "speed".
+        window (int, optional): Number of books averaged. Defaults to ANALYTICS_WINDOW.
+        snapshot (Optional[np.ndarray], optional): Snapshot to use. Defaults to get_snapshot().
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Finish days of the last book of every window and the averages
+    """
+    days, values = finished(
+        snapshot if snapshot is not None else get_snapshot(), column)
+    if values.__len__() < window:
+        return np.empty(0), np.empty(0)
+    sums = np.cumsum(np.concatenate(([0.0], values)))
+    return days[window - 1:], (sums[window:] - sums[:-window]) / window
+
+
+def percentiles(column: str = "speed", q: tuple[float, ...] = ANALYTICS_PERCENTILES, snapshot: Optional["np.ndarray"] = None) -> "np.ndarray":
+    """Compute percentiles of a column, books missing the value are skipped
+
+    Args:
+        column (str, optional): Numeric field of SNAPSHOT_DTYPE. Defaults to "speed".
+        q (tuple[float, ...], optional): Percentiles between 0 and 100. Defaults to ANALYTICS_PERCENTILES.
+        snapshot (Optional[np.ndarray], optional): Snapshot to use. Defaults to get_snapshot().
+
+    Returns:
+        np.ndarray: One value per percentile, NaN if no book has the value
+    """
+    values = (snapshot if snapshot is not None else get_snapshot())[column]
+    values = values[~np.isnan(values)]
+    if values.__len__() == 0:
+        return np.full(q.__len__(), np.nan)
+    return np.percentile(values, q)
+
+
+def speed_trend(snapshot: Optional["np.ndarray"] = None) -> tuple[float, float]:
+    """Fit a line through reading speed against the finish date with least squares
+
+    Args:
+        snapshot (Optional[np.ndarray], optional): Snapshot to use. Defaults to get_snapshot().
+
+    Returns:
+        tuple[float, float]: Change of speed per day and speed at day 0 (1970-01-01), NaN with fewer than two books
+    """
+    books = snapshot if snapshot is not None else get_snapshot()
+    selected = ~np.isnan(books["finished_day"]) & ~np.isnan(books["speed"])
+    days = books["finished_day"][selected]
+    speeds = books["speed"][selected]
+    if days.__len__() < 2 or days.min() == days.max():
+        return np.nan, np.nan
+    # Closed form of the least squares line, a single pass over the data unlike np.polyfit
+    day_mean = days.mean()
+    speed_mean = speeds.mean()
+    slope = ((days - day_mean) * (speeds - speed_mean)).sum() / \
+        ((days - day_mean) ** 2).sum()
+    return float(slope), float(speed_mean - slope * day_mean)
+
+
+def totals_by(key: str = "finished_year", column: str = "pages", snapshot: Optional["np.ndarray"] = None) -> tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """Sum a column per group, such as pages per year or hours per series
+
+    Args:
+        key (str, optional): Integer field of SNAPSHOT_DTYPE to group by, groups with key -1 are left out. Defaults to "finished_year".
+        column (str, optional): Numeric field of SNAPSHOT_DTYPE, missing values count as 0. Defaults to "pages".
+        snapshot (Optional[np.ndarray], optional): Snapshot to use. Defaults to get_snapshot().
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: Keys in ascending order, sums and numbers of books per key
+    """
+    books = snapshot if snapshot is not None else get_snapshot()
+    selected = books[key] != -1
+    groups = books[key][selected]
+    values = np.nan_to_num(books[column][selected])
+    if groups.__len__() == 0:
+        return groups, values, groups
+    first = groups.min()
+    span = groups.max() - first + 1
+    if span > max(groups.__len__(), ANALYTICS_DENSE_KEYS):
+        # Sparse keys like ISBNs, sorting is cheaper than counting every possible key
+        keys, groups = np.unique(groups, return_inverse=True)
+        return keys, np.bincount(groups, weights=values, minlength=keys.__len__()), np.bincount(groups, minlength=keys.__len__())
+    counts = np.bincount(groups - first, minlength=span)
+    sums = np.bincount(groups - first, weights=values, minlength=span)
+    present = np.flatnonzero(counts)
+    return present + first, sums[present], counts[present]
+
+
+def histogram(column: str = "pages", bins: int = ANALYTICS_BINS, year: Optional[int] = None, snapshot: Optional["np.ndarray"] = None) -> tuple["np.ndarray", "np.ndarray"]:
+    """Count books by ranges of a column, optionally only those finished in one year
+
+    Args:
+        column (str, optional): Numeric field of SNAPSHOT_DTYPE, books missing the value are skipped. Defaults to "pages".
+        bins (int, optional): Number of equally wide ranges. Defaults to ANALYTICS_BINS.
+        year (Optional[int], optional): Year the books were finished in. Defaults to None.
+        snapshot (Optional[np.ndarray], optional): Snapshot to use. Defaults to get_snapshot().
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Counts per range and the bins + 1 edges of the ranges
+    """
+    books = snapshot if snapshot is not None else get_snapshot()
+    if year != None:
+        books = books[books["finished_year"] == year]
+    values = books[column]
+    return np.histogram(values[~np.isnan(values)], bins=bins)
@@ -0,0 +1,184 @@
+import argparse
+import json
+import sys
+import time
+from typing import Iterable, Iterator, Optional
+from sqlalchemy import exc
+from .constants import *
+from .library_io import load_book
+from .sqlite import db, check_tables, set_database_location, add_book, update_book_fields, delete_book_isbn, delete_statistics_isbn, sync_library_from_json, load_library_from_files, export_library, create_views, refresh_materialized_views
+
+# Operations, one JSON object per line:
+#   {"op": "add", "book": {<same fields as in library.json>}, "policy": "skip"}
+#   {"op": "update", "isbn": 9780804139021, "changes": {"title": "New title", "time": 8.5}}
+#   {"op": "delete", "isbn": 9780804139021}
+
+
+def iter_operations(location: str) -> Iterator[tuple[int, str]]:
+    """Read lines of a JSON Lines file one at a time, blank lines are skipped
+
+    Args:
+        location (str): Path of the file
+
+    Yields:
+        Iterator[tuple[int, str]]: Line number and the line itself
+    """
+    with open(location, "r") as file:
+        for number, line in enumerate(file, 1):
+            if line.strip() != "":
+                yield number, line
+
+
+def apply_operation(operation: dict):
+    """Run a single add, update or delete through the same functions the menu uses
+
+    Args:
+        operation (dict): Decoded operation
+
+    Raises:
+        KeyError: A required field is missing
+        ValueError: Unknown operation or invalid changes
+        sqlalchemy.exc.StatementError: A value has a type SQLite can't store or breaks a constraint
+    """
+    op = operation["op"]
+    if op == "add":
+        add_book(load_book(operation["book"]),
+                 operation.get("policy", MERGE_SKIP))
+    elif op == "update":
+        update_book_fields(operation["isbn"], **operation["changes"])
+    elif op == "delete":
+        delete_book_isbn(operation["isbn"])
+        delete_statistics_isbn(operation["isbn"])
+    else:
+        raise ValueError(f"Unknown operation {op!r}")
+
+
+def apply_operations(operations: Iterable[tuple[int, str]], batch_size: int = APPLY_BATCH_SIZE) -> tuple[int, list[str]]:
+    """Apply operations with one commit per batch
+
+    Every operation runs in a savepoint, a malformed or failing one is undone and reported
+    without losing the rest of its batch.
+
+    Args:
+        operations (Iterable[tuple[int, str]]): Line numbers and JSON encoded operations
+        batch_size (int, optional): Number of operations committed together. Defaults to APPLY_BATCH_SIZE.
+
+    Returns:
+        tuple[int, list[str]]: Number of applied operations and descriptions of failed ones
+    """
+    applied = 0
+    failures = []
+    operations = iter(operations)
+    done = False
+    while not done:
+        done = True
+        with db.transaction():
+            for number, line in operations:
+                try:
+                    with db.transaction():
+                        apply_operation(json.loads(line))
+                    applied += 1
+                except exc.OperationalError:
+                    # A locked or broken database is not the operation's fault, stop instead
+                    raise
+                except (KeyError, TypeError, ValueError, exc.StatementError) as e:
+                    failures.append(f"Line {number}: {e!r}")
+                if (applied + failures.__len__()) % batch_size == 0:
+                    done = False
+                    break
+    return applied, failures
+
+
+def apply(location: str, batch_size: int = APPLY_BATCH_SIZE) -> int:
+    """Apply operations from a file and print throughput
+
+    Args:
+        location (str): Path of a JSON Lines file with operations
+        batch_size (int, optional): Number of operations committed together. Defaults to APPLY_BATCH_SIZE.
+
+    Returns:
+        int: Exit code, 0 if every operation was applied
+    """
+    errors = check_tables(["authors", "series", "books", "statistics"])
+    if errors.__len__() > 0:
+        print(
+            f"\nAt least one table is corrupted. Please fix them manually:\n{errors}")
+        return 2
+    start = time.perf_counter()
+    applied, failures = apply_operations(
+        iter_operations(location), batch_size)
+    elapsed = time.perf_counter() - start
+    rate = (applied + failures.__len__()) / \
+        elapsed if elapsed > 0 else applied
+    print(
+        f"Applied {applied} operations in {elapsed:.2f}s ({rate:.0f} ops/s), {failures.__len__()} failed.")
+    for failure in failures:
+        print(f"\t{failure}")
+    return 0 if failures.__len__() == 0 else 1
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Entry point of the command line mode
+
+    Args:
+        argv (Optional[list[str]], optional): Arguments without the program name. Defaults to sys.argv.
+
+    Returns:
+        int: Exit code
+    """
+    parser = argparse.ArgumentParser(prog="python -m reading_statistics",
+                                     description="Run without arguments to open the menu.")
+    parser.add_argument("--database", default=None,
+                        help=f"database file, defaults to {DATABASE_LOCATION}")
+    commands = parser.add_subparsers(dest="command", required=True)
+    apply_parser = commands.add_parser(
+        "apply", help="apply add, update and delete operations from a JSON Lines file")
+    apply_parser.add_argument("file")
+    apply_parser.add_argument("--batch-size", type=int, default=APPLY_BATCH_SIZE,
+                              help="operations committed together")
+    sync_parser = commands.add_parser(
+        "sync", help="write only the books that changed since the last sync of a library file")
+    sync_parser.add_argument("file", nargs="?", default=LIBRARY_LOCATION)
+    load_parser = commands.add_parser(
+        "load", help="load books from json, JSON Lines or CSV files, parsed in parallel")
+    load_parser.add_argument("files", nargs="+")
+    load_parser.add_argument("--workers", type=int, default=None,
+                             help="parser processes, defaults to the number of cores")
+    load_parser.add_argument("--policy", choices=MERGE_POLICIES, default=MERGE_OVERWRITE,
+                             help="how books already in the database are merged")
+    export_parser = commands.add_parser(
+        "export", help="write all books to a json, JSON Lines or CSV file, .gz or .zst compresses it")
+    export_parser.add_argument("file")
+    export_parser.add_argument("--append", action="store_true",
+                               help="add to the end of an existing JSON Lines or CSV file")
+    views_parser = commands.add_parser(
+        "views", help="create views from a json file, views that didn't change are skipped")
+    views_parser.add_argument("file", nargs="?", default=VIEWS_LOCATION)
+    views_parser.add_argument("--refresh", action="store_true",
+                              help="drop and create all views again")
+    refresh_parser = commands.add_parser(
+        "refresh-views", help="refresh materialized views whether they're stale or not")
+    refresh_parser.add_argument("names", nargs="*",
+                                help="views to refresh, defaults to all of them")
+    arguments = parser.parse_args(argv)
+    if arguments.database != None:
+        set_database_location(arguments.database)
+    if arguments.command == "apply":
+        return apply(arguments.file, arguments.batch_size)
+    if arguments.command == "sync":
+        return 0 if sync_library_from_json(arguments.file) != None else 2
+    if arguments.command == "load":
+        return 0 if load_library_from_files(arguments.files, arguments.workers, arguments.policy) != None else 2
+    try:
+        if arguments.command == "views":
+            return 0 if create_views(arguments.file, arguments.refresh) != None else 2
+        if arguments.command == "refresh-views":
+            return 0 if refresh_materialized_views(arguments.names or None) != None else 2
+    except ValueError as e:
+        # A malformed views file or an unknown view name
+        print(e, file=sys.stderr)
+        return 2
+    if arguments.command == "export":
+        export_library(arguments.file, arguments.append)
+        return 0
+    return 2
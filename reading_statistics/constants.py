@@ -1,3 +1,66 @@
-DATABASE_LOCATION = "./reading_statistics/database.db"
+import os
+
+# Can be pointed at another file with the READING_STATISTICS_DATABASE environment variable
+DATABASE_LOCATION = os.environ.get(
+    "READING_STATISTICS_DATABASE", "./reading_statistics/database.db")
 LIBRARY_LOCATION = "./reading_statistics/library.json"
 VIEWS_LOCATION = "./reading_statistics/views.json"
+BULK_BATCH_SIZE = 10000
+JSON_READ_SIZE = 65536
+SEARCH_LIMIT = 50
+BOOKS_PAGE_SIZE = 500
+MERGE_SKIP = "skip"
+MERGE_OVERWRITE = "overwrite"
+MERGE_FILL_NULLS = "fill_nulls"
+MERGE_POLICIES = (MERGE_SKIP, MERGE_OVERWRITE, MERGE_FILL_NULLS)
+IDENTITY_CACHE_SIZE = 4096
+POOL_SIZE = 5
+POOL_MAX_OVERFLOW = 10
+POOL_TIMEOUT = 30
+# PRAGMAs applied to every new connection and the ones switched to while loading a library
+PRAGMA_PROFILES = {
+    "default": {"journal_mode": "WAL",
+                "synchronous": "NORMAL",
+                "cache_size": -65536,
+                "mmap_size": 268435456,
+                "temp_store": "MEMORY",
+                "busy_timeout": 30000},
+    # synchronous stays NORMAL, with OFF a power loss can lose or corrupt committed data even in WAL mode
+    "bulk_load": {"cache_size": -262144,
+                  "temp_store": "MEMORY"},
+    "none": {}}
+DEFAULT_PRAGMA_PROFILE = "default"
+BULK_LOAD_PRAGMA_PROFILE = "bulk_load"
+APPLY_BATCH_SIZE = 5000
+# Lines of a JSON Lines file parsed by a worker process at a time
+SHARD_LINES = 20000
+# Shards queued for every worker before the reader waits for the writer to catch up
+SHARDS_PER_WORKER = 2
+# Library file formats, chosen by extension, any of them can be compressed with .gz or .zst
+LIBRARY_FORMAT_JSON = "json"
+LIBRARY_FORMAT_JSON_LINES = "jsonl"
+LIBRARY_FORMAT_CSV = "csv"
+LIBRARY_EXTENSIONS = {".json": LIBRARY_FORMAT_JSON,
+                      ".jsonl": LIBRARY_FORMAT_JSON_LINES,
+                      ".ndjson": LIBRARY_FORMAT_JSON_LINES,
+                      ".csv": LIBRARY_FORMAT_CSV}
+COMPRESSION_EXTENSIONS = {".gz": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+# Dates are stored as ISO 8601 (YYYY-MM-DD), values in these formats are converted when written
+DATE_FORMATS = ("%Y/%m/%d", "%d.%m.%Y", "%Y.%m.%d")
+# Defaults of the analytics functions
+ANALYTICS_WINDOW = 10
+ANALYTICS_PERCENTILES = (25, 50, 75, 90)
+ANALYTICS_BINS = 10
+# Keys of a group in analytics.totals_by are counted directly up to this range, years and IDs fit
+ANALYTICS_DENSE_KEYS = 1 << 20
+# Views marked as materialized in views.json are kept as tables, stale ones are refreshed when a
+# transaction commits or by a timer depending on their policy and any of them on demand
+REFRESH_MANUAL = "manual"
+REFRESH_ON_COMMIT = "on_commit"
+REFRESH_TIMER = "timer"
+REFRESH_POLICIES = (REFRESH_MANUAL, REFRESH_ON_COMMIT, REFRESH_TIMER)
+# Seconds between refreshes of a stale timer view and between checks of the refresher thread
+VIEW_REFRESH_INTERVAL = 3600
+VIEW_REFRESH_PERIOD = 60
+# Appended to a materialized view's name for the view its table is filled from
+MATERIALIZED_SOURCE_SUFFIX = " [query]"
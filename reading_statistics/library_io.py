@@ -0,0 +1,515 @@
+import csv
+import datetime
+import gzip
+import hashlib
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import fields
+from itertools import islice
+from typing import Any, Iterable, Iterator, Optional, TextIO
+from .constants import *
+from .Book import Book
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+decoder = json.JSONDecoder()
+# Column order shared by every format, the same as Book's fields
+BOOK_FIELDS = tuple(field.name for field in fields(Book))
+
+
+def load_book(json: dict) -> Book:
+    """Extract data about individual book from json file and return a Book object containing that data
+
+    Args:
+        json (dict): JSON object containing book's data
+
+    Returns:
+        Book: Object containing book's data
+    """
+    return Book(json["author_name"],
+                json["series_name"],
+                json["isbn"],
+                json["title"],
+                json["series_index"],
+                json["chapters"],
+                json["pages"],
+                json["released"],
+                json["finished"],
+                json["speed"],
+                json["time"])
+
+
+def typed(value: Any, kind: type) -> Any:
+    """Check a field's value against its expected type, numbers written as strings are converted
+
+    Args:
+        value (Any): Value read from the file
+        kind (type): One of str, int or float
+
+    Raises:
+        ValueError: Value can't be used as the expected type
+
+    Returns:
+        Any: Value of the expected type or None
+    """
+    if value == None or type(value) == kind:
+        return value
+    if kind == float and type(value) == int:
+        return float(value)
+    if kind != str and type(value) == str:
+        return kind(value)
+    raise ValueError(f"expected {kind.__name__}, got {value!r}")
+
+
+def book_row(json: dict) -> tuple:
+    """Validate a book's data and return it as a tuple of typed fields in Book's order
+
+    Args:
+        json (dict): JSON object containing book's data
+
+    Raises:
+        KeyError: A field is missing
+        ValueError: A field has a wrong type
+
+    Returns:
+        tuple: Fields ready to be passed to Book
+    """
+    return (typed(json["author_name"], str),
+            typed(json["series_name"], str),
+            typed(json["isbn"], int),
+            typed(json["title"], str),
+            typed(json["series_index"], float),
+            typed(json["chapters"], int),
+            typed(json["pages"], int),
+            typed(json["released"], str),
+            typed(json["finished"], str),
+            typed(json["speed"], int),
+            typed(json["time"], float))
+
+
+def normalize_date(value: Any) -> Any:
+    """Convert a date to ISO 8601 so it sorts as text and can be indexed as a day number
+
+    Dates, datetimes, ISO 8601 strings with or without a time and strings in DATE_FORMATS are
+    converted, anything else, such as the "20XX" placeholder for an unknown date, is kept as is.
+
+    Args:
+        value (Any): Date as written by the user or read from a file
+
+    Returns:
+        Any: YYYY-MM-DD string or the unchanged value
+    """
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if type(value) != str:
+        return value
+    text = value.strip()
+    try:
+        return datetime.datetime.fromisoformat(text).date().isoformat()
+    except ValueError:
+        pass
+    for format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, format).date().isoformat()
+        except ValueError:
+            pass
+    return value
+
+
+def book_hash(book: Book) -> str:
+    """Fingerprint all of a book's fields to detect changes between imports
+
+    Args:
+        book (Book): Book to fingerprint
+
+    Returns:
+        str: Hex digest that changes whenever any field changes
+    """
+    # repr of the plain field values, dataclasses.astuple deep copies every field and is far slower
+    data = repr(tuple(book.__dict__.values())).encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class JsonStream:
+    """Incremental reader over a text file holding a single JSON document
+
+    Only a small window of the file is kept in memory, values are decoded one at a time
+    with json.JSONDecoder.raw_decode as soon as they are complete.
+    """
+
+    def __init__(self, file: TextIO, read_size: int = JSON_READ_SIZE):
+        self.file = file
+        self.read_size = read_size
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def fill(self, size: int) -> bool:
+        """Append up to size characters from the file to the buffer
+
+        Returns:
+            bool: False if the end of the file was reached before reading anything
+        """
+        if self.eof:
+            return False
+        if self.position > self.read_size:
+            self.buffer = self.buffer[self.position:]
+            self.position = 0
+        data = self.file.read(size)
+        if data == "":
+            self.eof = True
+            return False
+        self.buffer += data
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character without consuming it
+
+        Returns:
+            str: Next character or an empty string at the end of the file
+        """
+        while True:
+            while self.position < self.buffer.__len__() and self.buffer[self.position] in " \t\n\r":
+                self.position += 1
+            if self.position < self.buffer.__len__():
+                return self.buffer[self.position]
+            if not self.fill(self.read_size):
+                return ""
+
+    def expect(self, characters: str) -> str:
+        """Consume the next non-whitespace character if it's one of the expected ones
+
+        Raises:
+            json.JSONDecodeError: Next character is not one of the expected characters
+
+        Returns:
+            str: Consumed character
+        """
+        character = self.peek()
+        if character == "" or character not in characters:
+            raise json.JSONDecodeError(
+                f"Expecting one of {characters!r}", self.buffer, self.position)
+        self.position += 1
+        return character
+
+    def decode(self, raw: bool = False) -> Any:
+        """Decode the next complete JSON value
+
+        Args:
+            raw (bool, optional): Return the value's text instead, e.g. to decode it in another process. Defaults to False.
+
+        Raises:
+            json.JSONDecodeError: Value is malformed or the file ended in the middle of it
+
+        Returns:
+            Any: Decoded value or its text
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if not self.fill(max(self.read_size, self.buffer.__len__())):
+                    raise
+                continue
+            # A number at the very end of the buffer might continue in the next read
+            if end == self.buffer.__len__() and self.fill(self.read_size):
+                continue
+            start = self.position
+            self.position = end
+            return self.buffer[start:end] if raw else value
+
+    def iter_array(self, key: str, raw: bool = False) -> Iterator[Any]:
+        """Yield elements of an array stored under a top-level key one at a time
+
+        Args:
+            key (str): Key of the array in the top-level object
+            raw (bool, optional): Yield the text of every element instead of its value. Defaults to False.
+
+        Yields:
+            Iterator[Any]: Decoded elements of the array or their texts
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            return
+        while True:
+            name = self.decode()
+            self.expect(":")
+            if name == key:
+                self.expect("[")
+                if self.peek() == "]":
+                    return
+                while True:
+                    yield self.decode(raw)
+                    if self.expect(",]") == "]":
+                        return
+            self.decode()
+            if self.expect(",}") == "}":
+                return
+
+
+def library_format(location: str) -> tuple[str, Optional[str]]:
+    """Find out the format and compression of a library file from its extensions
+
+    Args:
+        location (str): Path of the file, e.g. library.csv.gz
+
+    Raises:
+        ValueError: Extension is not one of LIBRARY_EXTENSIONS
+
+    Returns:
+        tuple[str, Optional[str]]: Format and compression or None for plain files
+    """
+    root, extension = os.path.splitext(location.lower())
+    compression = COMPRESSION_EXTENSIONS.get(extension)
+    if compression != None:
+        root, extension = os.path.splitext(root)
+    if extension not in LIBRARY_EXTENSIONS:
+        raise ValueError(f"Unknown library format: {location}")
+    return LIBRARY_EXTENSIONS[extension], compression
+
+
+def open_library(location: str, mode: str = "r") -> TextIO:
+    """Open a library file as text, compressed files are decompressed on the fly
+
+    Args:
+        location (str): Path of the file
+        mode (str, optional): "r", "w" or "a". Defaults to "r".
+
+    Raises:
+        ImportError: File is compressed with zstd and zstandard is not installed
+
+    Returns:
+        TextIO: Opened file
+    """
+    format, compression = library_format(location)
+    # The csv module handles line endings itself
+    newline = "" if format == LIBRARY_FORMAT_CSV else None
+    if compression == "gzip":
+        return gzip.open(location, mode + "t", newline=newline)
+    if compression == "zstd":
+        if zstandard == None:
+            raise ImportError(
+                f"zstandard is required to read and write {location}, install it with pip install zstandard")
+        return zstandard.open(location, mode + "t", newline=newline)
+    return open(location, mode, newline=newline)
+
+
+def csv_fields(row: dict) -> dict:
+    """Turn empty cells of a CSV row into None, CSV has no other way to store a missing value
+
+    Args:
+        row (dict): Row read by csv.DictReader
+
+    Returns:
+        dict: Row with empty cells set to None
+    """
+    return {key: value if value != "" else None for key, value in row.items()}
+
+
+def iter_books_from_file(library_location: str, errors: Optional[list[str]] = None) -> Iterator[Book]:
+    """Stream books from a library file in any of the formats in LIBRARY_EXTENSIONS
+
+    Books are validated with book_row, the same as parse_shard does for iter_books_parallel.
+
+    Args:
+        library_location (str): Location of the file to load books from
+        errors (Optional[list[str]], optional): Receives descriptions of invalid books, which are skipped. Defaults to None.
+
+    Raises:
+        KeyError: A book is missing a field and errors is None
+        ValueError: A field of a book has a wrong type and errors is None
+
+    Yields:
+        Iterator[Book]: Books in the order they appear in the file
+    """
+    format, _ = library_format(library_location)
+    with open_library(library_location) as file:
+        if format == LIBRARY_FORMAT_JSON:
+            rows = ((f"book {index}", b) for index, b in enumerate(
+                JsonStream(file).iter_array("books")))
+        elif format == LIBRARY_FORMAT_JSON_LINES:
+            # Lines are decoded one at a time below so a malformed one is reported like in parse_shard
+            rows = ((number, line) for number, line in enumerate(file, 1)
+                    if line.strip() != "")
+        else:
+            # Every cell of a CSV file is a string, book_row converts numbers back
+            reader = csv.DictReader(file)
+            rows = ((reader.line_num, csv_fields(row)) for row in reader)
+        for position, b in rows:
+            try:
+                if format == LIBRARY_FORMAT_JSON_LINES:
+                    b = json.loads(b)
+                yield Book(*book_row(b))
+            except (KeyError, TypeError, ValueError) as e:
+                if errors == None:
+                    raise
+                errors.append(f"{library_location}:{position}: {e!r}")
+
+
+def write_books(books: Iterable[Book], library_location: str, append: bool = False) -> int:
+    """Write books to a library file in any of the formats in LIBRARY_EXTENSIONS
+
+    JSON Lines and CSV files can be appended to, a CSV header is only written to a new or empty
+    file. A json document has to be written as a whole.
+
+    Args:
+        books (Iterable[Book]): Books to write
+        library_location (str): Path of the file
+        append (bool, optional): Add the books to the end of an existing file. Defaults to False.
+
+    Raises:
+        ValueError: Appending to a json document
+
+    Returns:
+        int: Number of books written
+    """
+    format, _ = library_format(library_location)
+    if append and format == LIBRARY_FORMAT_JSON:
+        raise ValueError(
+            f"Can't append to {library_location}, use JSON Lines or CSV instead")
+    new = not append or not os.path.exists(
+        library_location) or os.path.getsize(library_location) == 0
+    count = 0
+    with open_library(library_location, "a" if append else "w") as file:
+        if format == LIBRARY_FORMAT_JSON:
+            file.write('{"books": [')
+            for book in books:
+                file.write((",\n" if count > 0 else "\n") +
+                           json.dumps(book.__dict__))
+                count += 1
+            file.write("\n]}\n")
+        elif format == LIBRARY_FORMAT_JSON_LINES:
+            for book in books:
+                file.write(json.dumps(book.__dict__) + "\n")
+                count += 1
+        else:
+            writer = csv.writer(file)
+            if new:
+                writer.writerow(BOOK_FIELDS)
+            for book in books:
+                writer.writerow(book.__dict__.values())
+                count += 1
+    return count
+
+
+def parse_shard(shard: tuple) -> tuple[list[tuple], list[str]]:
+    """Parse and validate a part of the input in a worker process
+
+    Args:
+        shard (tuple): ("lines", location, number of the first line, lines) for a chunk of a JSON
+            Lines file, ("rows", location, [(line number, row), ...]) for a chunk of a CSV file
+            or ("elements", location, index of the first book, texts) for books of a json file
+
+    Returns:
+        tuple[list[tuple], list[str]]: Rows of valid books and descriptions of invalid ones
+    """
+    rows = []
+    errors = []
+    if shard[0] == "lines":
+        _, location, first, lines = shard
+        for number, line in enumerate(lines, first):
+            if line.strip() == "":
+                continue
+            try:
+                rows.append(book_row(json.loads(line)))
+            except (KeyError, TypeError, ValueError) as e:
+                errors.append(f"{location}:{number}: {e!r}")
+    elif shard[0] == "rows":
+        _, location, lines = shard
+        for number, row in lines:
+            try:
+                rows.append(book_row(csv_fields(row)))
+            except (KeyError, TypeError, ValueError) as e:
+                errors.append(f"{location}:{number}: {e!r}")
+    else:
+        _, location, first, texts = shard
+        for index, text in enumerate(texts, first):
+            try:
+                rows.append(book_row(json.loads(text)))
+            except (KeyError, TypeError, ValueError) as e:
+                errors.append(f"{location}:book {index}: {e!r}")
+    return rows, errors
+
+
+def iter_shards(locations: Iterable[str], shard_lines: int = SHARD_LINES) -> Iterator[tuple]:
+    """Split the input into shards without decoding it
+
+    JSON Lines files are cut into chunks of lines. CSV rows are read here, since quoted cells may
+    span lines, and only converted by the workers. The books array of a json document is cut into
+    ranges of elements, JsonStream only finds where each one ends and the workers decode them.
+
+    Args:
+        locations (Iterable[str]): Paths of the files
+        shard_lines (int, optional): Lines, rows or books per shard. Defaults to SHARD_LINES.
+
+    Yields:
+        Iterator[tuple]: Shards accepted by parse_shard
+    """
+    for location in locations:
+        format, _ = library_format(location)
+        with open_library(location) as file:
+            if format == LIBRARY_FORMAT_JSON:
+                elements = JsonStream(file).iter_array("books", raw=True)
+                first = 0
+                texts = list(islice(elements, shard_lines))
+                while texts.__len__() > 0:
+                    yield ("elements", location, first, texts)
+                    first += texts.__len__()
+                    texts = list(islice(elements, shard_lines))
+                continue
+            if format == LIBRARY_FORMAT_CSV:
+                reader = csv.DictReader(file)
+                lines = [(reader.line_num, row) for row in islice(reader, shard_lines)]
+                while lines.__len__() > 0:
+                    yield ("rows", location, lines)
+                    lines = [(reader.line_num, row)
+                             for row in islice(reader, shard_lines)]
+                continue
+            first = 1
+            lines = list(islice(file, shard_lines))
+            while lines.__len__() > 0:
+                yield ("lines", location, first, lines)
+                first += lines.__len__()
+                lines = list(islice(file, shard_lines))
+
+
+def iter_books_parallel(locations: Iterable[str], workers: Optional[int] = None, errors: Optional[list[str]] = None, shard_lines: int = SHARD_LINES) -> Iterator[Book]:
+    """Parse files in worker processes and stream the books back in input order
+
+    At most SHARDS_PER_WORKER shards per worker are in flight, so reading stops when the consumer
+    falls behind and memory stays bounded. Workers keep parsing while the consumer writes.
+
+    Args:
+        locations (Iterable[str]): Paths of library files in any of the formats in LIBRARY_EXTENSIONS
+        workers (Optional[int], optional): Number of worker processes. Defaults to the number of cores.
+        errors (Optional[list[str]], optional): Receives descriptions of invalid books, which are skipped. Defaults to None.
+        shard_lines (int, optional): Lines of a JSON Lines file, rows of a CSV file or books of a json file per shard. Defaults to SHARD_LINES.
+
+    Yields:
+        Iterator[Book]: Valid books
+    """
+    workers = workers if workers != None else os.cpu_count()
+    shards = iter_shards(locations, shard_lines)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for shard in shards:
+            pending.append(executor.submit(parse_shard, shard))
+            if pending.__len__() >= workers * SHARDS_PER_WORKER:
+                break
+        while pending.__len__() > 0:
+            rows, shard_errors = pending.popleft().result()
+            shard = next(shards, None)
+            if shard != None:
+                pending.append(executor.submit(parse_shard, shard))
+            if errors != None:
+                errors += shard_errors
+            for row in rows:
+                yield Book(*row)
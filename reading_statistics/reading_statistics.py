@@ -1,4 +1,5 @@
-from .constants import DATABASE_LOCATION, LIBRARY_LOCATION, VIEWS_LOCATION
+from itertools import chain, islice
+from .constants import DATABASE_LOCATION, LIBRARY_LOCATION, VIEWS_LOCATION, BOOKS_PAGE_SIZE
 from .sqlite import *
 from .Book import Book
 
@@ -10,20 +11,47 @@ from .Book import Book
 def database_setup():
     """Create needed tables in database
     """
-    create_tables()
-    db.commit()
+    with db.transaction():
+        create_tables()
     print("\nTables created\n")
 
 
-def views_setup(views_location: str):
-    """Create views using SQL statements in a provided json file
+def database_migration():
+    """Update tables created by older versions to the current schema
+    """
+    with db.transaction():
+        migrate_database()
+    print("\nDatabase migrated\n")
+
+
+def database_verification():
+    """Check the whole database against the current schema and list the problems found
+    """
+    errors = verify_schema()
+    if errors.__len__() == 0:
+        print("\nDatabase verified, no problems found\n")
+    else:
+        print("\nProblems found:")
+        for error in errors:
+            print(f"\t{error}")
+
+
+def views_setup(views_location: str, refresh: bool = False):
+    """Create views using SQL statements in a provided json file, unchanged views are kept
 
     Args:
         views_location (str): Path to a json file containing SQL statements to create views
+        refresh (bool, optional): Drop and create all views again. Defaults to False.
     """
-    create_views(views_location)
-    db.commit()
-    print("\nViews created\n")
+    if create_views(views_location, refresh) != None:
+        print("\nViews created\n")
+
+
+def materialized_views_refresh():
+    """Refresh the tables of all materialized views whether they're stale or not
+    """
+    if refresh_materialized_views() != None:
+        print("\nMaterialized views refreshed\n")
 
 
 def load_json(library_location: str):
@@ -37,6 +65,16 @@ def load_json(library_location: str):
     print("\nLoading completed\n")
 
 
+def sync_json(library_location: str):
+    """Sync books data from json file, only writing books that changed since the last sync
+
+    Args:
+        library_location (str): Path to a json file containing books data
+    """
+    if sync_library_from_json(library_location) != None:
+        print("\nSync completed\n")
+
+
 def update_author():
     """Update existing author's name
     """
@@ -59,8 +97,8 @@ def update_author():
                 print(
                     f"\nThe name \"{old_name}\" does not exist in the database, try again.\n")
             else:
-                update_author_name(author_id, new_name)
-                db.commit()
+                with db.transaction():
+                    update_author_name(author_id, new_name)
                 condition = False
                 print(f"\nName has been changed to '{new_name}'.\n")
     else:
@@ -80,8 +118,8 @@ def delete_author():
                 if author_id != None:
                     number_of_series = get_authors_number_of_series(author_id)
                     if number_of_series == 0:
-                        delete_author_id(get_author_id(author_name))
-                        db.commit()
+                        with db.transaction():
+                            delete_author_id(author_id)
                         condition = False
                         id = get_author_id(author_name)
                         if id != None:
@@ -117,7 +155,11 @@ def update_series():
             old_author_id = get_author_id(old_author_name)
             new_author_id = get_author_id(new_author_name)
             old_series_id = get_series_id(old_series_name, old_author_id)
-            new_series_id = get_series_id(new_series_name, new_author_id)
+            # An empty new name or author keeps the current one
+            target_series_name = new_series_name if new_series_name != "" else old_series_name
+            target_author_name = new_author_name if new_author_name != "" else old_author_name
+            new_series_id = get_series_id(
+                target_series_name, get_author_id(target_author_name))
             if (old_series_name == "" and old_author_name == "") or (new_series_name == "" and new_author_name == ""):
                 condition = False
                 print("\nMandatory fields were empty, cancelling.\n")
@@ -126,22 +168,22 @@ def update_series():
             elif old_series_id == None:
                 print(
                     f"\nSeries \"{old_series_name}\" written by \"{old_author_name}\" does not exist in the database, try again.\n")
-            elif new_series_id != None:
+            elif new_series_id != None and new_series_id != old_series_id:
                 print(
-                    f"\nSeries \"{new_series_name}\" written by \"{old_author_name}\" already exists in the database, try again.\n")
+                    f"\nSeries \"{target_series_name}\" written by \"{target_author_name}\" already exists in the database, try again.\n")
             else:
+                # Name and author are changed together or not at all
+                with db.transaction():
+                    if new_series_name != "":
+                        update_series_name(old_series_id, new_series_name)
+                    if new_author_name != "":
+                        new_author_id = insert_author(new_author_name)
+                        update_series_author(old_series_id, new_author_id)
+                condition = False
                 if new_series_name != "":
-                    update_series_name(old_series_id, new_series_name)
-                    db.commit()
-                    condition = False
                     print(
                         f"\nUpdated series name from \"{old_series_name}\" to \"{new_series_name}\".\n")
                 if new_author_name != "":
-                    insert_author(new_author_name)
-                    new_author_id = get_author_id(new_author_name)
-                    update_series_author(old_series_id, new_author_id)
-                    db.commit()
-                    condition = False
                     print(
                         f"\nUpdated author from \"{old_author_name}\" to \"{new_author_name}\".\n")
     else:
@@ -164,8 +206,8 @@ def delete_series():
                 if series_id != None:
                     number_of_books = get_series_number_of_books(series_id)
                     if number_of_books == 0:
-                        delete_series_id(series_id)
-                        db.commit()
+                        with db.transaction():
+                            delete_series_id(series_id)
                         condition = False
                         id = get_series_id(series_name, author_id)
                         if id != None:
@@ -213,15 +255,6 @@ def add_a_book():
                 if book.isbn != "" and book.isbn != None:
                     if book.author_name == "":
                         book.author_name = None
-                        author_id = None
-                    else:
-                        insert_author(book.author_name)
-                        author_id = get_author_id(book.author_name)
-                    if book.series_name == "" or author_id == None:
-                        series_id = None
-                    else:
-                        insert_series(author_id, book.series_name)
-                        series_id = get_series_id(book.series_name, author_id)
                     if book.title == "":
                         book.title = None
                     if book.series_index == "":
@@ -249,11 +282,8 @@ def add_a_book():
                         book.time = None
                     else:
                         book.time = float(book.time)
-                    insert_book(book.isbn, series_id,
-                                book.series_index, book.title)
-                    insert_statistics(book.isbn, book.chapters, book.pages,
-                                      book.released, book.finished, book.speed, book.time)
-                    db.commit()
+                    with db.transaction():
+                        add_book(book)
                     condition = False
                     id_book = get_book_isbn(book.isbn)
                     id_statistics = get_statistics_isbn(book.isbn)
@@ -302,12 +332,18 @@ def get_books():
                 else:
                     if isbn != '':
                         isbn = int(isbn)
-                    list_of_books = get_books_info(isbn, author, series, title)
-                    if list_of_books.__len__() == 0:
+                    books = iter_books_info(isbn, author, series, title)
+                    # The first page gives the total unless there are more, only then the search is counted
+                    first_page = list(islice(books, BOOKS_PAGE_SIZE))
+                    number_of_books = first_page.__len__()
+                    if number_of_books == BOOKS_PAGE_SIZE:
+                        number_of_books = count_books_info(
+                            isbn, author, series, title)
+                    if number_of_books == 0:
                         print("\nNo books found mathing the inputs, try again.\n")
                     else:
-                        print(f"\nFound {list_of_books.__len__()} book(s):")
-                        for index, book in enumerate(list_of_books):
+                        print(f"\nFound {number_of_books} book(s):")
+                        for index, book in enumerate(chain(first_page, books)):
                             print(f"\n\tBook #{index+1}:")
                             book.print()
                         condition = False
@@ -318,6 +354,32 @@ def get_books():
             f"\nAt least one table is corrupted. Please fix them manually:\n{errors}")
 
 
+def search_library():
+    """Search books by words in their ISBN, author, series or title
+    """
+    errors = check_tables(["authors", "series", "books", "statistics"])
+    if errors.__len__() == 0:
+        condition = True
+        while condition:
+            query = input("Search: ")
+            if query.strip() == "":
+                condition = False
+                print("\nInput was empty, cancelling.\n")
+            else:
+                list_of_books = search_books(query)
+                if list_of_books.__len__() == 0:
+                    print("\nNo books found mathing the inputs, try again.\n")
+                else:
+                    print(f"\nFound {list_of_books.__len__()} book(s):")
+                    for index, book in enumerate(list_of_books):
+                        print(f"\n\tBook #{index+1}:")
+                        book.print()
+                    condition = False
+    else:
+        print(
+            f"\nAt least one table is corrupted. Please fix them manually:\n{errors}")
+
+
 def update_book():
     """Update existing book's data
     """
@@ -325,17 +387,13 @@ def update_book():
     if errors.__len__() == 0:
         condition = True
         while condition:
-            book = Book
-            book.isbn = input("Current ISBN: ")
+            current_isbn = input("Current ISBN: ")
             try:
-                if book.isbn != "":
-                    book.isbn = int(book.isbn)
-                    book.title = get_book_title(book.isbn)
-                    book.series_name = get_series_name(
-                        get_book_series_id(book.isbn))
-                    book.series_index = get_book_series_index(book.isbn)
-                    book.author_name = get_author_name(
-                        get_series_author_id(get_book_series_id(book.isbn)))
+                if current_isbn != "":
+                    book = get_book(int(current_isbn))
+                    if book == None:
+                        book = Book(None, None, int(current_isbn), None,
+                                    None, None, None, None, None, None, None)
                     print(
                         f"\n\tCurrent data:\nISBN:\t\t{book.isbn}\nTitle:\t\t{book.title}\nSeries name:\t{book.series_name}\nIndex:\t\t{book.series_index}\nAuthor:\t\t{book.author_name}\n\n")
                     isbn = input("New ISBN: ")
@@ -346,22 +404,23 @@ def update_book():
                     if isbn == "" and title == "" and series_name == "" and series_index == "" and author_name == "":
                         print("\nDid not provide updated data, try again.\n")
                     else:
+                        changes = {}
                         if isbn != "":
-                            update_book_isbn(book.isbn, int(isbn))
-                            book.isbn = int(isbn)
+                            changes["isbn"] = int(isbn)
                         if title != "":
-                            book.title = title
-                            update_book_title(book.isbn, book.title)
+                            changes["title"] = title
                         if series_name != "" and author_name != "":
-                            book.series_name = series_name
-                            book.author_name = author_name
-                            update_book_series(
-                                book.isbn, book.series_name, book.author_name)
+                            changes["series_name"] = series_name
+                            changes["author_name"] = author_name
                         if series_index != "":
-                            book.series_index = float(series_index)
-                            update_book_series_index(
-                                book.isbn, book.series_index)
-                        db.commit()
+                            changes["series_index"] = float(series_index)
+                        with db.transaction():
+                            skipped = update_book_fields(book.isbn, **changes)
+                        if "isbn" in skipped:
+                            print(
+                                f"\nISBN {changes.pop('isbn')} is already used by another book, kept {book.isbn}.\n")
+                        for field, value in changes.items():
+                            setattr(book, field, value)
                         condition = False
                         print(
                             f"\n\tUpdated data to:\nISBN:\t\t{book.isbn}\nTitle:\t\t{book.title}\nSeries name:\t{book.series_name}\nIndex:\t\t{book.series_index}\nAuthor:\t\t{book.author_name}\n\n")
@@ -390,8 +449,8 @@ def delete_book():
                     if book_id != None:
                         statistics_id = get_statistics_isbn(isbn)
                         if statistics_id == None:
-                            delete_book_isbn(book_id)
-                            db.commit()
+                            with db.transaction():
+                                delete_book_isbn(book_id)
                             condition = False
                             id = get_book_isbn(book_id)
                             if id != None:
@@ -423,17 +482,13 @@ def update_statistics():
     if errors.__len__() == 0:
         condition = True
         while condition:
-            book = Book
-            book.isbn = input("Book's ISBN: ")
-            if book.isbn != "":
+            current_isbn = input("Book's ISBN: ")
+            if current_isbn != "":
                 try:
-                    book.isbn = int(book.isbn)
-                    book.chapters = get_statistics_chapters(book.isbn)
-                    book.pages = get_statistics_pages(book.isbn)
-                    book.released = get_statistics_released(book.isbn)
-                    book.finished = get_statistics_finished(book.isbn)
-                    book.speed = get_statistics_speed(book.isbn)
-                    book.time = get_statistics_time(book.isbn)
+                    book = get_book(int(current_isbn))
+                    if book == None:
+                        book = Book(None, None, int(current_isbn), None,
+                                    None, None, None, None, None, None, None)
                     print(
                         f"\n\tCurrent data:\nISBN:\t\t{book.isbn}\nChapters:\t{book.chapters}\nPages:\t\t{book.pages}\nReleased:\t{book.released}\nFinished:\t{book.finished}\nSpeed:\t\t{book.speed}\nTime:\t\t{book.time}\n\n")
                     isbn = input("New ISBN: ")
@@ -446,29 +501,28 @@ def update_statistics():
                     if chapters == "" and pages == "" and released == "" and finished == "" and speed == "" and time == "":
                         print(f"\nDid not provide updated data, try again.\n")
                     else:
+                        changes = {}
                         if isbn != "":
-                            update_statistics_isbn(book.isbn, int(isbn))
-                            book.isbn = isbn
+                            changes["isbn"] = int(isbn)
                         if chapters != "":
-                            update_statistics_chapters(
-                                book.isbn, int(chapters))
-                            book.chapters = chapters
+                            changes["chapters"] = int(chapters)
                         if pages != "":
-                            update_statistics_pages(book.isbn, int(pages))
-                            book.pages = pages
+                            changes["pages"] = int(pages)
                         if released != "":
-                            update_statistics_released(book.isbn, released)
-                            book.released = released
+                            changes["released"] = released
                         if finished != "":
-                            update_statistics_finished(book.isbn, finished)
-                            book.finished = finished
+                            changes["finished"] = finished
                         if speed != "":
-                            update_statistics_speed(book.isbn, int(speed))
-                            book.speed = speed
+                            changes["speed"] = int(speed)
                         if time != "":
-                            update_statistics_time(book.isbn, float(time))
-                            book.time = float(time)
-                        db.commit()
+                            changes["time"] = float(time)
+                        with db.transaction():
+                            skipped = update_book_fields(book.isbn, **changes)
+                        if "isbn" in skipped:
+                            print(
+                                f"\nISBN {changes.pop('isbn')} is already used by another book, kept {book.isbn}.\n")
+                        for field, value in changes.items():
+                            setattr(book, field, value)
                         condition = False
                         print(
                             f"\n\tUpdated data to:\nISBN:\t\t{book.isbn}\nChapters:\t{book.chapters}\nPages:\t\t{book.pages}\nReleased:\t{book.released}\nFinished:\t{book.finished}\nSpeed:\t\t{book.speed}\nTime:\t\t{book.time}\n\n")
@@ -494,8 +548,8 @@ def delete_statistics():
                     isbn = int(isbn)
                     statistics_id = get_statistics_isbn(isbn)
                     if statistics_id != None:
-                        delete_statistics_isbn(isbn)
-                        db.commit()
+                        with db.transaction():
+                            delete_statistics_isbn(isbn)
                         condition = False
                         id = get_statistics_isbn(isbn)
                         if id != None:
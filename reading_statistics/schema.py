@@ -0,0 +1,253 @@
+from sqlalchemy import MetaData, Table, Column, String, Integer, Float, ForeignKey, Index, DDL, Computed, event, func
+
+metadata_obj = MetaData()
+
+
+def epoch_day(column: str) -> Computed:
+    """Number of days since 1970-01-01 of an ISO 8601 date, NULL for anything else
+
+    The glob keeps values like "20XX" out, julianday would read a bare number as a day count.
+    Virtual columns take no space and can be added to existing tables and indexed.
+    """
+    return Computed(f"case when {column} glob '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*' then cast(julianday(substr({column}, 1, 10)) - 2440587.5 as integer) end", persisted=False)
+
+
+
+# Foreign keys document how the tables relate and are checked by verify_schema with
+# PRAGMA foreign_key_check. PRAGMA foreign_keys is left off, so they're not enforced on write:
+# authors and series can be deleted while rows still point at them.
+authors = Table('authors',
+                metadata_obj,
+                Column('author_id', Integer,
+                       primary_key=True, autoincrement=True),
+                Column('name', String, unique=True, nullable=False))
+series = Table('series',
+               metadata_obj,
+               Column('series_id', Integer,
+                      primary_key=True, autoincrement=True),
+               Column('name', String, nullable=False),
+               Column('author_id', Integer, ForeignKey(
+                   'authors.author_id'), nullable=False),
+               Index('ux_series_author_id_name', 'author_id', 'name', unique=True))
+books = Table('books',
+              metadata_obj,
+              Column('isbn', Integer, primary_key=True, unique=True),
+              Column('series_id', Integer, ForeignKey(
+                  'series.series_id'), nullable=True),
+              Column('series_index', Float, nullable=True),
+              Column('title', String, nullable=True),
+              Index('ix_books_series_id', 'series_id'))
+statistics = Table('statistics',
+                   metadata_obj,
+                   Column('isbn', Integer, primary_key=True, unique=True),
+                   Column('chapters', Integer, nullable=True),
+                   Column('pages', Integer, nullable=True),
+                   Column('released', String, nullable=True),
+                   Column('finished', String, nullable=True),
+                   Column('speed', Integer, nullable=True),
+                   Column('time', Float, nullable=True),
+                   Column('released_day', Integer, epoch_day('released')),
+                   Column('finished_day', Integer, epoch_day('finished')),
+                   Index('ix_statistics_released_day', 'released_day'),
+                   Index('ix_statistics_finished_day', 'finished_day'))
+# Content hash of every book as it was last synced from a library file
+book_hashes = Table('book_hashes',
+                    metadata_obj,
+                    Column('isbn', Integer, primary_key=True),
+                    Column('hash', String, nullable=False))
+# Matches the keyset used by iter_books_info so every page is read straight from the index
+Index('ix_statistics_released_isbn', func.coalesce(
+    statistics.c.released, ''), statistics.c.isbn)
+
+# Hash of the definition every view from views.json was last created with
+view_hashes = Table('view_hashes',
+                    metadata_obj,
+                    Column('name', String, primary_key=True),
+                    Column('hash', String, nullable=False))
+# Views from views.json kept as tables, stale is set by MATERIALIZED_TRIGGERS whenever data they read changes
+materialized_views = Table('materialized_views',
+                           metadata_obj,
+                           Column('name', String, primary_key=True),
+                           Column('refresh', String, nullable=False),
+                           Column('interval', Float),
+                           Column('refreshed_at', Float),
+                           Column('stale', Integer,
+                                  nullable=False, server_default="1"),
+                           Column('position', Integer, nullable=False))
+# Tables every materialized view reads, directly or through the views it uses
+materialized_view_tables = Table('materialized_view_tables',
+                                 metadata_obj,
+                                 Column('name', String, primary_key=True),
+                                 Column('table_name', String, primary_key=True),
+                                 Index('ix_materialized_view_tables_table_name', 'table_name'))
+# Running totals of statistics per finish year, author and series, kept up to date by the
+# ROLLUP_TRIGGERS so reports read one row per group instead of every book
+ROLLUP_COLUMNS = ("books", "finished", "chapters", "pages",
+                  "time", "speed_sum", "speed_count")
+
+
+def rollup_table(name: str, key: Column) -> Table:
+    """Define a table of rollup totals with one row per key
+
+    Args:
+        name (str): Name of the table
+        key (Column): Primary key column identifying the group
+
+    Returns:
+        Table: Table with the key and ROLLUP_COLUMNS
+    """
+    return Table(name,
+                 metadata_obj,
+                 key,
+                 *[Column(column, Float if column == "time" else Integer, nullable=False, server_default="0")
+                   for column in ROLLUP_COLUMNS])
+
+
+rollup_years = rollup_table(
+    'rollup_years', Column('year', String, primary_key=True))
+rollup_authors = rollup_table(
+    'rollup_authors', Column('author_id', Integer, primary_key=True))
+rollup_series = rollup_table(
+    'rollup_series', Column('series_id', Integer, primary_key=True))
+
+# Groups a statistics row counts towards, as (table, key column, select of the key as key) with the row as {row}
+ROLLUP_GROUPS = {
+    "year": ("rollup_years", "year", "select substr({row}.finished, 1, 4) as key where {row}.finished is not null"),
+    "series": ("rollup_series", "series_id", "select b.series_id as key from books as b where b.isbn = {row}.isbn and b.series_id is not null"),
+    "author": ("rollup_authors", "author_id", "select s.author_id as key from books as b join series as s on s.series_id = b.series_id where b.isbn = {row}.isbn")}
+
+
+def rollup_add(group: str, row: str, sign: int = 1, source: str = "") -> str:
+    """Build statements adding a statistics row to, or with sign -1 removing it from, the totals of its group
+
+    Args:
+        group (str): Key of ROLLUP_GROUPS
+        row (str): Name of the statistics row, new or old inside triggers
+        sign (int, optional): 1 to add the row, -1 to remove it. Defaults to 1.
+        source (str, optional): Select of the key, named key, replacing the one from ROLLUP_GROUPS. Defaults to "".
+
+    Returns:
+        str: Statements separated by semicolons, ready to be put in a trigger body
+    """
+    table, key, select = ROLLUP_GROUPS[group]
+    select = (source if source != "" else select).format(row=row)
+    keys = f"select key from ({select})"
+    values = f"{sign}, {sign} * ({row}.finished is not null), {sign} * coalesce({row}.chapters, 0), {sign} * coalesce({row}.pages, 0), {sign} * coalesce({row}.time, 0), {sign} * coalesce({row}.speed, 0), {sign} * ({row}.speed is not null)"
+    # Keys come from a subquery so inserting with a select never needs ON CONFLICT after a join
+    statements = f"insert into {table} ({key}, {', '.join(ROLLUP_COLUMNS)}) select k.key, {values} from ({select}) as k where true on conflict ({key}) do update set {', '.join(f'{column} = {column} + excluded.{column}' for column in ROLLUP_COLUMNS)};"
+    if sign < 0:
+        statements += f" delete from {table} where {key} in ({keys}) and books = 0;"
+    return statements
+
+
+def rollup_move(author: str, series_id: str, sign: int) -> str:
+    """Build statements adding the totals of a series to, or with sign -1 removing them from, an author
+
+    Args:
+        author (str): Expression of the author's ID
+        series_id (str): Expression of the series' ID
+        sign (int): 1 to add the totals, -1 to remove them
+
+    Returns:
+        str: Statements separated by semicolons, ready to be put in a trigger body
+    """
+    statements = f"insert into rollup_authors (author_id, {', '.join(ROLLUP_COLUMNS)}) select {author}, {', '.join(f'{sign} * r.{column}' for column in ROLLUP_COLUMNS)} from rollup_series as r where r.series_id = {series_id} on conflict (author_id) do update set {', '.join(f'{column} = {column} + excluded.{column}' for column in ROLLUP_COLUMNS)};"
+    if sign < 0:
+        statements += f" delete from rollup_authors where author_id = {author} and books = 0;"
+    return statements
+
+
+# Statistics of a book as rows of the {row} alias keyed by its series or its series' author
+BOOK_SERIES_STATISTICS = "select {book}.series_id as key, st.* from statistics as st where st.isbn = {book}.isbn and {book}.series_id is not null"
+BOOK_AUTHOR_STATISTICS = "select s.author_id as key, st.* from statistics as st join series as s on s.series_id = {book}.series_id where st.isbn = {book}.isbn"
+
+
+def rollup_book(book: str, sign: int) -> str:
+    """Build statements adding the statistics of a book to, or removing them from, its series and author"""
+    return rollup_add("series", "k", sign, BOOK_SERIES_STATISTICS.format(book=book)) + " " + rollup_add("author", "k", sign, BOOK_AUTHOR_STATISTICS.format(book=book))
+
+
+def rollup_statistics(row: str, sign: int) -> str:
+    """Build statements adding a statistics row to, or removing it from, all of its groups"""
+    return " ".join(rollup_add(group, row, sign) for group in ROLLUP_GROUPS)
+
+
+ROLLUP_TRIGGERS = {
+    "rollup_statistics_insert": f"after insert on statistics begin {rollup_statistics('new', 1)} end",
+    "rollup_statistics_delete": f"after delete on statistics begin {rollup_statistics('old', -1)} end",
+    "rollup_statistics_update": f"after update on statistics when old.isbn is not new.isbn or old.finished is not new.finished or old.chapters is not new.chapters or old.pages is not new.pages or old.time is not new.time or old.speed is not new.speed begin {rollup_statistics('old', -1)} {rollup_statistics('new', 1)} end",
+    "rollup_books_insert": f"after insert on books begin {rollup_book('new', 1)} end",
+    "rollup_books_delete": f"after delete on books begin {rollup_book('old', -1)} end",
+    "rollup_books_update": f"after update on books when old.isbn is not new.isbn or old.series_id is not new.series_id begin {rollup_book('old', -1)} {rollup_book('new', 1)} end",
+    "rollup_series_insert": f"after insert on series begin {rollup_move('new.author_id', 'new.series_id', 1)} end",
+    "rollup_series_update": f"after update of author_id on series when old.author_id is not new.author_id begin {rollup_move('old.author_id', 'old.series_id', -1)} {rollup_move('new.author_id', 'new.series_id', 1)} end",
+    "rollup_series_delete": f"after delete on series begin {rollup_move('old.author_id', 'old.series_id', -1)} end"}
+# Totals of deleted series and authors are kept like REBUILD_ROLLUPS counts them, from the books and
+# series still pointing at them, and a series created with the same ID takes its books over
+RETIRED_ROLLUP_TRIGGERS = ["rollup_authors_delete"]
+ROLLUPS = [f"create trigger if not exists {name} {body}" for name,
+           body in ROLLUP_TRIGGERS.items()]
+ROLLUP_TOTALS = "count(*), count(st.finished), coalesce(sum(st.chapters), 0), coalesce(sum(st.pages), 0), coalesce(sum(st.time), 0), coalesce(sum(st.speed), 0), count(st.speed)"
+REBUILD_ROLLUPS = [
+    "delete from rollup_years",
+    "delete from rollup_series",
+    "delete from rollup_authors",
+    f"insert into rollup_years select substr(st.finished, 1, 4), {ROLLUP_TOTALS} from statistics as st where st.finished is not null group by 1",
+    f"insert into rollup_series select b.series_id, {ROLLUP_TOTALS} from statistics as st join books as b on b.isbn = st.isbn where b.series_id is not null group by 1",
+    f"insert into rollup_authors select s.author_id, {ROLLUP_TOTALS} from statistics as st join books as b on b.isbn = st.isbn join series as s on s.series_id = b.series_id group by 1"]
+
+
+# Full-text index over the searchable fields of every book, rowid is the book's ISBN.
+# Triggers keep it in sync with books and with renames of their series and authors.
+BOOKS_FTS_ROWS = "select b.isbn, b.isbn, a.name, s.name, b.title from books as b left join series as s on s.series_id = b.series_id left join authors as a on a.author_id = s.author_id"
+SEARCH_INDEX_TRIGGERS = {
+    "books_fts_insert": f"after insert on books begin insert into books_fts (rowid, isbn, author, series, title) {BOOKS_FTS_ROWS} where b.isbn = new.isbn; end",
+    "books_fts_delete": "after delete on books begin delete from books_fts where rowid = old.isbn; end",
+    "books_fts_update": f"after update on books when old.isbn is not new.isbn or old.series_id is not new.series_id or old.title is not new.title begin delete from books_fts where rowid = old.isbn; insert into books_fts (rowid, isbn, author, series, title) {BOOKS_FTS_ROWS} where b.isbn = new.isbn; end",
+    "series_fts_insert": f"after insert on series begin delete from books_fts where rowid in (select isbn from books where series_id = new.series_id); insert into books_fts (rowid, isbn, author, series, title) {BOOKS_FTS_ROWS} where b.series_id = new.series_id; end",
+    "series_fts_update": f"after update of name, author_id on series when old.name is not new.name or old.author_id is not new.author_id begin delete from books_fts where rowid in (select isbn from books where series_id in (old.series_id, new.series_id)); insert into books_fts (rowid, isbn, author, series, title) {BOOKS_FTS_ROWS} where b.series_id in (old.series_id, new.series_id); end",
+    "series_fts_delete": f"after delete on series begin delete from books_fts where rowid in (select isbn from books where series_id = old.series_id); insert into books_fts (rowid, isbn, author, series, title) {BOOKS_FTS_ROWS} where b.series_id = old.series_id; end",
+    "authors_fts_insert": f"after insert on authors begin delete from books_fts where rowid in (select isbn from books where series_id in (select series_id from series where author_id = new.author_id)); insert into books_fts (rowid, isbn, author, series, title) {BOOKS_FTS_ROWS} where s.author_id = new.author_id; end",
+    "authors_fts_update": f"after update of name on authors when old.name is not new.name begin delete from books_fts where rowid in (select isbn from books where series_id in (select series_id from series where author_id = new.author_id)); insert into books_fts (rowid, isbn, author, series, title) {BOOKS_FTS_ROWS} where s.author_id = new.author_id; end",
+    "authors_fts_delete": f"after delete on authors begin delete from books_fts where rowid in (select isbn from books where series_id in (select series_id from series where author_id = old.author_id)); insert into books_fts (rowid, isbn, author, series, title) {BOOKS_FTS_ROWS} where s.author_id = old.author_id; end"}
+SEARCH_INDEX = ["create virtual table if not exists books_fts using fts5(isbn, author, series, title, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"] + \
+    [f"create trigger if not exists {name} {body}" for name,
+     body in SEARCH_INDEX_TRIGGERS.items()]
+REBUILD_SEARCH_INDEX = [
+    "delete from books_fts",
+    f"insert into books_fts (rowid, isbn, author, series, title) {BOOKS_FTS_ROWS}"]
+
+# Points books at the oldest of duplicated series and removes the rest, needed before the
+# unique index on series can be created in databases from older versions
+MERGE_DUPLICATE_SERIES = [
+    "update books set series_id = (select min(d.series_id) from series as s join series as d on d.author_id = s.author_id and d.name = s.name where s.series_id = books.series_id) where series_id in (select s.series_id from series as s join series as d on d.author_id = s.author_id and d.name = s.name and d.series_id < s.series_id)",
+    "delete from series where exists (select 1 from series as d where d.author_id = series.author_id and d.name = series.name and d.series_id < series.series_id)"]
+
+# Tables a materialized view can read by the tables whose changes it has to follow, the rollups
+# and the search index are kept in sync with the tables they're built from by their own triggers
+MATERIALIZED_SOURCES = {
+    "authors": ("authors",),
+    "series": ("series",),
+    "books": ("books",),
+    "statistics": ("statistics",),
+    "rollup_years": ("statistics",),
+    "rollup_series": ("books", "statistics"),
+    "rollup_authors": ("series", "books", "statistics"),
+    "books_fts": ("authors", "series", "books")}
+
+
+def materialized_trigger(table: Table, event: str) -> str:
+    """Build a trigger marking the materialized views reading a table stale, updates only count if a stored column changes"""
+    changed = " or ".join(f"old.{column.name} is not new.{column.name}"
+                          for column in table.columns if column.computed == None)
+    when = f" when {changed}" if event == "update" else ""
+    return f"after {event} on {table.name}{when} begin update materialized_views set stale = 1 where stale = 0 and name in (select name from materialized_view_tables where table_name = '{table.name}'); end"
+
+
+MATERIALIZED_TRIGGERS = {f"materialized_{table.name}_{event}": materialized_trigger(table, event)
+                         for table in (authors, series, books, statistics) for event in ("insert", "update", "delete")}
+MATERIALIZED = [f"create trigger if not exists {name} {body}" for name,
+                body in MATERIALIZED_TRIGGERS.items()]
+
+for statement in SEARCH_INDEX + ROLLUPS + MATERIALIZED:
+    event.listen(metadata_obj, "after_create", DDL(statement))
@@ -1,63 +1,182 @@
+import graphlib
+import hashlib
 import json
-from io import StringIO
-from sqlalchemy import create_engine, text, exc, MetaData, Table, Column, String, Integer, Float
-from typing import Optional
+import re
+import threading
+import time
+from itertools import islice
+from sqlalchemy import text, exc, Connection, Executable
+from typing import Any, Iterable, Iterator, NamedTuple, Optional
 from .constants import *
 from .Book import Book
 from .Database import Database
-
+from .IdentityCache import CacheInfo
+import datetime
+from sqlalchemy.schema import CreateColumn
+from .library_io import load_book, iter_books_from_file, iter_books_parallel, write_books, book_hash, normalize_date
+from .statements import *
+from .schema import metadata_obj, view_hashes, materialized_views, materialized_view_tables, MATERIALIZED_SOURCES, SEARCH_INDEX, SEARCH_INDEX_TRIGGERS, REBUILD_SEARCH_INDEX, MERGE_DUPLICATE_SERIES, ROLLUPS, ROLLUP_TRIGGERS, RETIRED_ROLLUP_TRIGGERS, REBUILD_ROLLUPS, MATERIALIZED, MATERIALIZED_TRIGGERS
+
+# Nothing is opened at import, the engine and connections are created on first use
 db = Database
-db.engine = create_engine(f"sqlite+pysqlite:///{DATABASE_LOCATION}")
-db.connection = db.engine.connect()
 
+# Columns of each table that can be changed with update_book_fields
+BOOK_COLUMNS = {"books": ("isbn", "series_id", "series_index", "title"),
+                "statistics": ("isbn", "chapters", "pages", "released", "finished", "speed", "time")}
+
+
+def get_connection() -> Connection:
+    """Return the connection of the running thread or task, connecting on first use
+
+    Returns:
+        Connection: Connection to the configured database
+    """
+    return db.connection
+
+
+def set_database_location(location: str, **pool):
+    """Use another database file from now on, it's opened on first use
+
+    Args:
+        location (str): Path of the database file or ":memory:"
+        **pool: Pool and PRAGMA profile settings passed to create_database_engine
+    """
+    db.open(location, **pool)
+
+
+def fetch_scalar(statement: Executable, parameters: Optional[dict] = None, default: Any = None) -> Any:
+    """Return the first column of the first row returned by a statement
+
+    Only a single row is fetched and the cursor is closed right away, nothing is copied.
 
-def load_book(json: dict) -> Book:
-    """Extract data about individual book from json file and return a Book object containing that data
+    Args:
+        statement (Executable): Statement to execute
+        parameters (Optional[dict], optional): Values for the bound parameters. Defaults to None.
+        default (Any, optional): Value returned when there are no rows or the value is NULL. Defaults to None.
+
+    Returns:
+        Any: Value of the first column or default
+    """
+    value = db.connection.execute(statement, parameters).scalar()
+    return default if value == None else value
+
+
+def get_table_columns(table: str) -> set[str]:
+    """Read the names of a table's columns from PRAGMA table_xinfo without touching its rows
+
+    Unlike table_info, table_xinfo lists generated columns as well.
 
     Args:
-        json (dict): JSON object containing book's data
+        table (str): Name of the table
 
     Returns:
-        Book: Object containing book's data
+        set[str]: Names of the columns, empty if the table doesn't exist
     """
-    return Book(json["author_name"],
-                json["series_name"],
-                json["isbn"],
-                json["title"],
-                json["series_index"],
-                json["chapters"],
-                json["pages"],
-                json["released"],
-                json["finished"],
-                json["speed"],
-                json["time"])
+    return set(row[1] for row in db.connection.exec_driver_sql(f"PRAGMA table_xinfo({table})"))
+
+
+def get_table_errors(table: str) -> list[str]:
+    """Compare a table in the database with its definition in the schema
+
+    Generated columns are left out, they are never written and tables from older versions keep
+    working without them until they're migrated.
+
+    Args:
+        table (str): Name of a table defined in schema.py
+
+    Returns:
+        list[str]: Missing table or missing columns, empty if the table is fine
+    """
+    columns = get_table_columns(table)
+    if columns.__len__() == 0:
+        return [f"Table {table} does not exist"]
+    missing = [column.name for column in metadata_obj.tables[table].columns
+               if column.name not in columns and column.computed == None]
+    if missing.__len__() > 0:
+        return [f"Table {table} is missing columns: {', '.join(missing)}"]
+    return []
 
 
 def check_tables(queries: list[str]) -> list[str]:
-    """Using provided list of queries check if tables contain all columns
+    """Check if tables contain all columns or if queries can be run
+
+    Tables from the schema are checked with PRAGMA table_info once, healthy ones are remembered
+    until the schema is changed by this module. Anything else is run as a query.
 
     Args:
-        queries (list[str]): List of queries used to check if tables are corrupted
+        queries (list[str]): Names of tables or queries used to check if tables are corrupted
 
     Returns:
         list[str]: List of errors encountered
     """
     errors = []
     for query in queries:
-        if query == "authors":
-            q = "select author_id, name from authors"
-        elif query == "series":
-            q = "select series_id, name, author_id from series"
-        elif query == "books":
-            q = "select isbn, series_id, series_index, title from books"
-        elif query == "statistics":
-            q = "select isbn, chapters, pages, released, finished, speed, time from statistics"
+        if query in db.schema_cache:
+            continue
+        if query in metadata_obj.tables:
+            table_errors = get_table_errors(query)
+            if table_errors.__len__() == 0:
+                db.schema_cache.add(query)
+            errors += table_errors
         else:
-            q = query
-        try:
-            db.connection.execute(text(q))
-        except exc.OperationalError as e:
-            errors.append(e)
+            try:
+                db.connection.execute(text(query))
+            except exc.OperationalError as e:
+                errors.append(f"{query}: {e.orig}")
+    return errors
+
+
+def verify_schema() -> list[str]:
+    """Check the whole database against the schema
+
+    Looks at columns, foreign keys, indexes, the search index, rollup and materialized view
+    triggers, tables of materialized views, the integrity of the file and rows pointing at missing
+    authors or series. Results for tables are cached.
+
+    Returns:
+        list[str]: List of problems found
+    """
+    db.schema_cache.clear()
+    errors = []
+    objects = set(name for (name,) in db.connection.exec_driver_sql(
+        "select name from sqlite_master"))
+    for table in metadata_obj.sorted_tables:
+        table_errors = get_table_errors(table.name)
+        errors += table_errors
+        if table_errors.__len__() > 0:
+            continue
+        db.schema_cache.add(table.name)
+        columns = get_table_columns(table.name)
+        for column in table.columns:
+            if column.name not in columns:
+                errors.append(
+                    f"Table {table.name} is missing generated column {column.name}, run the migration")
+        if table.foreign_keys.__len__() > 0 and db.connection.exec_driver_sql(f"PRAGMA foreign_key_list({table.name})").first() == None:
+            errors.append(
+                f"Table {table.name} has no foreign keys, run the migration")
+        for index in table.indexes:
+            if index.name not in objects:
+                errors.append(f"Index {index.name} does not exist")
+    for name in ["books_fts"] + list(SEARCH_INDEX_TRIGGERS):
+        if name not in objects:
+            errors.append(f"Search index object {name} does not exist")
+    for name in ROLLUP_TRIGGERS:
+        if name not in objects:
+            errors.append(f"Rollup trigger {name} does not exist")
+    for name in MATERIALIZED_TRIGGERS:
+        if name not in objects:
+            errors.append(f"Materialized view trigger {name} does not exist")
+    if "materialized_views" in db.schema_cache:
+        for view in get_materialized_views():
+            if view.name not in objects or view.name + MATERIALIZED_SOURCE_SUFFIX not in objects:
+                errors.append(
+                    f"Materialized view {view.name} is missing its table or query, create the views again")
+    for (result,) in db.connection.exec_driver_sql("PRAGMA quick_check"):
+        if result != "ok":
+            errors.append(f"Integrity check: {result}")
+    for table, rowid, parent, _ in db.connection.exec_driver_sql("PRAGMA foreign_key_check"):
+        errors.append(
+            f"Row {rowid} of table {table} points at a missing row of {parent}")
     return errors
 
 
@@ -65,100 +184,850 @@ def create_tables():
     """Create needed tables in database
     """
     print("Creating tables")
-    # for i in CREATE_TABLES:
-    #     db.connection.execute(text(i))
-    metadata_obj = MetaData()
-    author = Table('authors',
-                   metadata_obj,
-                   Column('author_id', Integer,
-                          primary_key=True, autoincrement=True),
-                   Column('name', String, unique=True, nullable=False))
-    series = Table('series',
-                   metadata_obj,
-                   Column('series_id', Integer,
-                          primary_key=True, autoincrement=True),
-                   Column('name', String, nullable=False),
-                   Column('author_id', Integer, nullable=False))
-    books = Table('books',
-                  metadata_obj,
-                  Column('isbn', Integer, primary_key=True, unique=True),
-                  Column('series_id', Integer, nullable=True),
-                  Column('series_index', Float, nullable=True),
-                  Column('title', String, nullable=True)
-                  )
-    statistics = Table('statistics',
-                       metadata_obj,
-                       Column('isbn', Integer, primary_key=True, unique=True),
-                       Column('chapters', Integer, nullable=True),
-                       Column('pages', Integer, nullable=True),
-                       Column('released', String, nullable=True),
-                       Column('finished', String, nullable=True),
-                       Column('speed', Integer, nullable=True),
-                       Column('time', Float, nullable=True))
-    metadata_obj.create_all(db.engine)
-
-
-def create_views(views_location: str):
-    """Load queries to create views
+    metadata_obj.create_all(db.connection)
+    db.schema_cache.clear()
+
+
+def migrate_database():
+    """Bring tables created by older versions up to the current schema
+
+    Tables missing their foreign keys are rebuilt and copied over, missing generated columns and
+    indexes are created and dates are converted to ISO 8601.
+    """
+    print("Migrating database")
+    db.clear_caches()
+    rollups_exist = db.connection.exec_driver_sql(
+        "select name from sqlite_master where name = 'rollup_years'").first() != None
+    for table in metadata_obj.sorted_tables:
+        table.create(db.connection, checkfirst=True)
+    if db.connection.exec_driver_sql("select name from sqlite_master where name = 'ux_series_author_id_name'").first() == None:
+        for statement in MERGE_DUPLICATE_SERIES:
+            db.connection.exec_driver_sql(statement)
+        db.connection.exec_driver_sql(
+            "drop index if exists ix_series_author_id_name")
+    db.connection.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+    try:
+        for table in metadata_obj.sorted_tables:
+            if table.foreign_keys.__len__() == 0:
+                continue
+            existing = db.connection.exec_driver_sql(
+                f"PRAGMA foreign_key_list({table.name})").all()
+            if existing.__len__() == 0:
+                # Views are not rewritten while renaming in legacy mode so they keep pointing at the new table
+                db.connection.exec_driver_sql(
+                    f"alter table {table.name} rename to {table.name}_old")
+                table.create(db.connection)
+                columns = ", ".join(column.name for column in table.columns
+                                    if column.computed == None)
+                db.connection.exec_driver_sql(
+                    f"insert into {table.name} ({columns}) select {columns} from {table.name}_old")
+                db.connection.exec_driver_sql(f"drop table {table.name}_old")
+    finally:
+        db.connection.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+    for table in metadata_obj.sorted_tables:
+        columns = get_table_columns(table.name)
+        for column in table.columns:
+            if column.name not in columns and column.computed != None:
+                db.connection.exec_driver_sql(
+                    f"alter table {table.name} add column {CreateColumn(column).compile(dialect=db.connection.dialect)}")
+    normalize_dates()
+    indexes = set(name for (name,) in db.connection.exec_driver_sql(
+        "select name from sqlite_master where type = 'index'"))
+    for table in metadata_obj.sorted_tables:
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(db.connection)
+    search_index_exists = db.connection.exec_driver_sql(
+        "select name from sqlite_master where name = 'books_fts'").first() != None
+    # Triggers are recreated so their definitions follow the current version
+    for name in SEARCH_INDEX_TRIGGERS:
+        db.connection.exec_driver_sql(f"drop trigger if exists {name}")
+    for statement in SEARCH_INDEX:
+        db.connection.exec_driver_sql(statement)
+    if not search_index_exists:
+        rebuild_search_index()
+    for name in list(ROLLUP_TRIGGERS) + RETIRED_ROLLUP_TRIGGERS:
+        db.connection.exec_driver_sql(f"drop trigger if exists {name}")
+    for statement in ROLLUPS:
+        db.connection.exec_driver_sql(statement)
+    if not rollups_exist:
+        rebuild_rollups()
+    for name in MATERIALIZED_TRIGGERS:
+        db.connection.exec_driver_sql(f"drop trigger if exists {name}")
+    for statement in MATERIALIZED:
+        db.connection.exec_driver_sql(statement)
+
+
+def rebuild_rollups():
+    """Recompute the rollup tables from scratch, they're kept up to date by triggers afterwards
+    """
+    for statement in REBUILD_ROLLUPS:
+        db.connection.exec_driver_sql(statement)
+
+
+class Rollup(NamedTuple):
+    key: Any
+    name: Optional[str]
+    books: int
+    finished: int
+    chapters: int
+    pages: int
+    time: float
+    average_speed: Optional[float]
+
+
+def get_rollups(statement: Executable) -> list[Rollup]:
+    """Read totals of all groups from one of the rollup tables
+
+    Args:
+        statement (Executable): One of SELECT_YEAR_ROLLUPS, SELECT_AUTHOR_ROLLUPS and SELECT_SERIES_ROLLUPS
+
+    Returns:
+        list[Rollup]: Totals of every group with at least one book
+    """
+    return [Rollup(*row) for row in db.connection.execute(statement)]
+
+
+def get_year_rollups() -> list[Rollup]:
+    """Get totals of books per year they were finished in, keyed by the year
+
+    Returns:
+        list[Rollup]: Totals ordered by year
+    """
+    return get_rollups(SELECT_YEAR_ROLLUPS)
+
+
+def get_author_rollups() -> list[Rollup]:
+    """Get totals of books per author, keyed by the author's ID
+
+    Returns:
+        list[Rollup]: Totals ordered by the author's name
+    """
+    return get_rollups(SELECT_AUTHOR_ROLLUPS)
+
+
+def get_series_rollups() -> list[Rollup]:
+    """Get totals of books per series, keyed by the series' ID
+
+    Returns:
+        list[Rollup]: Totals ordered by the series' name
+    """
+    return get_rollups(SELECT_SERIES_ROLLUPS)
+
+
+def normalize_dates() -> int:
+    """Convert release and finish dates written by older versions to ISO 8601
+
+    Returns:
+        int: Number of rows changed
+    """
+    rows = []
+    for isbn, released, finished in db.connection.execute(SELECT_NON_ISO_DATES):
+        new_released = normalize_date(released)
+        new_finished = normalize_date(finished)
+        if new_released != released or new_finished != finished:
+            rows.append({"isbn": isbn, "released": new_released,
+                         "finished": new_finished})
+    if rows.__len__() > 0:
+        db.connection.execute(UPDATE_STATISTICS_DATES, rows)
+    return rows.__len__()
+
+
+def rebuild_search_index():
+    """Fill the full-text search index from scratch using current books, series and authors
+    """
+    for statement in REBUILD_SEARCH_INDEX:
+        db.connection.exec_driver_sql(statement)
+
+
+class ViewDefinition(NamedTuple):
+    name: str
+    statement: str
+    hash: str
+    dependencies: frozenset[str]
+    query: str
+    materialized: Optional[str]
+    interval: Optional[float]
+    tables: frozenset[str]
+
+
+class ViewsSummary(NamedTuple):
+    created: int
+    replaced: int
+    dropped: int
+    unchanged: int
+
+
+class MaterializedView(NamedTuple):
+    name: str
+    refresh: str
+    interval: Optional[float]
+    refreshed_at: Optional[float]
+    stale: bool
+
+
+VIEW_STATEMENT = re.compile(
+    r"\s*create\s+view\s+(?:if\s+not\s+exists\s+)?(?:'([^']+)'|\"([^\"]+)\"|\[([^\]]+)\]|(\w+))\s+as\s+(.*)", re.IGNORECASE | re.DOTALL)
+
+
+def quote_name(name: str) -> str:
+    """Quote a name of a table or view for use in SQL
+
+    Args:
+        name (str): Name to quote
+
+    Returns:
+        str: Name in double quotes
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+
+def view_reference(name: str) -> re.Pattern:
+    """Build a pattern matching a view's name in a query quoted in any of the ways SQLite accepts
+
+    Args:
+        name (str): Name of the view
+
+    Returns:
+        re.Pattern: Pattern matching the quoted name, or also the bare one if it's a plain identifier
+    """
+    escaped = re.escape(name)
+    pattern = f"'{escaped}'|\"{escaped}\"|`{escaped}`|\\[{escaped}\\]"
+    if re.fullmatch(r"[A-Za-z_]\w*", name) != None:
+        pattern += f"|\\b{escaped}\\b"
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def load_view_definitions(views_location: str) -> list[ViewDefinition]:
+    """Read views from a json file and find out which of them use each other
+
+    A view can be marked with "materialized" set to one of REFRESH_POLICIES, or true for
+    REFRESH_MANUAL, and timer views can set their "interval" in seconds. Tables whose changes
+    a view has to follow are found by their names in its query, see MATERIALIZED_SOURCES.
+
+    Args:
+        views_location (str): Location of json file with queries to load views
+
+    Raises:
+        ValueError: A statement is not a create view statement or a refresh policy is unknown
+
+    Returns:
+        list[ViewDefinition]: Views in the order they're in the file
+    """
+    with open(views_location, "r") as file:
+        data = json.load(file)
+    parsed = []
+    for v in data["views"]:
+        match = VIEW_STATEMENT.fullmatch(v["view"])
+        if match == None:
+            raise ValueError(
+                f"Not a create view statement: {v['view'][:80]}")
+        name = next(group for group in match.groups()[:4] if group != None)
+        materialized = v.get("materialized")
+        if materialized == True:
+            materialized = REFRESH_MANUAL
+        if materialized != None and materialized not in REFRESH_POLICIES:
+            raise ValueError(
+                f"Unknown refresh policy of view {name}: {materialized}")
+        interval = float(v.get("interval", VIEW_REFRESH_INTERVAL)
+                         ) if materialized == REFRESH_TIMER else None
+        parsed.append((name, match.group(5).strip().rstrip(";"),
+                       materialized, interval))
+    views = []
+    for name, query, materialized, interval in parsed:
+        statement = f"create view {quote_name(name)} as {query}"
+        dependencies = frozenset(other for other, *_ in parsed if other != name and view_reference(
+            other).search(query) != None)
+        tables = frozenset(source for table, sources in MATERIALIZED_SOURCES.items()
+                           if view_reference(table).search(query) != None for source in sources)
+        # Plain views keep the hash of the statement alone so upgrading doesn't replace them
+        definition = statement if materialized == None else f"{statement}\n-- materialized {materialized} {interval}"
+        views.append(ViewDefinition(name, statement, hashlib.blake2b(
+            definition.encode(), digest_size=16).hexdigest(), dependencies, query, materialized, interval, tables))
+    return views
+
+
+def order_views(views: list[ViewDefinition]) -> list[ViewDefinition]:
+    """Sort views so every view comes after the views it uses, otherwise keeping the file's order
+
+    Args:
+        views (list[ViewDefinition]): Views returned by load_view_definitions
+
+    Raises:
+        graphlib.CycleError: Views use each other in a cycle
+
+    Returns:
+        list[ViewDefinition]: Views in the order they can be created in
+    """
+    ordered = []
+    placed = set()
+    remaining = list(views)
+    while remaining.__len__() > 0:
+        ready = next((view for view in remaining
+                      if view.dependencies <= placed), None)
+        if ready == None:
+            raise graphlib.CycleError("Views use each other in a cycle",
+                                      [view.name for view in remaining])
+        ordered.append(ready)
+        placed.add(ready.name)
+        remaining.remove(ready)
+    return ordered
+
+
+def view_exists(view: ViewDefinition, objects: dict[str, str], managed: set[str]) -> bool:
+    """Check if a view is in the database in the form its definition asks for
+
+    Args:
+        view (ViewDefinition): Definition of the view
+        objects (dict[str, str]): Type of every table and view in the database by name
+        managed (set[str]): Names of the materialized views in materialized_views
+
+    Returns:
+        bool: True if the view, or the table and source view of a materialized one, exist
+    """
+    if view.materialized == None:
+        return objects.get(view.name) == "view"
+    return objects.get(view.name) == "table" and view.name in managed and objects.get(view.name + MATERIALIZED_SOURCE_SUFFIX) == "view"
+
+
+def drop_view(name: str):
+    """Drop a view created by create_views, for a materialized view its table and source view too
+
+    Tables are only dropped if they're listed in materialized_views.
+
+    Args:
+        name (str): Name of the view
+    """
+    managed = db.connection.execute(
+        DELETE_MATERIALIZED_VIEW, {"name": name}).rowcount > 0
+    db.connection.execute(DELETE_MATERIALIZED_VIEW_TABLES, {"name": name})
+    kind = fetch_scalar(SELECT_OBJECT_TYPE, {"name": name})
+    if kind == "view":
+        db.connection.exec_driver_sql(f"drop view {quote_name(name)}")
+    elif kind == "table" and managed:
+        db.connection.exec_driver_sql(f"drop table {quote_name(name)}")
+    db.connection.exec_driver_sql(
+        f"drop view if exists {quote_name(name + MATERIALIZED_SOURCE_SUFFIX)}")
+
+
+def create_materialized_view(view: ViewDefinition, position: int):
+    """Create the source view of a materialized view and its table filled from it
+
+    Args:
+        view (ViewDefinition): Definition of a materialized view
+        position (int): Place of the view in the order views are created and refreshed in
+    """
+    source = quote_name(view.name + MATERIALIZED_SOURCE_SUFFIX)
+    db.connection.exec_driver_sql(f"create view {source} as {view.query}")
+    db.connection.exec_driver_sql(
+        f"create table {quote_name(view.name)} as select * from {source}")
+    db.connection.execute(INSERT_MATERIALIZED_VIEW, {"name": view.name, "refresh": view.materialized,
+                                                     "interval": view.interval, "refreshed_at": time.time(), "position": position})
+
+
+def set_materialized_view_tables(name: str, tables: Iterable[str]):
+    """Record the tables a materialized view reads, MATERIALIZED_TRIGGERS only mark it stale when they change
+
+    Args:
+        name (str): Name of the materialized view
+        tables (Iterable[str]): Tables read by the view and the views it uses
+    """
+    db.connection.execute(DELETE_MATERIALIZED_VIEW_TABLES, {"name": name})
+    for table in sorted(tables):
+        db.connection.execute(INSERT_MATERIALIZED_VIEW_TABLE, {
+                              "name": name, "table_name": table})
+
+
+def create_views(views_location: str, refresh: bool = False) -> Optional[ViewsSummary]:
+    """Create views from a json file, only views whose definition changed since the last run are touched
+
+    A hash of every view's definition is kept in view_hashes. Changed and missing views are
+    dropped and created again in dependency order and each is compiled to make sure it works,
+    views created by an earlier run but removed from the file are dropped. Everything happens
+    in one transaction, running it again without changes doesn't change the schema at all.
+
+    Materialized views are created as a table named after the view, filled from a view of the
+    query named with MATERIALIZED_SOURCE_SUFFIX, see refresh_materialized_views. The tables each
+    of them reads, including through other views from the file, are recorded again on every run
+    and unchanged ones are refreshed when a view they use, directly or not, was redefined.
 
     Args:
         views_location (str): Location of json file with queries to load views
+        refresh (bool, optional): Drop and create all views even if they didn't change. Defaults to False.
+
+    Returns:
+        Optional[ViewsSummary]: Numbers of created, replaced, dropped and unchanged views, None if tables are corrupted
     """
     errors = check_tables(["authors", "series", "books", "statistics"])
-    if errors.__len__() == 0:
-        print("Creating views")
-        with open(views_location, "r") as file:
-            data = json.load(file)
-            for v in data["views"]:
-                x = v.get("view")
-                db.connection.execute(text(x))
-    else:
+    if errors.__len__() > 0:
         print(
             f"\nAt least one table is corrupted. Please fix them manually:\n{errors}")
+        return None
+    print("Creating views")
+    start = time.perf_counter()
+    views = order_views(load_view_definitions(views_location))
+    names = set(view.name for view in views)
+    with db.transaction():
+        # Databases from older versions don't have the tables and triggers yet
+        view_hashes.create(db.connection, checkfirst=True)
+        materialized_views.create(db.connection, checkfirst=True)
+        materialized_view_tables.create(db.connection, checkfirst=True)
+        for statement in MATERIALIZED:
+            db.connection.exec_driver_sql(statement)
+        stored = dict(db.connection.execute(SELECT_VIEW_HASHES).all())
+        objects = dict(db.connection.execute(SELECT_VIEW_OBJECTS).all())
+        managed = set(view.name for view in get_materialized_views())
+        dropped = [name for name in stored if name not in names]
+        changed = [view for view in views
+                   if refresh or not view_exists(view, objects, managed) or stored.get(view.name) != view.hash]
+        for name in dropped:
+            drop_view(name)
+            db.connection.execute(DELETE_VIEW_HASH, {"name": name})
+        for view in reversed(changed):
+            drop_view(view.name)
+        tables = {}
+        redefined = set()
+        for position, view in enumerate(views):
+            tables[view.name] = view.tables.union(
+                *(tables[name] for name in view.dependencies))
+            if view.materialized != None:
+                set_materialized_view_tables(view.name, tables[view.name])
+            if view not in changed:
+                if view.materialized != None:
+                    db.connection.execute(UPDATE_MATERIALIZED_VIEW_POSITION, {
+                                          "name": view.name, "position": position})
+                    # Rows of a materialized view built on a redefined view are out of date
+                    if not view.dependencies.isdisjoint(redefined):
+                        refresh_view(view.name)
+                if not view.dependencies.isdisjoint(redefined):
+                    redefined.add(view.name)
+                continue
+            redefined.add(view.name)
+            if view.materialized != None:
+                # Filling the table runs the query, which catches the same errors as compiling it
+                create_materialized_view(view, position)
+            else:
+                db.connection.exec_driver_sql(view.statement)
+                # Compiling the query catches views using missing tables or columns
+                db.connection.exec_driver_sql(
+                    f"explain select * from {quote_name(view.name)}").all()
+            db.connection.execute(
+                UPSERT_VIEW_HASH, {"name": view.name, "hash": view.hash})
+        register_refresh_on_commit(db.connection)
+    created = sum(1 for view in changed if view.name not in objects)
+    summary = ViewsSummary(created, changed.__len__() - created,
+                           dropped.__len__(), views.__len__() - changed.__len__())
+    elapsed = time.perf_counter() - start
+    print(f"Created {summary.created}, replaced {summary.replaced}, dropped {summary.dropped} and kept {summary.unchanged} unchanged views in {elapsed:.2f}s.")
+    return summary
+
+
+def get_materialized_views() -> list[MaterializedView]:
+    """List materialized views in the order they're refreshed in
+
+    Returns:
+        list[MaterializedView]: Refresh policy, interval, time of the last refresh and staleness of every materialized view
+    """
+    return [MaterializedView(name, refresh, interval, refreshed_at, stale == 1)
+            for name, refresh, interval, refreshed_at, stale in db.connection.execute(SELECT_MATERIALIZED_VIEWS)]
 
 
-def load_library_from_json(library_location: str):
-    """Load books from json file
+def refresh_view(name: str):
+    """Fill the table of a materialized view again from its source view and mark it as fresh
+
+    Runs in the current transaction, readers see either the old or the new rows.
 
     Args:
-        library_location (str): Location of json file to load books from
+        name (str): Name of the materialized view
+    """
+    table = quote_name(name)
+    db.connection.exec_driver_sql(f"delete from {table}")
+    db.connection.exec_driver_sql(
+        f"insert into {table} select * from {quote_name(name + MATERIALIZED_SOURCE_SUFFIX)}")
+    db.connection.execute(UPDATE_MATERIALIZED_VIEW_REFRESHED, {
+                          "name": name, "refreshed_at": time.time()})
+
+
+def refresh_materialized_views(names: Optional[list[str]] = None) -> Optional[int]:
+    """Refresh materialized views on demand whether they're stale or not
+
+    Args:
+        names (Optional[list[str]], optional): Views to refresh. Defaults to all of them.
+
+    Raises:
+        ValueError: One of the names is not a materialized view
+
+    Returns:
+        Optional[int]: Number of refreshed views or None if the table of materialized views is missing
+    """
+    errors = check_tables(["materialized_views"])
+    if errors.__len__() > 0:
+        print(
+            f"\nAt least one table is corrupted. Please fix them manually:\n{errors}")
+        return None
+    start = time.perf_counter()
+    with db.transaction():
+        available = [view.name for view in get_materialized_views()]
+        for name in names or []:
+            if name not in available:
+                raise ValueError(f"Not a materialized view: {name}")
+        selected = [name for name in available
+                    if names == None or name in names]
+        for name in selected:
+            refresh_view(name)
+    elapsed = time.perf_counter() - start
+    print(f"Refreshed {selected.__len__()} materialized views in {elapsed:.2f}s.")
+    return selected.__len__()
+
+
+def refresh_on_commit():
+    """Refresh stale materialized views with the REFRESH_ON_COMMIT policy, run as a commit hook
+
+    The views are refreshed in the committing transaction, so they're never seen out of date.
+    """
+    if check_tables(["materialized_views"]).__len__() > 0:
+        return
+    for (name,) in db.connection.execute(SELECT_STALE_VIEWS, {"refresh": REFRESH_ON_COMMIT}).all():
+        refresh_view(name)
+
+
+def register_refresh_on_commit(connection: Connection):
+    """Run refresh_on_commit on every commit only while the database has REFRESH_ON_COMMIT views
+
+    Runs when a database is opened and after create_views, other commits don't pay for the check.
+
+    Args:
+        connection (Connection): Connection to the database to look at
+    """
+    needed = connection.execute(SELECT_OBJECT_TYPE, {"name": "materialized_views"}).first() != None and connection.execute(
+        SELECT_REFRESH_VIEW, {"refresh": REFRESH_ON_COMMIT}).first() != None
+    if needed and refresh_on_commit not in db.commit_hooks:
+        db.commit_hooks.append(refresh_on_commit)
+    elif not needed and refresh_on_commit in db.commit_hooks:
+        db.commit_hooks.remove(refresh_on_commit)
+
+
+db.open_hooks.append(register_refresh_on_commit)
+
+
+def refresh_due_views(now: Optional[float] = None) -> int:
+    """Refresh stale materialized views with the REFRESH_TIMER policy whose interval has passed
+
+    Args:
+        now (Optional[float], optional): Current time as returned by time.time(). Defaults to the current time.
+
+    Returns:
+        int: Number of refreshed views
+    """
+    if check_tables(["materialized_views"]).__len__() > 0:
+        return 0
+    parameters = {"refresh": REFRESH_TIMER,
+                  "now": time.time() if now == None else now}
+    with db.transaction():
+        names = [name for (name,) in db.connection.execute(
+            SELECT_DUE_VIEWS, parameters).all()]
+        for name in names:
+            refresh_view(name)
+    return names.__len__()
+
+
+def start_view_refresher(period: float = VIEW_REFRESH_PERIOD) -> threading.Event:
+    """Refresh due timer views in a background thread with its own connection
+
+    Args:
+        period (float, optional): Seconds between checks for due views. Defaults to VIEW_REFRESH_PERIOD.
+
+    Returns:
+        threading.Event: Set it to stop the thread
+    """
+    stop = threading.Event()
+
+    def run():
+        try:
+            while not stop.wait(period):
+                try:
+                    refresh_due_views()
+                except exc.OperationalError:
+                    # The database is locked by another writer, the views are still stale next time
+                    pass
+        finally:
+            db.close()
+
+    threading.Thread(target=run, name="view_refresher", daemon=True).start()
+    return stop
+
+
+def load_library_from_json(library_location: str, policy: str = MERGE_OVERWRITE):
+    """Load books from a json, JSON Lines or CSV file, see LIBRARY_EXTENSIONS
+
+    Books already in the database are updated with the values from the file.
+
+    Args:
+        library_location (str): Location of the file to load books from
+        policy (str, optional): How existing books are merged, see insert_book. Defaults to MERGE_OVERWRITE.
     """
     errors = check_tables(["authors", "series", "books", "statistics"])
     if errors.__len__() == 0:
-        count = 0
         print("Adding books from json")
-        with open(library_location, "r") as file:
-            data = json.load(file)
-            for b in data["books"]:
-                book = load_book(b)
-                if book.author_name != None:
-                    insert_author(book.author_name)
-                    author_id = get_author_id(book.author_name)
-                if book.series_name != None:
-                    insert_series(author_id, book.series_name)
-                    series_id = get_series_id(book.series_name, author_id)
-                if book.isbn != None:
-                    insert_book(book.isbn, series_id,
-                                book.series_index, book.title)
-                    insert_statistics(book.isbn, book.chapters, book.pages,
-                                      book.released, book.finished, book.speed, book.time)
-                count += 1
-        print(f"Loaded {count} books.")
+        start = time.perf_counter()
+        # Views refreshed on commit are refreshed once at the end instead of after every batch
+        with db.deferred_commit_hooks():
+            # Batches are committed as they're written anyway, pending changes go first so the profile can be switched
+            db.commit()
+            with db.pragma_profile(BULK_LOAD_PRAGMA_PROFILE):
+                count = bulk_insert_books(
+                    iter_books_from_file(library_location), commit=True, policy=policy)
+        elapsed = time.perf_counter() - start
+        rate = count / elapsed if elapsed > 0 else count
+        print(f"Loaded {count} books in {elapsed:.2f}s ({rate:.0f} rows/s).")
     else:
         print(
             f"\nAt least one table is corrupted. Please fix them manually:\n{errors}")
 
 
-def insert_author(name: str):
+def load_library_from_files(library_locations: list[str], workers: Optional[int] = None, policy: str = MERGE_OVERWRITE, shard_lines: int = SHARD_LINES) -> Optional[int]:
+    """Load books from json, JSON Lines and CSV files, parsing them in worker processes
+
+    Workers parse and validate shards of the input while this process stays the only writer,
+    invalid books are reported and skipped.
+
+    Args:
+        library_locations (list[str]): Paths of library files in any of the formats in LIBRARY_EXTENSIONS
+        workers (Optional[int], optional): Number of worker processes. Defaults to the number of cores.
+        policy (str, optional): How existing books are merged, see insert_book. Defaults to MERGE_OVERWRITE.
+        shard_lines (int, optional): Books per shard handed to a worker. Defaults to SHARD_LINES.
+
+    Returns:
+        Optional[int]: Number of books loaded or None if the tables are corrupted
+    """
+    errors = check_tables(["authors", "series", "books", "statistics"])
+    if errors.__len__() != 0:
+        print(
+            f"\nAt least one table is corrupted. Please fix them manually:\n{errors}")
+        return None
+    print("Adding books from files")
+    start = time.perf_counter()
+    invalid = []
+    with db.deferred_commit_hooks():
+        db.commit()
+        with db.pragma_profile(BULK_LOAD_PRAGMA_PROFILE):
+            count = bulk_insert_books(iter_books_parallel(
+                library_locations, workers, invalid, shard_lines), commit=True, policy=policy)
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else count
+    for error in invalid:
+        print(f"Skipped {error}")
+    print(f"Loaded {count} books in {elapsed:.2f}s ({rate:.0f} rows/s), {invalid.__len__()} invalid.")
+    return count
+
+
+def export_library(library_location: str, append: bool = False) -> int:
+    """Write every book in the database to a json, JSON Lines or CSV file, see LIBRARY_EXTENSIONS
+
+    Args:
+        library_location (str): Path of the file, a .gz or .zst extension compresses it
+        append (bool, optional): Add the books to the end of an existing JSON Lines or CSV file. Defaults to False.
+
+    Returns:
+        int: Number of books written
+    """
+    start = time.perf_counter()
+    count = write_books(iter_library(), library_location, append)
+    elapsed = time.perf_counter() - start
+    print(f"Exported {count} books in {elapsed:.2f}s.")
+    return count
+
+
+def iter_library(page_size: int = BOOKS_PAGE_SIZE) -> Iterator[Book]:
+    """Stream every book with or without statistics ordered by ISBN, one page at a time
+
+    Args:
+        page_size (int, optional): Number of books read per query. Defaults to BOOKS_PAGE_SIZE.
+
+    Yields:
+        Iterator[Book]: All books in the database
+    """
+    # Smallest integer SQLite can store, so the first page starts before any ISBN
+    parameters = {"after_isbn": -2 ** 63, "limit": page_size}
+    while True:
+        rows = db.connection.execute(SELECT_LIBRARY_PAGE, parameters).all()
+        for row in rows:
+            yield Book(*row)
+        if rows.__len__() < page_size:
+            return
+        parameters["after_isbn"] = rows[-1][2]
+
+
+class SyncSummary(NamedTuple):
+    added: int
+    updated: int
+    deleted: int
+    unchanged: int
+
+
+def sync_library_from_json(library_location: str) -> Optional[SyncSummary]:
+    """Bring the database in line with a json file, writing only what changed since the last sync
+
+    A content hash of every synced book is kept in book_hashes. Books whose hash didn't change
+    are skipped, new and changed ones are written with MERGE_OVERWRITE and books synced before
+    but missing from the file now are deleted. Books added by other means are never deleted.
+    The whole sync is one transaction.
+
+    Args:
+        library_location (str): Location of json, JSON Lines or CSV file to sync books from
+
+    Returns:
+        Optional[SyncSummary]: Numbers of added, updated, deleted and unchanged books, None if tables are corrupted
+    """
+    errors = check_tables(
+        ["authors", "series", "books", "statistics", "book_hashes"])
+    if errors.__len__() > 0:
+        print(
+            f"\nAt least one table is corrupted. Please fix them manually:\n{errors}")
+        return None
+    print("Syncing books from json")
+    start = time.perf_counter()
+    stored_hashes = dict(db.connection.execute(SELECT_BOOK_HASHES).all())
+    stored_isbns = set(isbn for (isbn,)
+                       in db.connection.execute(SELECT_STORED_ISBNS))
+    seen = set()
+    hash_rows = []
+    counts = {"added": 0, "updated": 0, "unchanged": 0}
+
+    def changed_books() -> Iterator[Book]:
+        for book in iter_books_from_file(library_location):
+            if book.isbn == None or book.isbn == '' or book.isbn in seen:
+                continue
+            seen.add(book.isbn)
+            digest = book_hash(book)
+            if stored_hashes.get(book.isbn) == digest and book.isbn in stored_isbns:
+                counts["unchanged"] += 1
+                continue
+            counts["updated" if book.isbn in stored_isbns else "added"] += 1
+            hash_rows.append({"isbn": book.isbn, "hash": digest})
+            yield book
+
+    db.commit()
+    with db.pragma_profile(BULK_LOAD_PRAGMA_PROFILE):
+        with db.transaction():
+            bulk_insert_books(changed_books(), policy=MERGE_OVERWRITE)
+            if hash_rows.__len__() > 0:
+                db.connection.execute(UPSERT_BOOK_HASH, hash_rows)
+            deleted = [{"isbn": isbn}
+                       for isbn in stored_hashes if isbn not in seen]
+            if deleted.__len__() > 0:
+                db.connection.execute(DELETE_BOOK, deleted)
+                db.connection.execute(DELETE_STATISTICS, deleted)
+                db.connection.execute(DELETE_BOOK_HASH, deleted)
+    summary = SyncSummary(counts["added"], counts["updated"],
+                          deleted.__len__(), counts["unchanged"])
+    elapsed = time.perf_counter() - start
+    print(f"Synced {summary.added} added, {summary.updated} updated, {summary.deleted} deleted and {summary.unchanged} unchanged books in {elapsed:.2f}s.")
+    return summary
+
+
+def bulk_insert_books(books: Iterable[Book], batch_size: int = BULK_BATCH_SIZE, commit: bool = False, policy: str = MERGE_SKIP) -> int:
+    """Insert books in batches with a single executemany per table and batch
+
+    Authors and series are resolved in memory, new ones are inserted once per batch and their IDs
+    read back from the database, so no per-book lookups are made and other connections can write
+    between batches. Books and statistics already in the database are merged according to the
+    policy. Books are consumed lazily, only one batch is held in memory at a time.
+
+    Args:
+        books (Iterable[Book]): Books to insert
+        batch_size (int, optional): Number of books written per executemany. Defaults to BULK_BATCH_SIZE.
+        commit (bool, optional): Commit after every batch instead of leaving a single transaction to the caller. Defaults to False.
+        policy (str, optional): How existing books are merged, see insert_book. Defaults to MERGE_SKIP.
+
+    Returns:
+        int: Number of books processed
+    """
+    book_statement = merge_statement(UPSERT_BOOK, policy)
+    statistics_statement = merge_statement(UPSERT_STATISTICS, policy)
+    authors = {name: id for id, name in db.connection.execute(SELECT_AUTHORS)}
+    series = {(name, author_id): id for id, name, author_id in db.connection.execute(
+        SELECT_SERIES)}
+    count = 0
+    books = iter(books)
+    batch = list(islice(books, batch_size))
+    while batch.__len__() > 0:
+        # Dicts keep the order of the file, new rows get increasing IDs in that order
+        new_authors = dict.fromkeys(book.author_name for book in batch
+                                    if book.author_name != None and book.author_name != '' and book.author_name not in authors)
+        if new_authors.__len__() > 0:
+            db.connection.execute(INSERT_AUTHOR_NAMES, [
+                                  {"name": name} for name in new_authors])
+            authors.update((name, id) for id, name in db.connection.execute(
+                SELECT_AUTHOR_IDS, {"names": list(new_authors)}))
+        new_series = dict.fromkeys((book.series_name, authors[book.author_name]) for book in batch
+                                   if book.series_name != None and book.series_name != '' and book.author_name in authors
+                                   and (book.series_name, authors[book.author_name]) not in series)
+        if new_series.__len__() > 0:
+            db.connection.execute(INSERT_SERIES_NAMES, [
+                                  {"name": name, "author_id": author_id} for name, author_id in new_series])
+            series.update(((name, author_id), id) for id, name, author_id in db.connection.execute(
+                SELECT_AUTHORS_SERIES, {"author_ids": list(set(author_id for _, author_id in new_series))}))
+        book_rows = []
+        statistics_rows = []
+        for book in batch:
+            if book.isbn == None or book.isbn == '':
+                continue
+            author_id = authors.get(book.author_name)
+            book_rows.append({"isbn": book.isbn,
+                              "series_id": series.get((book.series_name, author_id)),
+                              "series_index": book.series_index,
+                              "title": book.title})
+            statistics_rows.append({"isbn": book.isbn,
+                                    "chapters": book.chapters,
+                                    "pages": book.pages,
+                                    "released": normalize_date(book.released),
+                                    "finished": normalize_date(book.finished),
+                                    "speed": book.speed,
+                                    "time": book.time})
+        if book_rows.__len__() > 0:
+            db.connection.execute(book_statement, book_rows)
+        if statistics_rows.__len__() > 0:
+            db.connection.execute(statistics_statement, statistics_rows)
+        if commit:
+            db.commit()
+        count += batch.__len__()
+        batch = list(islice(books, batch_size))
+    return count
+
+
+def add_book(book: Book, policy: str = MERGE_SKIP):
+    """Add a book with its author, series and statistics
+
+    Args:
+        book (Book): Book to add, empty names are skipped
+        policy (str, optional): How an existing book with the same ISBN is merged, see insert_book. Defaults to MERGE_SKIP.
+    """
+    series_id = insert_series(insert_author(
+        book.author_name), book.series_name)
+    insert_book(book.isbn, series_id, book.series_index, book.title, policy)
+    insert_statistics(book.isbn, book.chapters, book.pages, book.released,
+                      book.finished, book.speed, book.time, policy)
+
+
+def insert_author(name: str) -> Optional[int]:
     """Add new author if they're not in the database yet
 
+    A single upsert both inserts the author and returns the ID of an already existing one.
+
     Args:
         name (str): Name of the author
+
+    Returns:
+        Optional[int]: ID of the new or already existing author, None if name was empty
     """
-    if get_author_id(name) == None and name != '':
-        max_id = get_max_author_id()
-        db.connection.execute(
-            text(f"insert into authors values ({max_id+1}, \"{name}\")"))
+    if name == None or name == '':
+        return None
+    author_id = db.authors_cache.get(name)
+    if author_id == None:
+        author_id = fetch_scalar(UPSERT_AUTHOR_NAME, {"name": name})
+        db.authors_cache.put(name, author_id)
+    return author_id
 
 
 def get_author_id(name: str) -> Optional[int]:
@@ -172,14 +1041,20 @@ def get_author_id(name: str) -> Optional[int]:
     """
     if name == '':
         return None
-    else:
-        result = db.connection.execute(
-            text(f"select author_id from authors where name = \"{name}\""))
-        rows = result.all().copy()
-        if rows.__len__() == 0:
-            return None
-        else:
-            return rows[0][0]
+    author_id = db.authors_cache.get(name)
+    if author_id == None:
+        author_id = fetch_scalar(SELECT_AUTHOR_ID, {"name": name})
+        db.authors_cache.put(name, author_id)
+    return author_id
+
+
+def get_cache_info() -> dict[str, CacheInfo]:
+    """Report hits and misses of the author and series ID caches
+
+    Returns:
+        dict[str, CacheInfo]: Statistics keyed by "authors" and "series"
+    """
+    return {"authors": db.authors_cache.info(), "series": db.series_cache.info()}
 
 
 def get_max_author_id() -> Optional[int]:
@@ -188,13 +1063,7 @@ def get_max_author_id() -> Optional[int]:
     Returns:
         Optional[int]: Highest ID in author_id field
     """
-    result = db.connection.execute(text(f"select max(author_id) from authors"))
-    rows = result.all().copy()
-    id = rows[0][0]
-    if id == None:
-        return 0
-    else:
-        return id
+    return fetch_scalar(SELECT_MAX_AUTHOR_ID, default=0)
 
 
 def get_author_name(id: int) -> Optional[str]:
@@ -209,13 +1078,7 @@ def get_author_name(id: int) -> Optional[str]:
     if id == None:
         return None
     else:
-        results = db.connection.execute(
-            text(f"select name from authors where author_id = {id}"))
-        rows = results.all().copy()
-        if rows.__len__() == 0:
-            return None
-        else:
-            return rows[0][0]
+        return fetch_scalar(SELECT_AUTHOR_NAME, {"author_id": id})
 
 
 def update_author_name(id: int, name: str):
@@ -227,7 +1090,8 @@ def update_author_name(id: int, name: str):
     """
     if get_author_name(id) != None:
         db.connection.execute(
-            text(f"update authors set name = \"{name}\" where author_id = {id}"))
+            UPDATE_AUTHOR_NAME, {"name": name, "author_id": id})
+        db.authors_cache.invalidate(id)
 
 
 def delete_author_id(author_id: int):
@@ -236,21 +1100,30 @@ def delete_author_id(author_id: int):
     Args:
         id (int): ID of the author to delete
     """
-    db.connection.execute(
-        text(f"delete from authors where author_id = {author_id}"))
+    db.connection.execute(DELETE_AUTHOR, {"author_id": author_id})
+    db.authors_cache.invalidate(author_id)
 
 
-def insert_series(author_id: int, series_name: str):
+def insert_series(author_id: int, series_name: str) -> Optional[int]:
     """Add new series if it's not in the database yet
 
+    A single upsert both inserts the series and returns the ID of an already existing one.
+
     Args:
         author_id (int): ID of the author
         series_name (str): Name of the series
+
+    Returns:
+        Optional[int]: ID of the new or already existing series, None if name or author was empty
     """
-    if get_series_id(series_name, author_id) == None:
-        max_id = get_max_series_id()
-        db.connection.execute(
-            text(f"insert into series values ({max_id+1}, \"{series_name}\", {author_id})"))
+    if series_name == None or series_name == '' or author_id == None:
+        return None
+    series_id = db.series_cache.get((series_name, author_id))
+    if series_id == None:
+        series_id = fetch_scalar(
+            UPSERT_SERIES_NAME, {"name": series_name, "author_id": author_id})
+        db.series_cache.put((series_name, author_id), series_id)
+    return series_id
 
 
 def get_series_id(name: str, author_id: int) -> Optional[int]:
@@ -265,14 +1138,12 @@ def get_series_id(name: str, author_id: int) -> Optional[int]:
     """
     if name == '' or author_id == None:
         return None
-    else:
-        result = db.connection.execute(text(
-            f"select series_id from series where name = \"{name}\" and author_id = {author_id}"))
-        rows = result.all().copy()
-        if rows.__len__() == 0:
-            return None
-        else:
-            return rows[0][0]
+    series_id = db.series_cache.get((name, author_id))
+    if series_id == None:
+        series_id = fetch_scalar(
+            SELECT_SERIES_ID, {"name": name, "author_id": author_id})
+        db.series_cache.put((name, author_id), series_id)
+    return series_id
 
 
 def get_max_series_id() -> int:
@@ -281,13 +1152,7 @@ def get_max_series_id() -> int:
     Returns:
         int: Highest ID in series_id field
     """
-    result = db.connection.execute(text(f"select max(series_id) from series"))
-    rows = result.all().copy()
-    id = rows[0][0]
-    if id == None:
-        return 0
-    else:
-        return id
+    return fetch_scalar(SELECT_MAX_SERIES_ID, default=0)
 
 
 def get_authors_number_of_series(author_id: int) -> int:
@@ -302,10 +1167,7 @@ def get_authors_number_of_series(author_id: int) -> int:
     if author_id == None:
         return 0
     else:
-        result = db.connection.execute(
-            text(f"select count(*) from series where author_id = {author_id}"))
-        rows = result.all().copy()
-        return 0 if rows.__len__() == 0 else rows[0][0]
+        return fetch_scalar(COUNT_AUTHORS_SERIES, {"author_id": author_id}, default=0)
 
 
 def get_series_author_id(series_id: int) -> Optional[int]:
@@ -317,13 +1179,7 @@ def get_series_author_id(series_id: int) -> Optional[int]:
     Returns:
         Optional[int]: ID of the author
     """
-    result = db.connection.execute(
-        text(f"select author_id from series where series_id = {series_id}"))
-    rows = result.all().copy()
-    if rows.__len__() == 0:
-        return None
-    else:
-        return rows[0][0]
+    return fetch_scalar(SELECT_SERIES_AUTHOR_ID, {"series_id": series_id})
 
 
 def get_series_name(series_id: int) -> Optional[str]:
@@ -335,13 +1191,7 @@ def get_series_name(series_id: int) -> Optional[str]:
     Returns:
         Optional[str]: Name of the series
     """
-    result = db.connection.execute(
-        text(f"select name from series where series_id = {series_id}"))
-    rows = result.all().copy()
-    if rows.__len__() == 0:
-        return None
-    else:
-        return rows[0][0]
+    return fetch_scalar(SELECT_SERIES_NAME, {"series_id": series_id})
 
 
 def get_series_number_of_books(series_id: int) -> int:
@@ -356,32 +1206,52 @@ def get_series_number_of_books(series_id: int) -> int:
     if series_id == None:
         return 0
     else:
-        result = db.connection.execute(
-            text(f"select count(*) from books where series_id = {series_id}"))
-        rows = result.all().copy()
-        return 0 if rows.__len__() == 0 else rows[0][0]
+        return fetch_scalar(COUNT_SERIES_BOOKS, {"series_id": series_id}, default=0)
 
 
 def update_authors_series(old_author_id: int, new_author_id: int):
     """Update all series from author's name connected to old_id to author's name connected to new_id
 
+    Series named like one the new author already has are merged into it, their books are moved
+    over and the series are deleted.
+
     Args:
         old_author_id (int): ID of new author's name
         new_author_id (int): ID of the series to be updated
     """
-    db.connection.execute(text(
-        f"update series set author_id = {new_author_id} where author_id = {old_author_id}"))
+    parameters = {"new_author_id": new_author_id,
+                  "old_author_id": old_author_id}
+    with db.transaction():
+        db.connection.execute(MOVE_DUPLICATE_SERIES_BOOKS, parameters)
+        db.connection.execute(DELETE_DUPLICATE_SERIES, parameters)
+        db.connection.execute(UPDATE_AUTHORS_SERIES, parameters)
+    db.series_cache.invalidate_where(lambda key: key[1] == old_author_id)
 
 
-def update_series_author(series_id: int, author_id: int):
+def update_series_author(series_id: int, author_id: int) -> int:
     """Update the author of the series
 
+    If the author already has a series with the same name the books are moved to it and the
+    series is deleted.
+
     Args:
         series_id (int): ID of the series to be updated
         author_id (int): ID of new author's name
+
+    Returns:
+        int: ID of the series the books are in afterwards
     """
+    existing = get_series_id(get_series_name(series_id), author_id)
+    if existing != None and existing != series_id:
+        with db.transaction():
+            db.connection.execute(
+                MOVE_SERIES_BOOKS, {"target_id": existing, "series_id": series_id})
+            delete_series_id(series_id)
+        return existing
     db.connection.execute(
-        text(f"update series set author_id = {author_id} where series_id = {series_id}"))
+        UPDATE_SERIES_AUTHOR, {"author_id": author_id, "series_id": series_id})
+    db.series_cache.invalidate(series_id)
+    return series_id
 
 
 def update_series_name(series_id: int, new_name: str):
@@ -392,7 +1262,8 @@ def update_series_name(series_id: int, new_name: str):
         new_name (str): New name for the series
     """
     db.connection.execute(
-        text(f"update series set name = \"{new_name}\" where series_id = {series_id}"))
+        UPDATE_SERIES_NAME, {"name": new_name, "series_id": series_id})
+    db.series_cache.invalidate(series_id)
 
 
 def delete_series_id(series_id: int):
@@ -401,28 +1272,47 @@ def delete_series_id(series_id: int):
     Args:
         series_id (int): ID of the series to delete
     """
-    db.connection.execute(
-        text(f"delete from series where series_id = {series_id}"))
+    db.connection.execute(DELETE_SERIES, {"series_id": series_id})
+    db.series_cache.invalidate(series_id)
 
 
-def insert_book(isbn: int, series_id: int, series_index: float, title: str):
-    """Add new book if it's not in the database yet
+def merge_statement(statements: dict[str, Executable], policy: str) -> Executable:
+    """Pick the upsert implementing a merge policy
+
+    Args:
+        statements (dict[str, Executable]): Upserts keyed by merge policy
+        policy (str): One of MERGE_SKIP, MERGE_OVERWRITE or MERGE_FILL_NULLS
+
+    Raises:
+        ValueError: Unknown merge policy
+
+    Returns:
+        Executable: Statement to execute
+    """
+    statement = statements.get(policy)
+    if statement == None:
+        raise ValueError(
+            f"Unknown merge policy {policy!r}, expected one of {MERGE_POLICIES}")
+    return statement
+
+
+def insert_book(isbn: int, series_id: int, series_index: float, title: str, policy: str = MERGE_SKIP):
+    """Add new book or merge it into the existing one with the same ISBN
 
     Args:
         isbn (int): ISBN identifier
         series_id (int): ID of the series
         series_index (float): Book's position in the series
         title (str): Title of the book
+        policy (str, optional): What to do with an existing book: MERGE_SKIP keeps it as it is, MERGE_OVERWRITE replaces its values, MERGE_FILL_NULLS only sets the missing ones. Defaults to MERGE_SKIP.
     """
-    if get_book_isbn(isbn) == None:
-        query_builder = StringIO()
-        query_builder.write(f"insert into books values ({isbn}, ")
-        query_builder.write(
-            f"{series_id}, " if series_id != None else "NULL, ")
-        query_builder.write(
-            f"{series_index:f}, " if series_index != None else "NULL, ")
-        query_builder.write(f"\"{title}\")" if title != None else "NULL)")
-        db.connection.execute(text(query_builder.getvalue()))
+    statement = merge_statement(UPSERT_BOOK, policy)
+    if isbn == None or isbn == '':
+        return
+    db.connection.execute(statement, {"isbn": isbn,
+                                      "series_id": series_id,
+                                      "series_index": series_index,
+                                      "title": title})
 
 
 def get_books_info(isbn: int, author: str, series: str, title: str) -> list[Book]:
@@ -437,12 +1327,39 @@ def get_books_info(isbn: int, author: str, series: str, title: str) -> list[Book
     Returns:
         list[Book]: List of Book objects containing data matching search parameters
     """
-    list_of_books = []
-    result = db.connection.execute(text(
-        f"select b.isbn, a.name as 'author', s.name as 'series', b.series_index as 'index', b.title, released, finished, chapters, pages, speed, time from statistics left join books as b using (isbn) left join series as s using (series_id) left join authors as a using (author_id) where b.isbn like '%{isbn}%' and a.name like '%{author}%' and s.name like '%{series}%' and b.title like '%{title}%' order by released"))
-    rows = result.all().copy()
-    if rows.__len__() > 0:
-        for row in rows:
+    return list(iter_books_info(isbn, author, series, title))
+
+
+def iter_books_info(isbn: int, author: str, series: str, title: str, page_size: int = BOOKS_PAGE_SIZE, after: Optional[tuple[str, int]] = None) -> Iterator[Book]:
+    """Stream books matching search parameters ordered by release date and ISBN
+
+    Books are read one page at a time using keyset pagination, so memory use doesn't depend on
+    the number of matching books and no read is held open between pages.
+
+    Args:
+        isbn (int): ISBN identifier
+        author (str): Name of the author
+        series (str): Name of the series
+        title (str): Title of the book
+        page_size (int, optional): Number of books read per query. Defaults to BOOKS_PAGE_SIZE.
+        after (Optional[tuple[str, int]], optional): Cursor returned by books_cursor, only books after it are returned. Defaults to None.
+
+    Yields:
+        Iterator[Book]: Book objects containing data matching search parameters
+    """
+    parameters = {"isbn": f"%{isbn}%",
+                  "author": f"%{author}%",
+                  "series": f"%{series}%",
+                  "title": f"%{title}%",
+                  "limit": page_size}
+    parameters["after_released"], parameters["after_isbn"] = after if after != None else (
+        "", -1)
+    while True:
+        result = db.connection.execute(SELECT_BOOKS_INFO_PAGE, parameters,
+                                       execution_options={"yield_per": page_size})
+        book = None
+        count = 0
+        for row in result:
             book = Book(isbn=row[0],
                         author_name=row[1],
                         series_name=row[2],
@@ -454,8 +1371,162 @@ def get_books_info(isbn: int, author: str, series: str, title: str) -> list[Book
                         pages=row[8],
                         speed=row[9],
                         time=row[10])
-            list_of_books.append(book)
-    return list_of_books
+            count += 1
+            yield book
+        if count < page_size:
+            return
+        parameters["after_released"], parameters["after_isbn"] = books_cursor(
+            book)
+
+
+def books_cursor(book: Book) -> tuple[str, int]:
+    """Return the position of a book in the order used by iter_books_info
+
+    Args:
+        book (Book): Last book that was read
+
+    Returns:
+        tuple[str, int]: Cursor to pass as after to continue reading from the next book
+    """
+    return (book.released if book.released != None else "", book.isbn)
+
+
+def count_books_info(isbn: int, author: str, series: str, title: str) -> int:
+    """Return the number of books matching search parameters
+
+    Args:
+        isbn (int): ISBN identifier
+        author (str): Name of the author
+        series (str): Name of the series
+        title (str): Title of the book
+
+    Returns:
+        int: Number of books matching search parameters
+    """
+    return fetch_scalar(COUNT_BOOKS_INFO, {"isbn": f"%{isbn}%",
+                                           "author": f"%{author}%",
+                                           "series": f"%{series}%",
+                                           "title": f"%{title}%"}, default=0)
+
+
+def get_book(isbn: int) -> Optional[Book]:
+    """Return all data about a single book using one query
+
+    Args:
+        isbn (int): ISBN identifier
+
+    Returns:
+        Optional[Book]: Book's data or None if ISBN is in neither books nor statistics table
+    """
+    if isbn == None or isbn == '':
+        return None
+    else:
+        result = db.connection.execute(SELECT_BOOK, {"isbn": isbn})
+        row = result.first()
+        if row == None:
+            return None
+        else:
+            return Book(isbn=row[0],
+                        author_name=row[1],
+                        series_name=row[2],
+                        series_index=row[3],
+                        title=row[4],
+                        chapters=row[5],
+                        pages=row[6],
+                        released=row[7],
+                        finished=row[8],
+                        speed=row[9],
+                        time=row[10])
+
+
+def search_books(query: str, limit: int = SEARCH_LIMIT) -> list[Book]:
+    """Return books matching all words of the query in ISBN, author, series or title, best matches first
+
+    Every word is matched as a prefix, so "hail ma" finds "Project Hail Mary".
+
+    Args:
+        query (str): Words to search for
+        limit (int, optional): Maximum number of books to return. Defaults to SEARCH_LIMIT.
+
+    Returns:
+        list[Book]: List of Book objects ordered by relevance
+    """
+    words = query.split()
+    if words.__len__() == 0:
+        return []
+    match = " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+    result = db.connection.execute(
+        SEARCH_BOOKS, {"query": match, "limit": limit})
+    return [Book(isbn=row[0],
+                 author_name=row[1],
+                 series_name=row[2],
+                 series_index=row[3],
+                 title=row[4],
+                 chapters=row[5],
+                 pages=row[6],
+                 released=row[7],
+                 finished=row[8],
+                 speed=row[9],
+                 time=row[10]) for row in result]
+
+
+def epoch_day(day: datetime.date | str) -> int:
+    """Convert a date to the day number stored in released_day and finished_day
+
+    Args:
+        day (datetime.date | str): Date or a string accepted by normalize_date
+
+    Raises:
+        ValueError: String is not a date
+
+    Returns:
+        int: Days since 1970-01-01
+    """
+    if type(day) == str:
+        day = datetime.date.fromisoformat(normalize_date(day))
+    return (day - datetime.date(1970, 1, 1)).days
+
+
+def books_between(statement: Executable, start: datetime.date | str, end: datetime.date | str) -> list[Book]:
+    """Run one of the date range queries with both dates converted to day numbers
+
+    Args:
+        statement (Executable): Query taking :start and :end day numbers
+        start (datetime.date | str): First day
+        end (datetime.date | str): Last day
+
+    Returns:
+        list[Book]: Books returned by the query
+    """
+    rows = db.connection.execute(
+        statement, {"start": epoch_day(start), "end": epoch_day(end)})
+    return [Book(*row) for row in rows]
+
+
+def books_finished_between(start: datetime.date | str, end: datetime.date | str) -> list[Book]:
+    """Get books finished between two dates, both included, with a range scan of ix_statistics_finished_day
+
+    Args:
+        start (datetime.date | str): First day
+        end (datetime.date | str): Last day
+
+    Returns:
+        list[Book]: Books ordered by finish date and ISBN
+    """
+    return books_between(SELECT_BOOKS_FINISHED_BETWEEN, start, end)
+
+
+def books_released_between(start: datetime.date | str, end: datetime.date | str) -> list[Book]:
+    """Get books released between two dates, both included, with a range scan of ix_statistics_released_day
+
+    Args:
+        start (datetime.date | str): First day
+        end (datetime.date | str): Last day
+
+    Returns:
+        list[Book]: Books ordered by release date and ISBN
+    """
+    return books_between(SELECT_BOOKS_RELEASED_BETWEEN, start, end)
 
 
 def get_book_isbn(isbn: int) -> Optional[int]:
@@ -470,13 +1541,7 @@ def get_book_isbn(isbn: int) -> Optional[int]:
     if isbn == None or isbn == '':
         return None
     else:
-        result = db.connection.execute(
-            text(f"select * from books where isbn = {isbn}"))
-        rows = result.all().copy()
-        if rows.__len__() == 0:
-            return None
-        else:
-            return rows[0][0]
+        return fetch_scalar(SELECT_BOOK_ISBN, {"isbn": isbn})
 
 
 def get_book_series_id(isbn: int) -> Optional[int]:
@@ -488,13 +1553,7 @@ def get_book_series_id(isbn: int) -> Optional[int]:
     Returns:
         Optional[int]: ID of the series
     """
-    result = db.connection.execute(
-        text(f"select series_id from books where isbn = {isbn}"))
-    rows = result.all().copy()
-    if rows.__len__() == 0:
-        return None
-    else:
-        return rows[0][0]
+    return fetch_scalar(SELECT_BOOK_SERIES_ID, {"isbn": isbn})
 
 
 def get_book_series_index(isbn: int) -> Optional[int]:
@@ -506,13 +1565,7 @@ def get_book_series_index(isbn: int) -> Optional[int]:
     Returns:
         Optional[int]: Index in the series
     """
-    result = db.connection.execute(
-        text(f"select series_index from books where isbn = {isbn}"))
-    rows = result.all().copy()
-    if rows.__len__() == 0:
-        return None
-    else:
-        return rows[0][0]
+    return fetch_scalar(SELECT_BOOK_SERIES_INDEX, {"isbn": isbn})
 
 
 def get_book_title(isbn: int) -> Optional[str]:
@@ -524,13 +1577,7 @@ def get_book_title(isbn: int) -> Optional[str]:
     Returns:
         Optional[int]: Title of the book
     """
-    result = db.connection.execute(
-        text(f"select title from books where isbn = {isbn}"))
-    rows = result.all().copy()
-    if rows.__len__() == 0:
-        return None
-    else:
-        return rows[0][0]
+    return fetch_scalar(SELECT_BOOK_TITLE, {"isbn": isbn})
 
 
 def update_book_isbn(old_isbn: int, new_isbn: int):
@@ -542,7 +1589,7 @@ def update_book_isbn(old_isbn: int, new_isbn: int):
     """
     if get_book_isbn(new_isbn) == None:
         db.connection.execute(
-            text(f"update books set isbn = {new_isbn} where isbn = {old_isbn}"))
+            UPDATE_BOOK_ISBN, {"new_isbn": new_isbn, "old_isbn": old_isbn})
 
 
 def update_book_series(isbn: int, series_name: str, author_name: str):
@@ -553,16 +1600,22 @@ def update_book_series(isbn: int, series_name: str, author_name: str):
         series_name (str): Name of the series to find the ID
         author_name (str): Author's name
     """
-    author_id = get_author_id(author_name)
-    if author_id == None:
-        insert_author(author_name)
-        author_id = get_author_id(author_name)
-    series_id = get_series_id(series_name, author_id)
-    if series_id == None:
-        insert_series(author_id, series_name)
-        series_id = get_series_id(series_name, author_id)
+    series_id = resolve_series_id(series_name, author_name)
     db.connection.execute(
-        text(f"update books set series_id = {series_id} where isbn = {isbn}"))
+        UPDATE_BOOK_SERIES, {"series_id": series_id, "isbn": isbn})
+
+
+def resolve_series_id(series_name: str, author_name: str) -> Optional[int]:
+    """Return ID of the series written by the author, adding the author and the series if needed
+
+    Args:
+        series_name (str): Name of the series
+        author_name (str): Author's name
+
+    Returns:
+        Optional[int]: ID of the series
+    """
+    return insert_series(insert_author(author_name), series_name)
 
 
 def update_book_series_index(isbn: int, series_index: int):
@@ -572,8 +1625,8 @@ def update_book_series_index(isbn: int, series_index: int):
         isbn (int): Book's ISBN
         series_index (int): New series index for the book
     """
-    db.connection.execute(
-        text(f"update books set series_index = {series_index} where isbn = {isbn}"))
+    db.connection.execute(UPDATE_BOOK_SERIES_INDEX, {
+                          "series_index": series_index, "isbn": isbn})
 
 
 def update_book_title(isbn: int, title: str):
@@ -583,8 +1636,54 @@ def update_book_title(isbn: int, title: str):
         isbn (int): Book's ISBN
         title (str): New title for the book
     """
-    db.connection.execute(
-        text(f"update books set title = \"{title}\" where isbn = {isbn}"))
+    db.connection.execute(UPDATE_BOOK_TITLE, {"title": title, "isbn": isbn})
+
+
+def update_book_fields(isbn: int, /, **changes) -> list[str]:
+    """Update only the provided fields of a book with a single UPDATE per table
+
+    Keys are names of Book fields. Changing the ISBN updates both books and statistics tables
+    and is skipped if the new ISBN is already in use, same as update_book_isbn. Series can only
+    be changed by providing both series_name and author_name.
+
+    Args:
+        isbn (int): Book's current ISBN
+        **changes: New values for the fields of the book
+
+    Returns:
+        list[str]: Fields that were not changed because their new value is already in use
+
+    Raises:
+        TypeError: One of the keys is not a field of Book
+        ValueError: Only one of series_name and author_name was provided
+    """
+    unknown = changes.keys() - Book.__dataclass_fields__.keys()
+    if unknown.__len__() > 0:
+        raise TypeError(f"Unknown book fields: {sorted(unknown)}")
+    if ("series_name" in changes) != ("author_name" in changes):
+        raise ValueError(
+            "series_name and author_name have to be changed together")
+    skipped = []
+    if "isbn" in changes:
+        if changes["isbn"] == isbn:
+            changes.pop("isbn")
+        elif fetch_scalar(SELECT_ISBN_USED, {"isbn": changes["isbn"]}) != None:
+            changes.pop("isbn")
+            skipped.append("isbn")
+    for column in ("released", "finished"):
+        if column in changes:
+            changes[column] = normalize_date(changes[column])
+    if "series_name" in changes:
+        changes["series_id"] = resolve_series_id(
+            changes.pop("series_name"), changes.pop("author_name"))
+    for table, table_columns in BOOK_COLUMNS.items():
+        columns = tuple(column for column in table_columns
+                        if column in changes)
+        if columns.__len__() > 0:
+            parameters = {column: changes[column] for column in columns}
+            parameters["current_isbn"] = isbn
+            db.connection.execute(update_columns(table, columns), parameters)
+    return skipped
 
 
 def delete_book_isbn(isbn: int):
@@ -593,11 +1692,11 @@ def delete_book_isbn(isbn: int):
     Args:
         series_id (int): ISBN of the book to delete
     """
-    db.connection.execute(text(f"delete from books where isbn = {isbn}"))
+    db.connection.execute(DELETE_BOOK, {"isbn": isbn})
 
 
-def insert_statistics(isbn: int, chapters: Optional[int] = None, pages: Optional[int] = None, released: Optional[str] = None, finished: Optional[str] = None, speed: Optional[int] = None, time: Optional[float] = None):
-    """Add book's statistics if they're not in the database yet
+def insert_statistics(isbn: int, chapters: Optional[int] = None, pages: Optional[int] = None, released: Optional[str] = None, finished: Optional[str] = None, speed: Optional[int] = None, time: Optional[float] = None, policy: str = MERGE_SKIP):
+    """Add book's statistics or merge them into the existing ones with the same ISBN
 
     Args:
         isbn (int): ISBN identifier
@@ -607,20 +1706,18 @@ def insert_statistics(isbn: int, chapters: Optional[int] = None, pages: Optional
         finished (Optional[str], optional): Date the book was read. Defaults to None.
         speed (Optional[int], optional): Number of words per minute achieved when reading the book. Defaults to None.
         time (Optional[float], optional): Hours taken to finish reading the book. Defaults to None.
+        policy (str, optional): What to do with existing statistics, see insert_book. Defaults to MERGE_SKIP.
     """
-    id = get_statistics_isbn(isbn)
-    if id == None:
-        query_builder = StringIO()
-        query_builder.write(f"insert into statistics values ({isbn}, ")
-        query_builder.write(f"{chapters}, " if chapters != None else "NULL, ")
-        query_builder.write(f"{pages}, " if pages != None else "NULL, ")
-        query_builder.write(
-            f"\"{released}\", " if released != None else "NULL, ")
-        query_builder.write(
-            f"\"{finished}\", " if finished != None else "NULL, ")
-        query_builder.write(f"{speed}, " if speed != None else "NULL, ")
-        query_builder.write(f"{time})" if time != None else "NULL)")
-        db.connection.execute(text(f"{query_builder.getvalue()}"))
+    statement = merge_statement(UPSERT_STATISTICS, policy)
+    if isbn == None or isbn == '':
+        return
+    db.connection.execute(statement, {"isbn": isbn,
+                                      "chapters": chapters,
+                                      "pages": pages,
+                                      "released": normalize_date(released),
+                                      "finished": normalize_date(finished),
+                                      "speed": speed,
+                                      "time": time})
 
 
 def get_statistics_isbn(isbn: int) -> Optional[int]:
@@ -635,13 +1732,7 @@ def get_statistics_isbn(isbn: int) -> Optional[int]:
     if isbn == None or isbn == '':
         return None
     else:
-        result = db.connection.execute(
-            text(f"select isbn from statistics where isbn = {isbn}"))
-        rows = result.all().copy()
-        if rows.__len__() == 0:
-            return None
-        else:
-            return rows[0][0]
+        return fetch_scalar(SELECT_STATISTICS_ISBN, {"isbn": isbn})
 
 
 def get_statistics_chapters(isbn: int) -> Optional[int]:
@@ -653,13 +1744,7 @@ def get_statistics_chapters(isbn: int) -> Optional[int]:
     Returns:
         Optional[int]: Number of chapters in a book
     """
-    result = db.connection.execute(
-        text(f"select chapters from statistics where isbn = {isbn}"))
-    rows = result.all().copy()
-    if rows.__len__() == 0:
-        return None
-    else:
-        return rows[0][0]
+    return fetch_scalar(SELECT_STATISTICS_CHAPTERS, {"isbn": isbn})
 
 
 def get_statistics_pages(isbn: int) -> Optional[int]:
@@ -671,13 +1756,7 @@ def get_statistics_pages(isbn: int) -> Optional[int]:
     Returns:
         Optional[int]: Number of pages in a book
     """
-    result = db.connection.execute(
-        text(f"select pages from statistics where isbn = {isbn}"))
-    rows = result.all().copy()
-    if rows.__len__() == 0:
-        return None
-    else:
-        return rows[0][0]
+    return fetch_scalar(SELECT_STATISTICS_PAGES, {"isbn": isbn})
 
 
 def get_statistics_released(isbn: int) -> Optional[str]:
@@ -689,13 +1768,7 @@ def get_statistics_released(isbn: int) -> Optional[str]:
     Returns:
         Optional[str]: Date when a book was released
     """
-    result = db.connection.execute(
-        text(f"select released from statistics where isbn = {isbn}"))
-    rows = result.all().copy()
-    if rows.__len__() == 0:
-        return None
-    else:
-        return rows[0][0]
+    return fetch_scalar(SELECT_STATISTICS_RELEASED, {"isbn": isbn})
 
 
 def get_statistics_finished(isbn: int) -> Optional[str]:
@@ -707,13 +1780,7 @@ def get_statistics_finished(isbn: int) -> Optional[str]:
     Returns:
         Optional[str]: Date when a book was finished
     """
-    result = db.connection.execute(
-        text(f"select finished from statistics where isbn = {isbn}"))
-    rows = result.all().copy()
-    if rows.__len__() == 0:
-        return None
-    else:
-        return rows[0][0]
+    return fetch_scalar(SELECT_STATISTICS_FINISHED, {"isbn": isbn})
 
 
 def get_statistics_speed(isbn: int) -> Optional[int]:
@@ -725,13 +1792,7 @@ def get_statistics_speed(isbn: int) -> Optional[int]:
     Returns:
         Optional[int]: Average words/minute achieved while reading
     """
-    result = db.connection.execute(
-        text(f"select speed from statistics where isbn = {isbn}"))
-    rows = result.all().copy()
-    if rows.__len__() == 0:
-        return None
-    else:
-        return rows[0][0]
+    return fetch_scalar(SELECT_STATISTICS_SPEED, {"isbn": isbn})
 
 
 def get_statistics_time(isbn: int) -> Optional[float]:
@@ -743,13 +1804,7 @@ def get_statistics_time(isbn: int) -> Optional[float]:
     Returns:
         Optional[float]: Number of hours needed to finish a book
     """
-    result = db.connection.execute(
-        text(f"select time from statistics where isbn = {isbn}"))
-    rows = result.all().copy()
-    if rows.__len__() == 0:
-        return None
-    else:
-        return rows[0][0]
+    return fetch_scalar(SELECT_STATISTICS_TIME, {"isbn": isbn})
 
 
 def update_statistics_isbn(old_isbn: int, new_isbn: int):
@@ -761,7 +1816,7 @@ def update_statistics_isbn(old_isbn: int, new_isbn: int):
     """
     if get_statistics_isbn(new_isbn) == None:
         db.connection.execute(
-            text(f"update statistics set isbn = {new_isbn} where isbn = {old_isbn}"))
+            UPDATE_STATISTICS_ISBN, {"new_isbn": new_isbn, "old_isbn": old_isbn})
 
 
 def update_statistics_chapters(isbn: int, chapters: int):
@@ -772,7 +1827,7 @@ def update_statistics_chapters(isbn: int, chapters: int):
         chapters (int): New number of chapters
     """
     db.connection.execute(
-        text(f"update statistics set chapters = {chapters} where isbn = {isbn}"))
+        UPDATE_STATISTICS_CHAPTERS, {"chapters": chapters, "isbn": isbn})
 
 
 def update_statistics_pages(isbn: int, pages: int):
@@ -783,7 +1838,7 @@ def update_statistics_pages(isbn: int, pages: int):
         pages (int): New number of pages
     """
     db.connection.execute(
-        text(f"update statistics set pages = {pages} where isbn = {isbn}"))
+        UPDATE_STATISTICS_PAGES, {"pages": pages, "isbn": isbn})
 
 
 def update_statistics_released(isbn: int, released: str):
@@ -794,7 +1849,7 @@ def update_statistics_released(isbn: int, released: str):
         released (str): New release date
     """
     db.connection.execute(
-        text(f"update statistics set released = \"{released}\" where isbn = {isbn}"))
+        UPDATE_STATISTICS_RELEASED, {"released": normalize_date(released), "isbn": isbn})
 
 
 def update_statistics_finished(isbn: int, finished: str):
@@ -805,7 +1860,7 @@ def update_statistics_finished(isbn: int, finished: str):
         finished (str): New finish date
     """
     db.connection.execute(
-        text(f"update statistics set finished = \"{finished}\" where isbn = {isbn}"))
+        UPDATE_STATISTICS_FINISHED, {"finished": normalize_date(finished), "isbn": isbn})
 
 
 def update_statistics_speed(isbn: int, speed: int):
@@ -816,7 +1871,7 @@ def update_statistics_speed(isbn: int, speed: int):
         speed (int): New speed for the book
     """
     db.connection.execute(
-        text(f"update statistics set speed = {speed} where isbn = {isbn}"))
+        UPDATE_STATISTICS_SPEED, {"speed": speed, "isbn": isbn})
 
 
 def update_statistics_time(isbn: int, time: float):
@@ -827,7 +1882,7 @@ def update_statistics_time(isbn: int, time: float):
         time (float): New time
     """
     db.connection.execute(
-        text(f"update statistics set time = {time} where isbn = {isbn}"))
+        UPDATE_STATISTICS_TIME, {"time": time, "isbn": isbn})
 
 
 def delete_statistics_isbn(isbn: int):
@@ -836,4 +1891,4 @@ def delete_statistics_isbn(isbn: int):
     Args:
         series_id (int): ISBN of the statistics to delete
     """
-    db.connection.execute(text(f"delete from statistics where isbn = {isbn}"))
+    db.connection.execute(DELETE_STATISTICS, {"isbn": isbn})
@@ -0,0 +1,201 @@
+from functools import lru_cache
+from sqlalchemy import text, bindparam, TextClause
+from .constants import MERGE_SKIP, MERGE_OVERWRITE, MERGE_FILL_NULLS
+
+# Every statement is compiled once at import time and only ever receives values through bound
+# parameters, so SQLAlchemy's compiled cache and sqlite3's prepared statement cache are reused
+# between calls and quotes inside names can't break the queries.
+
+SELECT_AUTHORS = text("select author_id, name from authors")
+SELECT_SERIES = text("select series_id, name, author_id from series")
+
+# IDs of new names come from the database, names added by another connection are simply kept
+INSERT_AUTHOR_NAMES = text(
+    "insert into authors (name) values (:name) on conflict (name) do nothing")
+SELECT_AUTHOR_IDS = text("select author_id, name from authors where name in :names").bindparams(
+    bindparam("names", expanding=True))
+# The no-op update makes RETURNING hand back the ID of an already existing row as well
+UPSERT_AUTHOR_NAME = text(
+    "insert into authors (name) values (:name) on conflict (name) do update set name = excluded.name returning author_id")
+SELECT_AUTHOR_ID = text("select author_id from authors where name = :name limit 1")
+SELECT_MAX_AUTHOR_ID = text("select max(author_id) from authors")
+SELECT_AUTHOR_NAME = text("select name from authors where author_id = :author_id limit 1")
+UPDATE_AUTHOR_NAME = text(
+    "update authors set name = :name where author_id = :author_id")
+DELETE_AUTHOR = text("delete from authors where author_id = :author_id")
+
+# No conflict target, databases from older versions don't have the unique index on series yet
+INSERT_SERIES_NAMES = text(
+    "insert into series (name, author_id) select :name, :author_id where not exists (select 1 from series where name = :name and author_id = :author_id)")
+SELECT_AUTHORS_SERIES = text("select series_id, name, author_id from series where author_id in :author_ids").bindparams(
+    bindparam("author_ids", expanding=True))
+UPSERT_SERIES_NAME = text(
+    "insert into series (name, author_id) values (:name, :author_id) on conflict (author_id, name) do update set name = excluded.name returning series_id")
+SELECT_SERIES_ID = text(
+    "select series_id from series where name = :name and author_id = :author_id limit 1")
+SELECT_MAX_SERIES_ID = text("select max(series_id) from series")
+COUNT_AUTHORS_SERIES = text(
+    "select count(*) from series where author_id = :author_id")
+SELECT_SERIES_AUTHOR_ID = text(
+    "select author_id from series where series_id = :series_id limit 1")
+SELECT_SERIES_NAME = text("select name from series where series_id = :series_id limit 1")
+COUNT_SERIES_BOOKS = text(
+    "select count(*) from books where series_id = :series_id")
+UPDATE_AUTHORS_SERIES = text(
+    "update series set author_id = :new_author_id where author_id = :old_author_id")
+UPDATE_SERIES_AUTHOR = text(
+    "update series set author_id = :author_id where series_id = :series_id")
+# Series of the old author named like one of the new author's series are merged into it
+MOVE_DUPLICATE_SERIES_BOOKS = text(
+    "update books set series_id = (select d.series_id from series as s join series as d on d.name = s.name and d.author_id = :new_author_id where s.series_id = books.series_id) where series_id in (select s.series_id from series as s join series as d on d.name = s.name and d.author_id = :new_author_id where s.author_id = :old_author_id and s.series_id != d.series_id)")
+DELETE_DUPLICATE_SERIES = text(
+    "delete from series where author_id = :old_author_id and author_id != :new_author_id and name in (select name from series where author_id = :new_author_id)")
+MOVE_SERIES_BOOKS = text(
+    "update books set series_id = :target_id where series_id = :series_id")
+UPDATE_SERIES_NAME = text(
+    "update series set name = :name where series_id = :series_id")
+DELETE_SERIES = text("delete from series where series_id = :series_id")
+
+BOOKS_INFO_FILTER = "from statistics left join books as b using (isbn) left join series as s using (series_id) left join authors as a using (author_id) where b.isbn like :isbn and a.name like :author and s.name like :series and b.title like :title"
+SELECT_BOOKS_INFO_PAGE = text(f"select b.isbn, a.name as 'author', s.name as 'series', b.series_index as 'index', b.title, released, finished, chapters, pages, speed, time {BOOKS_INFO_FILTER} and coalesce(released, '') >= :after_released and (coalesce(released, ''), statistics.isbn) > (:after_released, :after_isbn) order by coalesce(released, ''), statistics.isbn limit :limit")
+COUNT_BOOKS_INFO = text(f"select count(*) {BOOKS_INFO_FILTER}")
+SELECT_BOOK = text("select coalesce(b.isbn, st.isbn), a.name, s.name, b.series_index, b.title, st.chapters, st.pages, st.released, st.finished, st.speed, st.time from (select :isbn as isbn) as i left join books as b on b.isbn = i.isbn left join statistics as st on st.isbn = i.isbn left join series as s on s.series_id = b.series_id left join authors as a on a.author_id = s.author_id where b.isbn is not null or st.isbn is not null")
+SEARCH_BOOKS = text("select b.isbn, a.name, s.name, b.series_index, b.title, st.chapters, st.pages, st.released, st.finished, st.speed, st.time from books_fts as f join books as b on b.isbn = f.rowid left join series as s on s.series_id = b.series_id left join authors as a on a.author_id = s.author_id left join statistics as st on st.isbn = b.isbn where books_fts match :query order by f.rank limit :limit")
+SELECT_BOOK_ISBN = text("select isbn from books where isbn = :isbn limit 1")
+SELECT_BOOK_SERIES_ID = text("select series_id from books where isbn = :isbn limit 1")
+SELECT_BOOK_SERIES_INDEX = text(
+    "select series_index from books where isbn = :isbn limit 1")
+SELECT_BOOK_TITLE = text("select title from books where isbn = :isbn limit 1")
+UPDATE_BOOK_ISBN = text(
+    "update books set isbn = :new_isbn where isbn = :old_isbn")
+UPDATE_BOOK_SERIES = text(
+    "update books set series_id = :series_id where isbn = :isbn")
+UPDATE_BOOK_SERIES_INDEX = text(
+    "update books set series_index = :series_index where isbn = :isbn")
+UPDATE_BOOK_TITLE = text("update books set title = :title where isbn = :isbn")
+DELETE_BOOK = text("delete from books where isbn = :isbn")
+
+SELECT_STATISTICS_ISBN = text("select isbn from statistics where isbn = :isbn limit 1")
+SELECT_STATISTICS_CHAPTERS = text(
+    "select chapters from statistics where isbn = :isbn limit 1")
+SELECT_STATISTICS_PAGES = text("select pages from statistics where isbn = :isbn limit 1")
+SELECT_STATISTICS_RELEASED = text(
+    "select released from statistics where isbn = :isbn limit 1")
+SELECT_STATISTICS_FINISHED = text(
+    "select finished from statistics where isbn = :isbn limit 1")
+SELECT_STATISTICS_SPEED = text("select speed from statistics where isbn = :isbn limit 1")
+SELECT_STATISTICS_TIME = text("select time from statistics where isbn = :isbn limit 1")
+UPDATE_STATISTICS_ISBN = text(
+    "update statistics set isbn = :new_isbn where isbn = :old_isbn")
+UPDATE_STATISTICS_CHAPTERS = text(
+    "update statistics set chapters = :chapters where isbn = :isbn")
+UPDATE_STATISTICS_PAGES = text(
+    "update statistics set pages = :pages where isbn = :isbn")
+UPDATE_STATISTICS_RELEASED = text(
+    "update statistics set released = :released where isbn = :isbn")
+UPDATE_STATISTICS_FINISHED = text(
+    "update statistics set finished = :finished where isbn = :isbn")
+UPDATE_STATISTICS_SPEED = text(
+    "update statistics set speed = :speed where isbn = :isbn")
+UPDATE_STATISTICS_TIME = text(
+    "update statistics set time = :time where isbn = :isbn")
+DELETE_STATISTICS = text("delete from statistics where isbn = :isbn")
+# Dates that don't look like ISO 8601 yet, "20XX" stays as it is and is skipped by normalize_dates
+SELECT_NON_ISO_DATES = text("select isbn, released, finished from statistics where released not glob '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]' or finished not glob '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'")
+UPDATE_STATISTICS_DATES = text(
+    "update statistics set released = :released, finished = :finished where isbn = :isbn")
+BOOKS_BETWEEN_COLUMNS = "select a.name, s.name, st.isbn, b.title, b.series_index, st.chapters, st.pages, st.released, st.finished, st.speed, st.time from statistics as st left join books as b on b.isbn = st.isbn left join series as s on s.series_id = b.series_id left join authors as a on a.author_id = s.author_id"
+SELECT_BOOKS_FINISHED_BETWEEN = text(
+    f"{BOOKS_BETWEEN_COLUMNS} where st.finished_day between :start and :end order by st.finished_day, st.isbn")
+SELECT_BOOKS_RELEASED_BETWEEN = text(
+    f"{BOOKS_BETWEEN_COLUMNS} where st.released_day between :start and :end order by st.released_day, st.isbn")
+ROLLUP_TOTALS = "r.books, r.finished, r.chapters, r.pages, r.time, r.speed_sum * 1.0 / nullif(r.speed_count, 0)"
+SELECT_YEAR_ROLLUPS = text(
+    f"select r.year, r.year, {ROLLUP_TOTALS} from rollup_years as r order by r.year")
+SELECT_AUTHOR_ROLLUPS = text(
+    f"select r.author_id, a.name, {ROLLUP_TOTALS} from rollup_authors as r join authors as a on a.author_id = r.author_id order by a.name")
+SELECT_SERIES_ROLLUPS = text(
+    f"select r.series_id, s.name, {ROLLUP_TOTALS} from rollup_series as r join series as s on s.series_id = r.series_id order by s.name, r.series_id")
+# Columns of analytics.SNAPSHOT_DTYPE with dates as text, numpy converts them faster than julianday.
+# Dates are normalized when written, so a dash after the year is enough to leave out "20XX".
+ISO_DATE = "iif(substr({0}, 5, 1) = '-', substr({0}, 1, 10), null)"
+SELECT_ANALYTICS_SNAPSHOT = text(
+    f"select st.isbn, coalesce(s.author_id, -1), coalesce(b.series_id, -1), st.chapters, st.pages, st.speed, st.time, {ISO_DATE.format('st.released')}, {ISO_DATE.format('st.finished')} from statistics as st left join books as b on b.isbn = st.isbn left join series as s on s.series_id = b.series_id")
+SELECT_VIEW_HASHES = text("select name, hash from view_hashes")
+SELECT_VIEW_OBJECTS = text(
+    "select name, type from sqlite_master where type in ('table', 'view')")
+SELECT_OBJECT_TYPE = text(
+    "select type from sqlite_master where name = :name collate nocase and type in ('table', 'view')")
+UPSERT_VIEW_HASH = text(
+    "insert into view_hashes (name, hash) values (:name, :hash) on conflict (name) do update set hash = excluded.hash")
+DELETE_VIEW_HASH = text("delete from view_hashes where name = :name")
+SELECT_MATERIALIZED_VIEWS = text(
+    "select name, refresh, interval, refreshed_at, stale from materialized_views order by position")
+SELECT_REFRESH_VIEW = text(
+    "select 1 from materialized_views where refresh = :refresh limit 1")
+SELECT_STALE_VIEWS = text(
+    "select name from materialized_views where refresh = :refresh and stale = 1 order by position")
+SELECT_DUE_VIEWS = text(
+    "select name from materialized_views where refresh = :refresh and stale = 1 and (refreshed_at is null or refreshed_at + interval <= :now) order by position")
+INSERT_MATERIALIZED_VIEW = text(
+    "insert into materialized_views (name, refresh, interval, refreshed_at, stale, position) values (:name, :refresh, :interval, :refreshed_at, 0, :position)")
+UPDATE_MATERIALIZED_VIEW_POSITION = text(
+    "update materialized_views set position = :position where name = :name")
+UPDATE_MATERIALIZED_VIEW_REFRESHED = text(
+    "update materialized_views set stale = 0, refreshed_at = :refreshed_at where name = :name")
+DELETE_MATERIALIZED_VIEW = text(
+    "delete from materialized_views where name = :name")
+INSERT_MATERIALIZED_VIEW_TABLE = text(
+    "insert into materialized_view_tables (name, table_name) values (:name, :table_name)")
+DELETE_MATERIALIZED_VIEW_TABLES = text(
+    "delete from materialized_view_tables where name = :name")
+SELECT_BOOK_HASHES = text("select isbn, hash from book_hashes")
+SELECT_STORED_ISBNS = text(
+    "select isbn from books union select isbn from statistics")
+UPSERT_BOOK_HASH = text(
+    "insert into book_hashes (isbn, hash) values (:isbn, :hash) on conflict (isbn) do update set hash = excluded.hash")
+DELETE_BOOK_HASH = text("delete from book_hashes where isbn = :isbn")
+# Columns in Book's order, books and statistics are both optional so ISBNs come from either table
+SELECT_LIBRARY_PAGE = text("select a.name, s.name, i.isbn, b.title, b.series_index, st.chapters, st.pages, st.released, st.finished, st.speed, st.time from (select isbn from books where isbn > :after_isbn union select isbn from statistics where isbn > :after_isbn order by isbn limit :limit) as i left join books as b on b.isbn = i.isbn left join statistics as st on st.isbn = i.isbn left join series as s on s.series_id = b.series_id left join authors as a on a.author_id = s.author_id order by i.isbn")
+SELECT_ISBN_USED = text(
+    "select isbn from books where isbn = :isbn union all select isbn from statistics where isbn = :isbn limit 1")
+
+
+def upserts(table: str, columns: tuple[str, ...]) -> dict[str, TextClause]:
+    """Build inserts of a row identified by ISBN for every merge policy
+
+    Args:
+        table (str): Name of the table to insert into
+        columns (tuple[str, ...]): Names of all the table's columns, ISBN first
+
+    Returns:
+        dict[str, TextClause]: Statements keyed by merge policy
+    """
+    insert = f"insert into {table} ({', '.join(columns)}) values ({', '.join(':' + column for column in columns)}) on conflict (isbn) do"
+    overwrite = ", ".join(
+        f"{column} = excluded.{column}" for column in columns[1:])
+    fill_nulls = ", ".join(
+        f"{column} = coalesce({table}.{column}, excluded.{column})" for column in columns[1:])
+    return {MERGE_SKIP: text(f"{insert} nothing"),
+            MERGE_OVERWRITE: text(f"{insert} update set {overwrite}"),
+            MERGE_FILL_NULLS: text(f"{insert} update set {fill_nulls}")}
+
+
+UPSERT_BOOK = upserts("books", ("isbn", "series_id", "series_index", "title"))
+UPSERT_STATISTICS = upserts("statistics", ("isbn", "chapters", "pages",
+                                           "released", "finished", "speed", "time"))
+
+
+@lru_cache(maxsize=None)
+def update_columns(table: str, columns: tuple[str, ...]) -> TextClause:
+    """Return an update of the given columns for a row identified by ISBN, built once per column set
+
+    Args:
+        table (str): Name of the table to update
+        columns (tuple[str, ...]): Names of the columns to set, bound to parameters of the same name
+
+    Returns:
+        TextClause: Statement taking the current ISBN as :current_isbn
+    """
+    assignments = ", ".join(f"{column} = :{column}" for column in columns)
+    return text(f"update {table} set {assignments} where isbn = :current_isbn")
@@ -0,0 +1,100 @@
+import pytest
+from .test_fixtures import test_no_db, test_empty_db, test_db
+from reading_statistics.Database import Database
+from reading_statistics.sqlite import insert_statistics, update_statistics_pages, get_author_id, get_book_series_id
+
+np = pytest.importorskip("numpy")
+from reading_statistics.analytics import get_snapshot, clear_snapshot, moving_average, percentiles, speed_trend, totals_by, histogram, to_days  # noqa: E402
+
+
+@pytest.fixture
+def snapshot(test_db):
+    clear_snapshot()
+    yield get_snapshot()
+    clear_snapshot()
+
+
+def test_get_snapshot(snapshot):
+    assert sorted(snapshot["isbn"]) == [9780553448122, 9780593135204, 9780804139021]
+    artemis = snapshot[snapshot["isbn"] == 9780553448122][0]
+    assert artemis["author_id"] == get_author_id("Andy Weir")
+    assert artemis["series_id"] == get_book_series_id(9780553448122)
+    assert (artemis["pages"], artemis["finished_day"], artemis["finished_year"]) == (305, 19528, 2023)
+    assert np.isnan(artemis["speed"])
+    martian = snapshot[snapshot["isbn"] == 9780804139021][0]
+    assert np.isnan(martian["finished_day"]) and martian["finished_year"] == -1
+
+
+def test_get_snapshot_rebuilt_on_change(snapshot):
+    assert get_snapshot() is snapshot
+    update_statistics_pages(9780553448122, 300)
+    Database.commit()
+    changed = get_snapshot()
+    assert changed is not snapshot
+    assert changed[changed["isbn"] == 9780553448122][0]["pages"] == 300
+    assert get_snapshot() is changed
+    assert get_snapshot(refresh=True) is not changed
+
+
+def test_get_snapshot_not_cached_in_transaction(snapshot):
+    with pytest.raises(RuntimeError):
+        with Database.transaction():
+            update_statistics_pages(9780553448122, 300)
+            pending = get_snapshot()
+            assert pending[pending["isbn"] == 9780553448122][0]["pages"] == 300
+            raise RuntimeError
+    restored = get_snapshot()
+    assert restored[restored["isbn"] == 9780553448122][0]["pages"] == 305
+
+
+def test_get_snapshot_empty(test_empty_db):
+    clear_snapshot()
+    assert get_snapshot().__len__() == 0
+    assert np.isnan(percentiles()).all()
+    assert moving_average()[1].__len__() == 0
+    assert np.isnan(speed_trend()[0])
+    clear_snapshot()
+
+
+def test_moving_average(test_db):
+    clear_snapshot()
+    for day in range(1, 6):
+        insert_statistics(day, pages=100 * day,
+                          finished=f"2024-01-0{day}", speed=10 * day)
+    days, averages = moving_average("pages", 2)
+    assert days.tolist() == [19591, 19723, 19724, 19725, 19726, 19727]
+    assert averages.tolist() == [(305 + 476) / 2, (476 + 100) / 2, 150, 250, 350, 450]
+    slope, intercept = np.polyfit([19591] + list(range(19723, 19728)), [169, 10, 20, 30, 40, 50], 1)
+    assert speed_trend() == pytest.approx((slope, intercept))
+    clear_snapshot()
+
+
+def test_percentiles(snapshot):
+    assert percentiles("pages", (0, 50, 100)).tolist() == [305, 384, 476]
+    assert percentiles("speed", (50,)).tolist() == [84.5]
+
+
+def test_totals_by(snapshot):
+    years, pages, books = totals_by("finished_year", "pages")
+    assert (years.tolist(), pages.tolist(), books.tolist()) == ([2023], [781], [2])
+    authors, hours, books = totals_by("author_id", "time")
+    assert (authors.tolist(), hours.tolist(), books.tolist()) == ([get_author_id("Andy Weir")], [15.06], [3])
+
+
+def test_totals_by_sparse_keys(snapshot):
+    isbns, pages, books = totals_by("isbn", "pages")
+    assert (isbns.tolist(), pages.tolist(), books.tolist()) == (
+        [9780553448122, 9780593135204, 9780804139021], [305, 476, 384], [1, 1, 1])
+
+
+def test_to_days():
+    days = to_days(("1970-01-02", None, "2023-02-30", "2023-06-20"))
+    assert days[0] == 1 and days[3] == 19528
+    assert np.isnan(days[1]) and np.isnan(days[2])
+
+
+def test_histogram(snapshot):
+    counts, edges = histogram("pages", 2)
+    assert counts.tolist() == [2, 1]
+    assert edges.tolist() == [305, 390.5, 476]
+    assert histogram("pages", 2, 2023)[0].tolist() == [1, 1]
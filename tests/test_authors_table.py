@@ -1,9 +1,10 @@
 import pytest
+from sqlalchemy import event
 from .test_fixtures import test_no_db, test_empty_db
-from reading_statistics.sqlite import insert_author, get_author_id, get_author_name, update_author_name, delete_author_id
+from reading_statistics.sqlite import get_cache_info, insert_author, get_author_id, get_author_name, update_author_name, delete_author_id
 
 
-@pytest.mark.parametrize("name", [("Test Name")])
+@pytest.mark.parametrize("name", [("Test Name"), ("Madeleine L'Engle"), ("Dwayne \"The Rock\" Johnson")])
 def test_insert_author(test_empty_db, name):
     assert get_author_id(name) == None
     insert_author(name)
@@ -35,3 +36,43 @@ def test_delete_author_name(test_empty_db, name):
     assert id != None
     delete_author_id(id)
     assert get_author_id(name) == None
+
+
+@pytest.mark.parametrize("names", [(["First", "Second", "First", "", "Third"])])
+def test_insert_author_returns_id(test_empty_db, names):
+    ids = [insert_author(name) for name in names]
+    assert ids == [1, 2, 1, None, 3]
+    for name, id in zip(names, ids):
+        assert get_author_id(name) == id
+
+
+def test_insert_author_statements(test_empty_db):
+    statements = []
+    event.listen(test_empty_db, "before_cursor_execute",
+                 lambda *args: statements.append(args[2]))
+    insert_author("Test Name")
+    insert_author("Test Name")
+    assert statements.__len__() == 1
+    assert not any(s.startswith("select") for s in statements)
+    assert not any(s.__contains__("max(") for s in statements)
+
+
+def test_get_author_id_cached(test_empty_db):
+    insert_author("Test Name")
+    statements = []
+    event.listen(test_empty_db, "before_cursor_execute",
+                 lambda *args: statements.append(args[2]))
+    for _ in range(3):
+        assert get_author_id("Test Name") == 1
+    assert statements.__len__() == 0
+    assert get_cache_info()["authors"].hits == 3
+
+
+@pytest.mark.parametrize("old_name, new_name", [("Test Name", "John Doe")])
+def test_author_cache_invalidation(test_empty_db, old_name, new_name):
+    id = insert_author(old_name)
+    update_author_name(id, new_name)
+    assert get_author_id(old_name) == None
+    assert get_author_id(new_name) == id
+    delete_author_id(id)
+    assert get_author_id(new_name) == None
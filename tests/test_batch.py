@@ -0,0 +1,108 @@
+import json
+import pytest
+from .test_fixtures import test_no_db, test_empty_db, test_db
+from reading_statistics.batch import main, apply_operations
+from reading_statistics.library_io import iter_books_from_file
+from reading_statistics.sqlite import get_book, get_author_id, get_max_author_id, iter_library
+
+
+def write_operations(path, operations):
+    with open(path, "w") as file:
+        for operation in operations:
+            file.write((json.dumps(operation)
+                       if isinstance(operation, dict) else operation) + "\n")
+    return str(path)
+
+
+def test_apply(test_db, tmp_path, capfd):
+    location = write_operations(tmp_path / "changes.jsonl", [
+        {"op": "add", "book": {"author_name": "Mary Shelley", "series_name": "Frankenstein", "isbn": 1234567890, "title": "Frankenstein",
+                               "series_index": None, "chapters": 24, "pages": 280, "released": "1818-01-01", "finished": None, "speed": None, "time": None}},
+        {"op": "update", "isbn": 9780593135204,
+            "changes": {"title": "New Title", "time": 1.5}},
+        "",
+        {"op": "delete", "isbn": 9780553448122}])
+    assert main(["apply", location, "--batch-size", "2"]) == 0
+    out = capfd.readouterr()
+    assert out[0].startswith("Applied 3 operations in ")
+    assert out[0].endswith("ops/s), 0 failed.\n")
+    assert get_book(1234567890).author_name == "Mary Shelley"
+    assert (get_book(9780593135204).title,
+            get_book(9780593135204).time) == ("New Title", 1.5)
+    assert get_book(9780553448122) == None
+
+
+def test_apply_failures(test_empty_db, tmp_path, capfd):
+    location = write_operations(tmp_path / "changes.jsonl", [
+        {"op": "add", "book": {"author_name": "Kept", "series_name": None, "isbn": 1, "title": None,
+                               "series_index": None, "chapters": None, "pages": None, "released": None, "finished": None, "speed": None, "time": None}},
+        {"op": "add", "book": {"author_name": "Discarded"}},
+        {"op": "update", "isbn": 1, "changes": {"unknown": 1}},
+        {"op": "rename"},
+        "{not json"])
+    assert main(["apply", location]) == 1
+    out = capfd.readouterr()
+    assert out[0].__contains__("Applied 1 operations")
+    assert out[0].__contains__("4 failed.\n\tLine 2: KeyError")
+    assert out[0].__contains__("\tLine 5: JSONDecodeError")
+    assert get_author_id("Kept") == 1
+    assert get_author_id("Discarded") == None
+
+
+def test_apply_wrongly_typed_change(test_empty_db):
+    book = {"author_name": "Kept", "series_name": None, "title": "Title", "series_index": None,
+            "chapters": None, "pages": None, "released": None, "finished": None, "speed": None, "time": None}
+    operations = [(1, json.dumps({"op": "add", "book": dict(book, isbn=1)})),
+                  (2, json.dumps({"op": "update", "isbn": 1, "changes": {"title": ["x"]}})),
+                  (3, json.dumps({"op": "add", "book": dict(book, isbn=2)}))]
+    applied, failures = apply_operations(operations)
+    assert applied == 2
+    assert failures.__len__() == 1 and failures[0].startswith("Line 2: ")
+    assert get_book(1).title == "Title"
+    assert get_book(2) != None
+
+
+def test_apply_batches(test_empty_db):
+    operations = [(i, json.dumps({"op": "add", "book": {"author_name": f"Author {i}", "series_name": None, "isbn": i, "title": None, "series_index": None,
+                                                         "chapters": None, "pages": None, "released": None, "finished": None, "speed": None, "time": None}}))
+                  for i in range(1, 11)]
+    assert apply_operations(operations, batch_size=3) == (10, [])
+    assert get_max_author_id() == 10
+
+
+def test_apply_errors(test_no_db, tmp_path, capfd):
+    assert main(["apply", write_operations(tmp_path / "changes.jsonl", [])]) == 2
+    out = capfd.readouterr()
+    assert out[0].startswith("\nAt least one table is corrupted.")
+
+
+def test_load(test_empty_db, tmp_path, capfd):
+    with open("./tests/test_library.json", "r") as file:
+        books = json.load(file)["books"]
+    location = write_operations(tmp_path / "books.jsonl", books[:2] + ["{}"])
+    assert main(["load", location, "./tests/test_library.json", "--workers", "2"]) == 0
+    out = capfd.readouterr()
+    assert out[0].__contains__(f"Skipped {location}:3: KeyError")
+    assert out[0].__contains__(f"Loaded {books.__len__() + 2} books in ")
+    assert out[0].endswith("rows/s), 1 invalid.\n")
+    assert get_book(9780804139021).title == "The Martian"
+
+
+def test_export(test_db, tmp_path, capfd):
+    location = str(tmp_path / "books.csv.gz")
+    assert main(["export", location]) == 0
+    assert capfd.readouterr()[0].startswith("Exported 3 books in ")
+    books = list(iter_books_from_file(location))
+    assert [b.isbn for b in books] == sorted(
+        b.isbn for b in iter_books_from_file("./tests/test_library.json") if b.isbn != None)
+    assert books == list(iter_library(page_size=2))
+    assert [b for b in books if b.isbn == 9780804139021] == [get_book(9780804139021)]
+
+
+def test_views_errors(test_db, tmp_path, capfd):
+    location = tmp_path / "views.json"
+    location.write_text(json.dumps({"views": [{"view": "select 1"}]}))
+    assert main(["views", str(location)]) == 2
+    assert capfd.readouterr()[1].startswith("Not a create view statement: select 1")
+    assert main(["refresh-views", "Missing"]) == 2
+    assert capfd.readouterr()[1] == "Not a materialized view: Missing\n"
@@ -1,6 +1,8 @@
 import pytest
-from .test_fixtures import test_no_db, test_empty_db
-from reading_statistics.sqlite import insert_author, insert_series, get_author_id, get_series_id, insert_book, get_book_isbn, get_book_series_id, get_book_series_index, get_book_title, get_series_number_of_books, update_book_isbn, update_book_series, update_book_series_index, update_book_title, delete_book_isbn
+from sqlalchemy import event
+from .test_fixtures import test_no_db, test_empty_db, test_db
+from reading_statistics.constants import MERGE_SKIP, MERGE_OVERWRITE, MERGE_FILL_NULLS
+from reading_statistics.sqlite import search_books, rebuild_search_index, update_author_name, update_series_name, get_book, update_book_fields, get_statistics_isbn, get_statistics_time, insert_statistics, insert_author, insert_series, get_author_id, get_series_id, insert_book, get_book_isbn, get_book_series_id, get_book_series_index, get_book_title, get_series_number_of_books, update_book_isbn, update_book_series, update_book_series_index, update_book_title, delete_book_isbn
 
 
 @pytest.mark.parametrize("isbn, series_id, series_index, title", [(123456789, 1, 1, "Test Title")])
@@ -10,6 +12,38 @@ def test_insert_book(test_empty_db, isbn, series_id, series_index, title):
     assert get_book_isbn(isbn) != None
 
 
+@pytest.mark.parametrize("policy, series_index, title", [(MERGE_SKIP, None, "Old Title"), (MERGE_OVERWRITE, 2, "New Title"), (MERGE_FILL_NULLS, 2, "Old Title")])
+def test_insert_book_policy(test_empty_db, policy, series_index, title):
+    insert_book(123456789, None, None, "Old Title")
+    insert_book(123456789, None, 2, "New Title", policy)
+    assert get_book_series_index(123456789) == series_index
+    assert get_book_title(123456789) == title
+
+
+@pytest.mark.parametrize("policy, pages, time", [(MERGE_SKIP, 100, None), (MERGE_OVERWRITE, 200, 1.5), (MERGE_FILL_NULLS, 100, 1.5)])
+def test_insert_statistics_policy(test_empty_db, policy, pages, time):
+    insert_statistics(123456789, pages=100)
+    insert_statistics(123456789, pages=200, time=1.5, policy=policy)
+    book = get_book(123456789)
+    assert (book.pages, book.time) == (pages, time)
+
+
+def test_insert_book_unknown_policy(test_empty_db):
+    with pytest.raises(ValueError):
+        insert_book(123456789, None, None, "Title", "replace")
+    with pytest.raises(ValueError):
+        insert_statistics(123456789, policy="replace")
+
+
+def test_insert_book_statements(test_empty_db):
+    statements = []
+    event.listen(test_empty_db, "before_cursor_execute",
+                 lambda *args: statements.append(args[2]))
+    insert_book(123456789, None, None, "Title")
+    insert_statistics(123456789, pages=100)
+    assert statements.__len__() == 2
+
+
 @pytest.mark.parametrize("isbn, series_id, series_index, title", [(123456789, 1, 1, "Test Title")])
 def test_get_book_isbn(test_empty_db, isbn, series_id, series_index, title):
     assert get_book_isbn(isbn) == None
@@ -90,9 +124,102 @@ def test_update_book_title(test_empty_db, isbn, series_id, series_index, old_tit
     assert get_book_title(isbn) == new_title
 
 
+@pytest.mark.parametrize("isbn, author, series, title, time", [(9780593135204, "Andy Weir", "Project Hail Mary", "Project Hail Mary", 15.06), ("9780593135204", "Andy Weir", "Project Hail Mary", "Project Hail Mary", 15.06), (1234, None, None, None, None)])
+def test_get_book(test_db, isbn, author, series, title, time):
+    book = get_book(isbn)
+    if title == None:
+        assert book == None
+    else:
+        assert book.isbn == int(isbn)
+        assert book.author_name == author
+        assert book.series_name == series
+        assert book.title == title
+        assert book.time == time
+
+
+@pytest.mark.parametrize("isbn", [(123456789)])
+def test_get_book_statistics_only(test_empty_db, isbn):
+    insert_statistics(isbn, pages=100)
+    book = get_book(isbn)
+    assert book.isbn == isbn
+    assert book.pages == 100
+    assert book.title == None
+
+
+@pytest.mark.parametrize("isbn, new_isbn", [(9780593135204, 1234567890)])
+def test_update_book_fields(test_db, isbn, new_isbn):
+    update_book_fields(isbn, isbn=new_isbn, title="New Title", series_name="New Series",
+                       author_name="New Author", pages=1, time=2.5)
+    assert get_book(isbn) == None
+    book = get_book(new_isbn)
+    assert (book.title, book.series_name, book.author_name,
+            book.pages, book.time) == ("New Title", "New Series", "New Author", 1, 2.5)
+    assert book.chapters == 30
+
+
+@pytest.mark.parametrize("isbn, used_isbn", [(9780593135204, 9780553448122)])
+def test_update_book_fields_isbn_in_use(test_db, isbn, used_isbn):
+    assert update_book_fields(isbn, isbn=used_isbn, time=1.0) == ["isbn"]
+    assert get_statistics_time(isbn) == 1.0
+    assert get_book(used_isbn).title == "Artemis"
+
+
+@pytest.mark.parametrize("changes", [({"unknown": 1}), ({"series_name": "Series"}), ({"author_name": "Author"})])
+def test_update_book_fields_errors(test_db, changes):
+    with pytest.raises((TypeError, ValueError)):
+        update_book_fields(9780593135204, **changes)
+
+
+def test_update_book_fields_query_count(test_db):
+    statements = []
+    event.listen(test_db, "before_cursor_execute",
+                 lambda *args: statements.append(args[2]))
+    get_book(9780593135204)
+    update_book_fields(9780593135204, chapters=1, pages=2,
+                       released="2000", finished="2001", speed=3, time=4.0)
+    assert statements.__len__() == 2
+
+
 @pytest.mark.parametrize("isbn, series_id, series_index, title", [(123456789, 5, 1.5, "Title")])
 def test_delete_book_isbn(test_empty_db, isbn, series_id, series_index, title):
     insert_book(isbn, series_id, series_index, title)
     assert get_book_isbn(isbn) != None
     delete_book_isbn(isbn)
     assert get_book_isbn(isbn) == None
+
+
+@pytest.mark.parametrize("query, titles",
+                         [("weir", ["The Martian", "Artemis", "Project Hail Mary"]),
+                          ("hail ma", ["Project Hail Mary"]),
+                          ("Mart", ["The Martian"]),
+                          ("9780553", ["Artemis"]),
+                          ("\"quoted", []),
+                          ("", []),
+                          ("unknown", [])])
+def test_search_books(test_db, query, titles):
+    assert sorted(b.title for b in search_books(query)) == sorted(titles)
+
+
+def test_search_books_ranking(test_db):
+    insert_author("Mary Shelley")
+    insert_series(get_author_id("Mary Shelley"), "Frankenstein")
+    insert_book(1234567890, get_series_id(
+        "Frankenstein", get_author_id("Mary Shelley")), 1, "Frankenstein")
+    assert search_books("mary")[0].title == "Project Hail Mary"
+    assert search_books("mary shelley")[0].title == "Frankenstein"
+
+
+def test_search_books_sync(test_db):
+    author_id = get_author_id("Andy Weir")
+    update_author_name(author_id, "Weir Andy")
+    assert search_books("andy weir").__len__() == 3
+    update_series_name(get_series_id("Artemis", author_id), "Moon City")
+    assert [b.title for b in search_books("moon")] == ["Artemis"]
+    delete_book_isbn(9780553448122)
+    assert search_books("moon") == []
+    assert update_book_fields(9780593135204, isbn=1234567890, title="Hail Mary") == []
+    assert [b.isbn for b in search_books("hail")] == [1234567890]
+    test_db.exec_driver_sql("delete from books_fts")
+    assert search_books("hail") == []
+    rebuild_search_index()
+    assert [b.isbn for b in search_books("hail")] == [1234567890]
@@ -0,0 +1,259 @@
+import asyncio
+import os
+import pytest
+import subprocess
+import sys
+import threading
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool, SingletonThreadPool
+from reading_statistics.Database import Database, create_database_engine
+from reading_statistics.Book import Book
+from reading_statistics.sqlite import create_tables, bulk_insert_books, insert_series, get_series_id, insert_author, get_author_id, update_author_name, get_max_author_id, get_connection, set_database_location
+
+
+@pytest.fixture(scope="function")
+def test_file_db(tmp_path):
+    db = Database
+    db.open(str(tmp_path / "database.db"))
+    with db.session():
+        create_tables()
+    yield db
+    db.dispose()
+
+
+@pytest.mark.parametrize("location, pool", [(":memory:", SingletonThreadPool), ("./database.db", QueuePool)])
+def test_create_database_engine(location, pool):
+    assert isinstance(create_database_engine(location).pool, pool)
+
+
+def test_connection_per_thread(test_file_db):
+    connections = []
+    thread = threading.Thread(
+        target=lambda: connections.append(test_file_db.connection))
+    thread.start()
+    thread.join()
+    assert connections[0] is not test_file_db.connection
+
+
+def test_session_commit(test_file_db):
+    with test_file_db.session() as connection:
+        assert test_file_db.connection is connection
+        insert_author("Test Name")
+        with test_file_db.session() as inner:
+            assert inner is connection
+    assert test_file_db.connection is not connection
+    assert get_author_id("Test Name") == 1
+
+
+def test_session_rollback(test_file_db):
+    with pytest.raises(RuntimeError):
+        with test_file_db.session():
+            insert_author("Test Name")
+            raise RuntimeError
+    assert get_author_id("Test Name") == None
+
+
+def test_session_concurrent_reader(test_file_db):
+    written = threading.Event()
+    read = threading.Event()
+
+    def writer():
+        with test_file_db.session():
+            insert_author("Test Name")
+            written.set()
+            read.wait(5)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    written.wait(5)
+    with test_file_db.session():
+        assert get_max_author_id() == 0
+    read.set()
+    thread.join()
+    with test_file_db.session():
+        assert get_max_author_id() == 1
+
+
+def test_bulk_insert_concurrent_writer(test_file_db):
+    def writer():
+        with test_file_db.session():
+            insert_series(insert_author("Author 2"), "Series 3")
+
+    def books():
+        for number in range(4):
+            if number == 2:
+                thread = threading.Thread(target=writer)
+                thread.start()
+                thread.join()
+            yield Book(f"Author {number}", f"Series {number}", number + 1, f"Title {number}", 1, 10, 100, None, None, None, None)
+        yield Book("Author 2", "Series 3", 5, "Title 4", 1, 10, 100, None, None, None, None)
+
+    assert bulk_insert_books(books(), 2, commit=True) == 5
+    test_file_db.commit()
+    assert [get_author_id(f"Author {number}") for number in range(4)] == [1, 2, 3, 4]
+    assert get_series_id("Series 3", 3) == 3
+    assert get_series_id("Series 2", 3) == 4
+    assert get_max_author_id() == 4
+
+
+def test_pragma_profile_on_connect(test_file_db):
+    connection = test_file_db.connection
+    assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+    assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+    assert connection.exec_driver_sql("PRAGMA temp_store").scalar() == 2
+    assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == 30000
+
+
+def test_pragma_profile_switch(test_file_db):
+    with test_file_db.pragma_profile("bulk_load") as connection:
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+        assert connection.exec_driver_sql("PRAGMA cache_size").scalar() == -262144
+    assert connection.exec_driver_sql("PRAGMA cache_size").scalar() == -65536
+    connection.commit()
+    with pytest.raises(RuntimeError):
+        with test_file_db.pragma_profile("bulk_load"):
+            insert_author("Test Name")
+            raise RuntimeError
+    assert connection.exec_driver_sql("PRAGMA cache_size").scalar() == -65536
+    assert get_author_id("Test Name") == None
+
+
+def test_import_does_not_connect(tmp_path):
+    location = tmp_path / "database.db"
+    subprocess.run([sys.executable, "-c", "import reading_statistics.sqlite as s; assert s.db._engine == None"],
+                   env={**os.environ, "PYTHONPATH": os.getcwd(), "READING_STATISTICS_DATABASE": str(location)},
+                   cwd=tmp_path, check=True)
+    assert not location.exists()
+
+
+def test_set_database_location(tmp_path):
+    first = tmp_path / "first.db"
+    second = tmp_path / "second.db"
+    set_database_location(str(first))
+    assert not first.exists()
+    get_connection().exec_driver_sql("create table t (x)")
+    set_database_location(str(second))
+    assert get_connection().exec_driver_sql(
+        "select count(*) from sqlite_master").scalar() == 0
+    assert first.exists() and second.exists()
+    Database.dispose()
+
+
+def test_transaction_savepoint(test_file_db):
+    with test_file_db.transaction():
+        insert_author("Kept")
+        with pytest.raises(RuntimeError):
+            with test_file_db.transaction():
+                insert_author("Discarded")
+                raise RuntimeError
+        test_file_db.commit()
+        assert get_author_id("Discarded") == None
+    assert get_author_id("Kept") == 1
+
+
+def test_transaction_rollback(test_file_db):
+    with pytest.raises(RuntimeError):
+        with test_file_db.transaction():
+            insert_author("Test Name")
+            test_file_db.commit()
+            raise RuntimeError
+    assert get_author_id("Test Name") == None
+    assert not test_file_db.in_transaction()
+
+
+def test_transaction_single_commit(test_file_db):
+    commits = []
+    event.listen(test_file_db.connection, "commit",
+                 lambda *args: commits.append(args))
+    with test_file_db.transaction():
+        for i in range(1000):
+            with test_file_db.transaction():
+                insert_author(f"Author {i}")
+            test_file_db.commit()
+    assert commits.__len__() == 1
+    assert get_max_author_id() == 1000
+
+
+def test_commit_hooks(test_file_db, monkeypatch):
+    calls = []
+    monkeypatch.setattr(test_file_db, "commit_hooks",
+                        [lambda: calls.append(test_file_db.in_transaction())])
+    with test_file_db.transaction():
+        with test_file_db.transaction():
+            insert_author("Nested")
+        test_file_db.commit()
+    assert calls == [True]
+    insert_author("Plain")
+    test_file_db.commit()
+    assert calls.__len__() == 2
+    with test_file_db.deferred_commit_hooks():
+        for i in range(10):
+            insert_author(f"Author {i}")
+            test_file_db.commit()
+    assert calls.__len__() == 3
+    assert get_max_author_id() == 12
+
+
+def test_connection_per_task(test_file_db):
+    parent = test_file_db.connection
+
+    async def task_connection():
+        connection = test_file_db.connection
+        await asyncio.sleep(0)
+        assert test_file_db.connection is connection
+        return connection
+
+    async def run():
+        return await asyncio.gather(task_connection(), task_connection())
+
+    first, second = asyncio.run(run())
+    assert first is not parent and second is not parent and first is not second
+    assert first.closed and second.closed
+    assert test_file_db.connection is parent
+
+
+def test_identity_cache_published_on_commit(test_file_db):
+    with test_file_db.transaction():
+        author_id = insert_author("Pending")
+        assert get_author_id("Pending") == author_id
+        assert "Pending" not in test_file_db.authors_cache.entries
+    assert test_file_db.authors_cache.entries["Pending"] == author_id
+    with pytest.raises(RuntimeError):
+        with test_file_db.transaction():
+            insert_author("Rolled back")
+            raise RuntimeError
+    assert "Rolled back" not in test_file_db.authors_cache.entries
+    assert get_author_id("Rolled back") == None
+
+
+def test_identity_cache_invalidated_on_commit(test_file_db):
+    author_id = insert_author("Renamed")
+    test_file_db.commit()
+    with test_file_db.transaction():
+        update_author_name(author_id, "New name")
+        # Another connection caches the committed name before the rename commits
+        test_file_db.authors_cache.entries["Renamed"] = author_id
+    assert "Renamed" not in test_file_db.authors_cache.entries
+    assert get_author_id("Renamed") == None
+
+
+def test_identity_cache_savepoint_rollback(test_file_db):
+    shared = insert_author("Shared")
+    test_file_db.commit()
+    get_author_id("Shared")
+    with test_file_db.transaction():
+        kept = insert_author("Kept")
+        renamed = insert_author("Renamed")
+        test_file_db.commit()
+        update_author_name(renamed, "New name")
+        with pytest.raises(RuntimeError):
+            with test_file_db.transaction():
+                insert_author("Rolled back")
+                with test_file_db.transaction():
+                    insert_author("Released")
+                raise RuntimeError
+        assert test_file_db.authors_cache.entries == {"Shared": shared}
+        # Another connection caches the committed name before the rename commits
+        test_file_db.authors_cache.entries["Renamed"] = renamed
+    assert test_file_db.authors_cache.entries == {"Shared": shared, "Kept": kept}
+    assert get_author_id("Rolled back") == None
@@ -1,14 +1,13 @@
 import pytest
-from sqlalchemy import create_engine, text
-from reading_statistics.Database import Database
+from reading_statistics.Database import Database, create_database_engine
 from reading_statistics.sqlite import create_tables, load_library_from_json
 
 
 @pytest.fixture(scope="function")
 def test_no_db():
     db = Database
-    db.location = "sqlite+pysqlite:///:memory:"
-    db.engine = create_engine(db.location)
+    db.location = ":memory:"
+    db.engine = create_database_engine(db.location)
     db.connection = db.engine.connect()
     yield db.connection
     db.close()
@@ -17,10 +16,11 @@ def test_no_db():
 @pytest.fixture(scope="function")
 def test_empty_db():
     db = Database
-    db.location = "sqlite+pysqlite:///:memory:"
-    db.engine = create_engine(db.location)
+    db.location = ":memory:"
+    db.engine = create_database_engine(db.location)
     db.connection = db.engine.connect()
     create_tables()
+    db.commit()
     yield db.connection
     db.close()
 
@@ -28,8 +28,8 @@ def test_empty_db():
 @pytest.fixture(scope="function")
 def test_db():
     db = Database
-    db.location = "sqlite+pysqlite:///:memory:"
-    db.engine = create_engine(db.location)
+    db.location = ":memory:"
+    db.engine = create_database_engine(db.location)
     db.connection = db.engine.connect()
     create_tables()
     load_library_from_json("./tests/test_library.json")
@@ -0,0 +1,27 @@
+from reading_statistics.IdentityCache import IdentityCache
+
+
+def test_identity_cache_eviction():
+    cache = IdentityCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") == None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.info() == (3, 1, 2, 2)
+
+
+def test_identity_cache_invalidate():
+    cache = IdentityCache(10)
+    cache.put(("Series", 1), 5)
+    cache.put(("Other", 2), 6)
+    cache.put("missing", None)
+    cache.invalidate(5)
+    assert cache.get(("Series", 1)) == None
+    cache.invalidate_where(lambda key: key[1] == 2)
+    assert cache.get(("Other", 2)) == None
+    assert cache.info().currsize == 0
+    cache.clear()
+    assert cache.info() == (0, 0, 10, 0)
@@ -0,0 +1,176 @@
+import datetime
+import io
+import json
+import pytest
+from reading_statistics.library_io import JsonStream, iter_books_from_file, iter_books_parallel, iter_shards, book_row, parse_shard, library_format, write_books, normalize_date
+
+
+@pytest.mark.parametrize("read_size", [(1), (7), (65536)])
+def test_json_stream_iter_array(read_size):
+    document = {"description": {"nested": [1, 2, {"books": []}]},
+                "books": [{"isbn": 1234567890}, 12345, "text", [1.5, None], {}],
+                "after": True}
+    stream = JsonStream(io.StringIO(json.dumps(document, indent=2)), read_size)
+    assert list(stream.iter_array("books")) == document["books"]
+
+
+@pytest.mark.parametrize("document", [('{}'), ('{"views": []}'), ('{"books": []}')])
+def test_json_stream_iter_array_empty(document):
+    assert list(JsonStream(io.StringIO(document)).iter_array("books")) == []
+
+
+@pytest.mark.parametrize("document", [('{"books": [{"isbn": 1}'), ('{"books": [1 2]}'), ('["books"]')])
+def test_json_stream_iter_array_errors(document):
+    with pytest.raises(json.JSONDecodeError):
+        list(JsonStream(io.StringIO(document), 4).iter_array("books"))
+
+
+def test_iter_books_from_file_json():
+    with open("./tests/test_library.json", "r") as file:
+        expected = json.load(file)["books"]
+    books = list(iter_books_from_file("./tests/test_library.json"))
+    assert [b.isbn for b in books] == [b["isbn"] for b in expected]
+    assert books[2].time == expected[2]["time"]
+
+
+def write_json_lines(path, books):
+    path.write_text("".join(json.dumps(b) + "\n" for b in books))
+    return str(path)
+
+
+def test_book_row():
+    with open("./tests/test_library.json", "r") as file:
+        book = json.load(file)["books"][0]
+    book["pages"] = str(book["pages"])
+    row = book_row(book)
+    assert row[2] == book["isbn"]
+    assert row[6] == int(book["pages"])
+    with pytest.raises(ValueError):
+        book_row(dict(book, title=12))
+    with pytest.raises(KeyError):
+        book_row({"isbn": 1})
+
+
+def test_parse_shard_errors():
+    good = json.dumps({"author_name": "A", "series_name": None, "isbn": 1, "title": "T", "series_index": 1,
+                       "chapters": None, "pages": None, "released": None, "finished": None, "speed": None, "time": None})
+    rows, errors = parse_shard(("lines", "books.jsonl", 10, [good + "\n", "\n", "{\"isbn\": 2}\n", "not json\n"]))
+    assert rows == [("A", None, 1, "T", 1.0, None, None, None, None, None, None)]
+    assert [e.split(":")[1] for e in errors] == ["12", "13"]
+
+
+@pytest.mark.parametrize("shard_lines", [(1), (2), (1000)])
+def test_iter_books_parallel(tmp_path, shard_lines):
+    with open("./tests/test_library.json", "r") as file:
+        expected = json.load(file)["books"]
+    location = write_json_lines(tmp_path / "books.jsonl", expected + [{"isbn": "x"}])
+    errors = []
+    books = list(iter_books_parallel(
+        [location, "./tests/test_library.json"], 2, errors, shard_lines))
+    assert [b.isbn for b in books] == [b["isbn"] for b in expected] * 2
+    assert books == list(iter_books_from_file("./tests/test_library.json")) * 2
+    assert errors.__len__() == 1 and errors[0].startswith(f"{location}:6:")
+
+
+def test_json_stream_iter_array_raw():
+    document = '{"books": [ {"isbn": 1} , 12345,"a]"]}'
+    assert list(JsonStream(io.StringIO(document), 3).iter_array("books", raw=True)) == [
+        '{"isbn": 1}', "12345", '"a]"']
+
+
+def test_iter_shards_json():
+    shards = list(iter_shards(["./tests/test_library.json"], 2))
+    assert [(shard[0], shard[2], shard[3].__len__()) for shard in shards] == [
+        ("elements", 0, 2), ("elements", 2, 2), ("elements", 4, 1)]
+
+
+@pytest.mark.parametrize("name", [("books.json"), ("books.jsonl"), ("books.csv")])
+def test_iter_books_from_file_validation(tmp_path, name):
+    with open("./tests/test_library.json", "r") as file:
+        expected = json.load(file)["books"]
+    location = str(tmp_path / name)
+    write_books(iter_books_from_file("./tests/test_library.json"), location)
+    with open(location, "r") as file:
+        text = file.read()
+    # Every format writes the pages of the first book the same way, as a bare number
+    text = text.replace("384", '"many"' if name != "books.csv" else "many", 1)
+    with open(location, "w") as file:
+        file.write(text)
+    with pytest.raises(ValueError):
+        list(iter_books_from_file(location))
+    errors = []
+    books = list(iter_books_from_file(location, errors))
+    parallel_errors = []
+    assert list(iter_books_parallel([location], 1, parallel_errors, 2)) == books
+    assert [b.isbn for b in books] == [b["isbn"] for b in expected[1:]]
+    assert errors == parallel_errors and errors.__len__() == 1
+
+
+def test_iter_books_from_file(tmp_path):
+    expected = list(iter_books_from_file("./tests/test_library.json"))
+    location = write_json_lines(
+        tmp_path / "books.ndjson", [b.__dict__ for b in expected])
+    assert list(iter_books_from_file(location)) == expected
+
+
+@pytest.mark.parametrize("location,expected", [("a.json", ("json", None)), ("a.JSONL", ("jsonl", None)), ("a.ndjson.gz", ("jsonl", "gzip")),
+                                               ("dir.csv/a.csv.zst", ("csv", "zstd"))])
+def test_library_format(location, expected):
+    assert library_format(location) == expected
+
+
+@pytest.mark.parametrize("location", [("a.txt"), ("a.gz"), ("a.json.bz2")])
+def test_library_format_unknown(location):
+    with pytest.raises(ValueError):
+        library_format(location)
+
+
+@pytest.mark.parametrize("name", [("books.json"), ("books.jsonl"), ("books.csv"), ("books.json.gz"), ("books.jsonl.gz"), ("books.csv.gz")])
+def test_write_books_round_trip(tmp_path, name):
+    expected = list(iter_books_from_file("./tests/test_library.json"))
+    location = str(tmp_path / name)
+    assert write_books(expected, location) == expected.__len__()
+    assert list(iter_books_from_file(location)) == expected
+    assert list(iter_books_parallel([location], 1, None, 2)) == expected
+
+
+@pytest.mark.parametrize("name", [("books.jsonl"), ("books.csv"), ("books.csv.gz")])
+def test_write_books_append(tmp_path, name):
+    expected = list(iter_books_from_file("./tests/test_library.json"))
+    location = str(tmp_path / name)
+    write_books(expected[:2], location, append=True)
+    write_books(expected[2:], location, append=True)
+    assert list(iter_books_from_file(location)) == expected
+
+
+def test_write_books_append_json(tmp_path):
+    with pytest.raises(ValueError):
+        write_books([], str(tmp_path / "books.json"), append=True)
+
+
+def test_csv_rows(tmp_path):
+    location = tmp_path / "books.csv"
+    location.write_text('isbn,author_name,series_name,title,series_index,chapters,pages,released,finished,speed,time\n'
+                        '1,A,,"Two\nlines, comma",1,,,,,,2.5\n'
+                        'x,B,,,,,,,,,\n')
+    errors = []
+    books = list(iter_books_parallel([str(location)], 1, errors))
+    assert [(b.isbn, b.author_name, b.series_name, b.title, b.series_index, b.time) for b in books] == [
+        (1, "A", None, "Two\nlines, comma", 1.0, 2.5)]
+    assert errors.__len__() == 1 and errors[0].startswith(f"{location}:4:")
+
+
+@pytest.mark.parametrize("name", [("books.jsonl.zst"), ("books.csv.zst")])
+def test_write_books_zstd(tmp_path, name):
+    pytest.importorskip("zstandard")
+    expected = list(iter_books_from_file("./tests/test_library.json"))
+    location = str(tmp_path / name)
+    write_books(expected, location)
+    assert list(iter_books_from_file(location)) == expected
+
+
+@pytest.mark.parametrize("value,expected", [("2023-06-20", "2023-06-20"), ("2023-06-20 21:15:00", "2023-06-20"), ("20230620", "2023-06-20"),
+                                            ("2023/06/20", "2023-06-20"), ("20.06.2023", "2023-06-20"), (datetime.date(2023, 6, 20), "2023-06-20"),
+                                            ("20XX", "20XX"), ("", ""), (None, None), ("2023-02-30", "2023-02-30")])
+def test_normalize_date(value, expected):
+    assert normalize_date(value) == expected
@@ -0,0 +1,236 @@
+import json
+import time
+import pytest
+from .test_fixtures import test_no_db, test_empty_db, test_db
+from reading_statistics.batch import main
+from reading_statistics.constants import VIEWS_LOCATION, REFRESH_MANUAL, REFRESH_ON_COMMIT, REFRESH_TIMER, MATERIALIZED_SOURCE_SUFFIX
+from reading_statistics.Database import Database, create_database_engine
+from reading_statistics.sqlite import create_tables, start_view_refresher, insert_author, update_author_name, get_author_id, create_views, ViewsSummary, load_view_definitions, get_materialized_views, refresh_materialized_views, refresh_due_views, refresh_on_commit, load_library_from_json, verify_schema, update_statistics_pages, insert_statistics, delete_statistics_isbn
+
+db = Database
+YEARS = "Statistics [read] by Year"
+COMPARISON = "Time taken vs Historical estimates Comparison"
+
+
+def write_views(path, views):
+    path.write_text(json.dumps({"views": views}))
+    return str(path)
+
+
+def report_views(path, years=REFRESH_TIMER):
+    with open(VIEWS_LOCATION, "r") as file:
+        views = json.load(file)["views"]
+    for view in views:
+        if "by Year" in view["view"]:
+            view["materialized"] = years
+        elif COMPARISON in view["view"]:
+            view.update(materialized=REFRESH_TIMER, interval=3600)
+    return write_views(path, views)
+
+
+def object_type(connection, name):
+    return connection.exec_driver_sql("select type from sqlite_master where name = ?", (name,)).scalar()
+
+
+def rows(connection, name):
+    return connection.exec_driver_sql(f'select * from "{name}"').all()
+
+
+def assert_fresh(connection, name):
+    assert rows(connection, name) == rows(
+        connection, name + MATERIALIZED_SOURCE_SUFFIX)
+
+
+def staleness():
+    return {view.name: view.stale for view in get_materialized_views()}
+
+
+def test_shipped_views_not_materialized(test_db):
+    create_views(VIEWS_LOCATION)
+    assert get_materialized_views() == []
+    assert object_type(test_db, YEARS) == "view"
+
+
+def test_create_materialized_views(test_db, tmp_path):
+    assert create_views(report_views(tmp_path / "views.json")) == ViewsSummary(6, 0, 0, 0)
+    views = {view.name: view for view in get_materialized_views()}
+    assert set(views) == {YEARS, "Statistics [unread] by Year", COMPARISON}
+    for name in views:
+        assert (views[name].refresh, views[name].interval) == (REFRESH_TIMER, 3600)
+    for name in views:
+        assert object_type(test_db, name) == "table"
+        assert not views[name].stale
+        assert_fresh(test_db, name)
+    assert object_type(test_db, "All Info") == "view"
+    assert verify_schema() == []
+
+
+def test_materialized_view_tables(test_db, tmp_path):
+    create_views(report_views(tmp_path / "views.json"))
+    tables = test_db.exec_driver_sql(
+        "select name, table_name from materialized_view_tables").all()
+    assert set(table for name, table in tables if name == YEARS) == {"statistics"}
+    assert set(table for name, table in tables if name == COMPARISON) == {
+        "authors", "series", "books", "statistics"}
+
+
+def test_staleness_follows_read_tables(test_db, tmp_path):
+    create_views(write_views(tmp_path / "views.json", [
+        {"view": "create view Pages as select sum(pages) as pages from statistics", "materialized": True},
+        {"view": "create view Titles as select title from books", "materialized": True},
+        {"view": "create view Names as select Titles.title from Titles", "materialized": True},
+        {"view": "create view Years as select year from rollup_years", "materialized": True}]))
+    update_author_name(get_author_id("Andy Weir"), "Andrew Weir")
+    assert not any(staleness().values())
+    update_statistics_pages(9780593135204, 476)
+    db.clear_caches()
+    insert_author("Andrew Weir")
+    assert not any(staleness().values())
+    update_statistics_pages(9780593135204, 500)
+    assert staleness() == {"Pages": True, "Titles": False,
+                           "Names": False, "Years": True}
+    test_db.exec_driver_sql(
+        "update books set title = 'Hail Mary' where isbn = 9780593135204")
+    assert staleness() == {"Pages": True, "Titles": True,
+                           "Names": True, "Years": True}
+
+
+def test_staleness_and_refresh_on_commit(test_db, tmp_path):
+    create_views(report_views(tmp_path / "views.json", REFRESH_ON_COMMIT))
+    update_statistics_pages(9780593135204, 500)
+    assert all(staleness().values())
+    db.commit()
+    assert staleness() == {YEARS: False,
+                           "Statistics [unread] by Year": False, COMPARISON: True}
+    assert_fresh(test_db, YEARS)
+    with db.transaction():
+        insert_statistics(1234567890, 10, 100, "2020-01-01", "2024-02-03")
+        delete_statistics_isbn(9780553448122)
+    assert not staleness()[YEARS]
+    assert_fresh(test_db, YEARS)
+
+
+def test_refresh_on_commit_registered_when_needed(test_db, tmp_path):
+    create_views(VIEWS_LOCATION)
+    assert refresh_on_commit not in db.commit_hooks
+    create_views(report_views(tmp_path / "views.json", REFRESH_ON_COMMIT))
+    assert refresh_on_commit in db.commit_hooks
+    create_views(report_views(tmp_path / "views.json"))
+    assert refresh_on_commit not in db.commit_hooks
+    create_views(report_views(tmp_path / "views.json", REFRESH_ON_COMMIT))
+    db.engine = create_database_engine(":memory:")
+    assert refresh_on_commit not in db.commit_hooks
+
+
+def test_redefined_dependency_refreshes_view(test_db, tmp_path):
+    total = {"view": "create view Total as select sum(pages) as pages from Base", "materialized": True}
+    create_views(write_views(tmp_path / "views.json", [
+        {"view": "create view Base as select pages from statistics"}, total]))
+    assert create_views(write_views(tmp_path / "views.json", [
+        {"view": "create view Base as select pages * 2 as pages from statistics"}, total])) == ViewsSummary(0, 1, 0, 1)
+    assert rows(test_db, "Total") == [(2 * (384 + 305 + 476),)]
+    assert staleness() == {"Total": False}
+
+
+def test_start_view_refresher(tmp_path):
+    db.open(str(tmp_path / "database.db"))
+    try:
+        create_tables()
+        load_library_from_json("./tests/test_library.json")
+        create_views(write_views(tmp_path / "views.json", [
+            {"view": "create view Pages as select sum(pages) as pages from statistics", "materialized": REFRESH_TIMER, "interval": 0}]))
+        update_statistics_pages(9780593135204, 500)
+        db.commit()
+        assert staleness() == {"Pages": True}
+        stop = start_view_refresher(0.01)
+        deadline = time.time() + 5
+        while staleness()["Pages"] and time.time() < deadline:
+            time.sleep(0.01)
+        stop.set()
+        assert rows(db.connection, "Pages") == [(384 + 305 + 500,)]
+    finally:
+        db.dispose()
+
+
+def test_refresh_due_views(test_db, tmp_path):
+    create_views(report_views(tmp_path / "views.json"))
+    assert refresh_due_views(time.time() + 7200) == 0
+    update_statistics_pages(9780593135204, 500)
+    db.commit()
+    assert refresh_due_views() == 0
+    assert refresh_due_views(time.time() + 3600) == 3
+    assert not staleness()[COMPARISON]
+    assert_fresh(test_db, COMPARISON)
+
+
+def test_refresh_materialized_views(test_db, tmp_path):
+    location = write_views(tmp_path / "views.json", [
+        {"view": "create view Pages as select sum(pages) as pages from statistics", "materialized": True}])
+    create_views(location)
+    update_statistics_pages(9780593135204, 500)
+    db.commit()
+    assert get_materialized_views()[0].refresh == REFRESH_MANUAL
+    assert staleness() == {"Pages": True}
+    assert rows(test_db, "Pages") == [(384 + 305 + 476,)]
+    assert refresh_materialized_views(["Pages"]) == 1
+    assert rows(test_db, "Pages") == [(384 + 305 + 500,)]
+    assert staleness() == {"Pages": False}
+    assert main(["refresh-views"]) == 0
+    with pytest.raises(ValueError):
+        refresh_materialized_views(["Missing"])
+
+
+def test_materialized_views_redeploy(test_empty_db, tmp_path):
+    plain = {"view": "create view Titles as select title from books"}
+    location = write_views(tmp_path / "views.json", [plain])
+    assert create_views(location) == ViewsSummary(1, 0, 0, 0)
+    location = write_views(tmp_path / "views.json",
+                           [dict(plain, materialized=REFRESH_TIMER, interval=60)])
+    assert create_views(location) == ViewsSummary(0, 1, 0, 0)
+    assert object_type(test_empty_db, "Titles") == "table"
+    assert create_views(location) == ViewsSummary(0, 0, 0, 1)
+    assert get_materialized_views()[0].interval == 60
+    test_empty_db.exec_driver_sql('drop view "Titles [query]"')
+    assert create_views(location) == ViewsSummary(0, 1, 0, 0)
+    location = write_views(tmp_path / "views.json", [plain])
+    assert create_views(location) == ViewsSummary(0, 1, 0, 0)
+    assert object_type(test_empty_db, "Titles") == "view"
+    assert object_type(test_empty_db, "Titles [query]") == None
+    assert get_materialized_views() == []
+    location = write_views(tmp_path / "views.json",
+                           [dict(plain, materialized=REFRESH_ON_COMMIT)])
+    create_views(location)
+    assert create_views(write_views(tmp_path / "views.json", [])) == ViewsSummary(0, 0, 1, 0)
+    assert object_type(test_empty_db, "Titles") == None
+    assert get_materialized_views() == []
+
+
+def test_load_refreshes_once(test_empty_db, monkeypatch, tmp_path):
+    create_views(report_views(tmp_path / "views.json", REFRESH_ON_COMMIT))
+    refreshed = []
+    monkeypatch.setattr(db, "commit_hooks", [
+                        lambda: refreshed.append(1) or refresh_on_commit()])
+    load_library_from_json("./tests/test_library.json")
+    assert refreshed.__len__() == 1
+    assert not staleness()[YEARS]
+    assert_fresh(test_empty_db, YEARS)
+
+
+def test_load_view_definitions_materialized(tmp_path):
+    location = write_views(tmp_path / "views.json", [
+        {"view": "create view a as select 1"},
+        {"view": "create view b as select 1", "materialized": REFRESH_TIMER}])
+    plain, timer = load_view_definitions(location)
+    assert (plain.materialized, plain.interval) == (None, None)
+    assert (timer.materialized, timer.interval) == (REFRESH_TIMER, 3600)
+    assert plain.hash != timer.hash
+    with pytest.raises(ValueError):
+        load_view_definitions(write_views(tmp_path / "views.json", [
+            {"view": "create view a as select 1", "materialized": "hourly"}]))
+
+
+def test_verify_schema_missing_table(test_db, tmp_path):
+    create_views(report_views(tmp_path / "views.json"))
+    test_db.exec_driver_sql(f'drop table "{YEARS}"')
+    assert verify_schema() == [
+        f"Materialized view {YEARS} is missing its table or query, create the views again"]
@@ -1,8 +1,8 @@
 import pytest
 from .test_fixtures import test_no_db, test_empty_db, test_db
 from reading_statistics.constants import LIBRARY_LOCATION, VIEWS_LOCATION
-from reading_statistics.sqlite import check_tables, get_max_author_id, get_author_id, get_series_id, get_book_isbn, get_author_name, get_series_name, get_series_author_id, get_book_series_id, get_statistics_time, get_authors_number_of_series, get_series_number_of_books, insert_book
-from reading_statistics.reading_statistics import database_setup, load_json, views_setup, add_a_book, get_books, update_author, update_series, update_book, update_statistics, delete_author, delete_series, delete_book, delete_statistics
+from reading_statistics.sqlite import check_tables, get_max_author_id, get_author_id, get_series_id, get_book_isbn, get_author_name, get_series_name, get_series_author_id, get_book_series_id, get_statistics_time, get_authors_number_of_series, get_series_number_of_books, insert_book, insert_author, insert_series
+from reading_statistics.reading_statistics import database_verification, search_library, database_setup, load_json, views_setup, add_a_book, get_books, update_author, update_series, update_book, update_statistics, delete_author, delete_series, delete_book, delete_statistics
 
 
 def test_load_json_error(test_no_db, capfd):
@@ -119,6 +119,19 @@ def test_database_setup(test_no_db):
                         "statistics"]).__len__() == 0
 
 
+def test_database_verification(test_db, capfd):
+    database_verification()
+    out = capfd.readouterr()
+    assert out[0] == "\nDatabase verified, no problems found\n\n"
+
+
+def test_database_verification_errors(test_no_db, capfd):
+    database_verification()
+    out = capfd.readouterr()
+    assert out[0].startswith(
+        "\nProblems found:\n\tTable authors does not exist\n")
+
+
 @pytest.mark.parametrize("library", [LIBRARY_LOCATION, "./tests/test_library.json"])
 def test_load_json(test_empty_db, library):
     assert get_max_author_id() == 0
@@ -194,6 +207,16 @@ def test_add_a_book(test_empty_db, monkeypatch, capfd, isbn, title, series, inde
         assert out[0].endswith(f"{ending}\n")
 
 
+def test_add_a_book_rolled_back(test_empty_db, monkeypatch, capfd):
+    responses = iter(["1234", "Title", "Series", "1", "Author", "many"] + [""] * 16)
+    monkeypatch.setattr("builtins.input", lambda _: next(responses))
+    add_a_book()
+    out = capfd.readouterr()
+    assert out[0].startswith("\nUnable to convert some inputs to number")
+    assert get_author_id("Author") == None
+    assert check_tables(["authors", "series", "books", "statistics"]) == []
+
+
 @pytest.mark.parametrize("isbn, author, series, title, output",
                          [(1234, "", "", "", "\nNo books found"),
                           (9780804139021, "", "", "", "\nFound 1 book(s):"),
@@ -223,6 +246,49 @@ def test_get_books(test_db, monkeypatch, capfd, isbn, author, series, title, out
         assert out[0].__contains__(f"{ending}")
 
 
+@pytest.mark.parametrize("page_size, counted", [(50, []), (2, [1])])
+def test_get_books_counts_only_past_first_page(test_db, monkeypatch, capfd, page_size, counted):
+    responses = iter(["", "Weir", "", ""])
+    monkeypatch.setattr("builtins.input", lambda _: next(responses))
+    monkeypatch.setattr(
+        "reading_statistics.reading_statistics.BOOKS_PAGE_SIZE", page_size)
+    calls = []
+    monkeypatch.setattr("reading_statistics.reading_statistics.count_books_info",
+                        lambda *args: calls.append(1) or 3)
+    get_books()
+    out = capfd.readouterr()
+    assert out[0].startswith("\nFound 3 book(s):")
+    assert out[0].count("\tBook #") == 3
+    assert calls == counted
+
+
+@pytest.mark.parametrize("query, output",
+                         [("weir", "\nFound 3 book(s):"),
+                          ("hail mary", "\nFound 1 book(s):"),
+                          ("unknown", "\nNo books found"),
+                          ("", "\nInput was empty")])
+def test_search_library(test_db, monkeypatch, capfd, query, output):
+    responses = iter([query])
+    monkeypatch.setattr("builtins.input", lambda _: next(responses))
+    try:
+        search_library()
+    except StopIteration:
+        ending = "try again.\n"
+    else:
+        ending = "cancelling.\n" if query == "" else "Time:\t\t"
+    finally:
+        out = capfd.readouterr()
+        print(out[0])
+        assert out[0].startswith(output)
+        assert out[0].__contains__(ending)
+
+
+def test_search_library_error(test_no_db, capfd):
+    search_library()
+    out = capfd.readouterr()
+    assert out[0].startswith("\nAt least one table is corrupted.")
+
+
 @pytest.mark.parametrize("author_old, author_new, output",
                          [("Andy Weir", "Weir Andy", "\nName has been changed"),
                           ("Andy Weir", "", "\nProvided new name"),
@@ -291,6 +357,22 @@ def test_update_series(test_db, monkeypatch, capfd, old_series, old_author, new_
         assert out[0].endswith(f"{ending}\n")
 
 
+@pytest.mark.parametrize("old_series, old_author, new_series, new_author, output",
+                         [("Artemis", "Andy Weir", "", "Other Author",
+                           "\nSeries \"Artemis\" written by \"Other Author\" already exists"),
+                          ("The Martian", "Andy Weir", "Artemis", "",
+                           "\nSeries \"Artemis\" written by \"Andy Weir\" already exists")])
+def test_update_series_conflict(test_db, monkeypatch, capfd, old_series, old_author, new_series, new_author, output):
+    insert_series(insert_author("Other Author"), "Artemis")
+    responses = iter([old_series, old_author, new_series, new_author])
+    monkeypatch.setattr("builtins.input", lambda _: next(responses))
+    with pytest.raises(StopIteration):
+        update_series()
+    out = capfd.readouterr()
+    assert out[0].startswith(output)
+    assert get_series_id(old_series, get_author_id(old_author)) != None
+
+
 @pytest.mark.parametrize("old_isbn, new_isbn, title, series_name, series_index, author_name, output",
                          [(9780804139021, 1234567890, "Martian", "Martian", 10, "Weir Andy",  "\n\tUpdated data to:\nISBN:\t\t"), (9780804139021, "", "Martian", "Martian", 10, "Weir Andy",  "\n\tUpdated data to:\nISBN:\t\t"),
                           (9780804139021, "", "", "", "", "",
@@ -321,6 +403,27 @@ def test_update_book(test_db, monkeypatch, capfd, old_isbn, new_isbn, title, ser
         assert out[0].endswith(f"{ending}\n")
 
 
+@pytest.mark.parametrize("old_isbn, used_isbn", [(9780804139021, 9780553448122)])
+def test_update_book_isbn_in_use(test_db, monkeypatch, capfd, old_isbn, used_isbn):
+    responses = iter([old_isbn, used_isbn, "Martian", "", "", ""])
+    monkeypatch.setattr("builtins.input", lambda _: next(responses))
+    update_book()
+    out = capfd.readouterr()[0]
+    assert f"\nISBN {used_isbn} is already used by another book, kept {old_isbn}.\n" in out
+    assert f"\n\tUpdated data to:\nISBN:\t\t{old_isbn}\nTitle:\t\tMartian\n" in out
+
+
+@pytest.mark.parametrize("old_isbn, used_isbn", [(9780804139021, 9780553448122)])
+def test_update_statistics_isbn_in_use(test_db, monkeypatch, capfd, old_isbn, used_isbn):
+    responses = iter([old_isbn, used_isbn, "", "", "", "", "", "16"])
+    monkeypatch.setattr("builtins.input", lambda _: next(responses))
+    update_statistics()
+    out = capfd.readouterr()[0]
+    assert f"\nISBN {used_isbn} is already used by another book, kept {old_isbn}.\n" in out
+    assert f"\n\tUpdated data to:\nISBN:\t\t{old_isbn}\n" in out
+    assert get_statistics_time(old_isbn) == 16
+
+
 @pytest.mark.parametrize("old_isbn, new_isbn, chapters, pages, released, finished, speed, time, output",
                          [(9780804139021, 1234567890, 33, 404, "2020-20-20", "2012-12-12", 128, 9.54, "\n\tUpdated data to:\nISBN:\t\t"),
                           ("9780804139021", "1234567890", "33", "404", "2020-20-20",
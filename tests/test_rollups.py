@@ -0,0 +1,101 @@
+import pytest
+from .test_fixtures import test_no_db, test_empty_db, test_db
+from reading_statistics.constants import MERGE_OVERWRITE
+from reading_statistics.sqlite import get_year_rollups, get_author_rollups, get_series_rollups, rebuild_rollups, migrate_database, verify_schema, load_library_from_json, insert_statistics, insert_book, insert_series, insert_author, update_statistics_finished, update_statistics_pages, update_statistics_speed, update_statistics_isbn, update_book_isbn, update_book_series, update_series_author, update_authors_series, update_book_fields, delete_series_id, delete_author_id, delete_statistics_isbn, delete_book_isbn, get_author_id, get_series_id, get_book_series_id
+
+
+def snapshot():
+    # Sums of floats kept up incrementally differ from fresh ones in the last digits
+    return [[rollup._replace(time=round(rollup.time, 6)) for rollup in rollups]
+            for rollups in (get_year_rollups(), get_author_rollups(), get_series_rollups())]
+
+
+def tables(connection):
+    # Rows of deleted series and authors are compared too, get_*_rollups leave them out
+    return [connection.exec_driver_sql(f"select * from {table} order by 1").all()
+            for table in ("rollup_years", "rollup_authors", "rollup_series")]
+
+
+def assert_rollups_match_rebuild(connection=None):
+    maintained = snapshot()
+    maintained_tables = tables(connection) if connection != None else None
+    rebuild_rollups()
+    assert maintained == snapshot()
+    if connection != None:
+        assert [[row[:5] + (round(row[5], 6),) + row[6:] for row in rows] for rows in maintained_tables] == [
+            [row[:5] + (round(row[5], 6),) + row[6:] for row in rows] for rows in tables(connection)]
+
+
+def test_rollups_after_load(test_db):
+    years = {rollup.key: rollup for rollup in get_year_rollups()}
+    assert years["2023"].finished == 2
+    assert years["20XX"].books == 1
+    assert sum(rollup.books for rollup in get_author_rollups()) == 3
+    assert_rollups_match_rebuild()
+
+
+def test_rollups_follow_changes(test_db):
+    author_id = insert_author("Mary Shelley")
+    insert_series(author_id, "Frankenstein")
+    insert_book(1234567890, get_book_series_id(9780553448122), 1, "Frankenstein")
+    insert_statistics(1234567890, 24, 280, "1818-01-01",
+                      "2024-01-05", 250, 7.5)
+    assert_rollups_match_rebuild()
+    update_statistics_finished(9780804139021, "2024-02-01")
+    update_statistics_pages(9780553448122, 400)
+    update_statistics_speed(9780593135204, None)
+    assert_rollups_match_rebuild()
+    update_book_series(1234567890, "Frankenstein", "Mary Shelley")
+    update_book_isbn(1234567890, 1234567891)
+    update_statistics_isbn(1234567890, 1234567891)
+    assert_rollups_match_rebuild()
+    update_series_author(get_book_series_id(9780553448122), author_id)
+    update_authors_series(author_id, get_author_id("Andy Weir"))
+    update_book_fields(9780593135204, time=1.5, finished=None)
+    assert_rollups_match_rebuild()
+    delete_statistics_isbn(9780553448122)
+    delete_book_isbn(1234567891)
+    assert_rollups_match_rebuild()
+    insert_statistics(9780553448122, 10, 100, None, "2025-01-01", 100, 1.0, MERGE_OVERWRITE)
+    load_library_from_json("./tests/test_library.json")
+    assert_rollups_match_rebuild()
+
+
+def test_rollups_deleted_series_and_authors(test_db):
+    delete_series_id(get_series_id("Silo", get_author_id("Hugh Howey")))
+    series_id = get_book_series_id(9780593135204)
+    delete_series_id(series_id)
+    assert_rollups_match_rebuild(test_db)
+    update_statistics_pages(9780593135204, 400)
+    assert_rollups_match_rebuild(test_db)
+    # The next series takes the deleted one's ID and with it the books still pointing at it
+    assert insert_series(get_author_id("Andy Weir"), "Other") == series_id
+    assert_rollups_match_rebuild(test_db)
+    author_id = get_author_id("Andy Weir")
+    delete_author_id(author_id)
+    assert_rollups_match_rebuild(test_db)
+    update_statistics_pages(9780553448122, 500)
+    update_series_author(get_book_series_id(9780553448122), insert_author("Someone else"))
+    assert_rollups_match_rebuild(test_db)
+
+
+def test_rollups_migration(test_db):
+    before = snapshot()
+    test_db.exec_driver_sql("drop trigger rollup_statistics_insert")
+    test_db.exec_driver_sql("drop table rollup_years")
+    test_db.exec_driver_sql(
+        "create trigger rollup_authors_delete after delete on authors begin delete from rollup_authors where author_id = old.author_id; end")
+    assert verify_schema() == ["Table rollup_years does not exist",
+                               "Rollup trigger rollup_statistics_insert does not exist"]
+    migrate_database()
+    assert verify_schema() == []
+    assert snapshot() == before
+    assert test_db.exec_driver_sql(
+        "select name from sqlite_master where name = 'rollup_authors_delete'").first() == None
+
+
+@pytest.mark.parametrize("table", [("rollup_years"), ("rollup_authors"), ("rollup_series")])
+def test_rollups_read_only_groups(test_db, table):
+    plan = " ".join(row[3] for row in test_db.exec_driver_sql(
+        f"explain query plan select * from {table}"))
+    assert plan.__contains__(table) and not plan.__contains__("statistics")
@@ -1,6 +1,6 @@
 import pytest
 from .test_fixtures import test_no_db, test_empty_db
-from reading_statistics.sqlite import insert_series, get_series_id, get_max_series_id, get_authors_number_of_series, get_series_author_id, get_series_name, update_authors_series, update_series_author, update_series_name, delete_series_id
+from reading_statistics.sqlite import get_cache_info, insert_series, get_series_id, get_max_series_id, get_authors_number_of_series, get_series_author_id, get_series_name, update_authors_series, update_series_author, update_series_name, delete_series_id, insert_book, get_book_series_id
 
 
 @pytest.mark.parametrize("author_id, name", [(1, "Test Series")])
@@ -75,3 +75,51 @@ def test_delete_series_name(test_empty_db, author_id, series_name):
     assert series_id != None
     delete_series_id(series_id)
     assert get_series_id(series_name, author_id) == None
+
+
+@pytest.mark.parametrize("author_id, names", [(1, ["First", "Second", "First", "", "Third"])])
+def test_insert_series_returns_id(test_empty_db, author_id, names):
+    ids = [insert_series(author_id, name) for name in names]
+    assert ids == [1, 2, 1, None, 3]
+    assert insert_series(None, "First") == None
+    assert insert_series(author_id + 1, "First") == 4
+
+
+def test_series_cache_invalidation(test_empty_db):
+    series_id = insert_series(1, "Test Series")
+    assert get_series_id("Test Series", 1) == series_id
+    update_series_name(series_id, "New Series")
+    assert get_series_id("Test Series", 1) == None
+    assert get_series_id("New Series", 1) == series_id
+    update_series_author(series_id, 2)
+    assert get_series_id("New Series", 1) == None
+    assert get_series_id("New Series", 2) == series_id
+    update_authors_series(2, 3)
+    assert get_series_id("New Series", 2) == None
+    assert get_series_id("New Series", 3) == series_id
+    delete_series_id(series_id)
+    assert get_series_id("New Series", 3) == None
+    assert get_cache_info()["series"].misses > 0
+
+
+def test_update_series_author_merges_duplicate(test_empty_db):
+    moved = insert_series(1, "Shared")
+    kept = insert_series(2, "Shared")
+    insert_book(1, moved, 1, "First")
+    insert_book(2, kept, 2, "Second")
+    assert update_series_author(moved, 2) == kept
+    assert get_book_series_id(1) == kept
+    assert get_series_name(moved) == None
+    assert get_series_id("Shared", 1) == None
+
+
+def test_update_authors_series_merges_duplicates(test_empty_db):
+    moved = insert_series(1, "Shared")
+    other = insert_series(1, "Own")
+    kept = insert_series(2, "Shared")
+    insert_book(1, moved, 1, "First")
+    update_authors_series(1, 2)
+    assert get_book_series_id(1) == kept
+    assert get_series_author_id(other) == 2
+    assert get_authors_number_of_series(1) == 0
+    assert get_authors_number_of_series(2) == 2
@@ -1,7 +1,11 @@
+import graphlib
+import json
 import pytest
-from .test_fixtures import test_no_db, test_empty_db
-from reading_statistics.constants import LIBRARY_LOCATION, VIEWS_LOCATION
-from reading_statistics.sqlite import load_library_from_json, check_tables, create_views, get_books_info
+from sqlalchemy import event
+from .test_fixtures import test_no_db, test_empty_db, test_db
+from reading_statistics.constants import LIBRARY_LOCATION, VIEWS_LOCATION, MERGE_OVERWRITE
+from reading_statistics.Book import Book
+from reading_statistics.sqlite import verify_schema, migrate_database, load_library_from_json, load_library_from_files, check_tables, create_views, ViewsSummary, load_view_definitions, order_views, get_books_info, iter_books_info, books_cursor, count_books_info, search_books, bulk_insert_books, get_author_id, get_series_id, get_max_author_id, get_max_series_id
 
 
 def test_load_library_from_json_errors(test_no_db, capfd):
@@ -21,6 +25,104 @@ def test_create_tables(test_empty_db):
                         "statistics"]).__len__() == 0
 
 
+def test_check_tables_cached(test_empty_db):
+    statements = []
+    event.listen(test_empty_db, "before_cursor_execute",
+                 lambda *args: statements.append(args[2]))
+    assert check_tables(["authors", "series", "books", "statistics"]) == []
+    assert all(s.startswith("PRAGMA table_xinfo") for s in statements)
+    statements.clear()
+    assert check_tables(["authors", "series", "books", "statistics"]) == []
+    assert statements.__len__() == 0
+
+
+def test_check_tables_missing_column(test_no_db):
+    test_no_db.exec_driver_sql("create table authors (author_id integer)")
+    assert check_tables(["authors", "series"]) == ["Table authors is missing columns: name",
+                                                   "Table series does not exist"]
+
+
+def test_verify_schema(test_db):
+    assert verify_schema() == []
+    test_db.exec_driver_sql("drop index ix_books_series_id")
+    test_db.exec_driver_sql("drop trigger books_fts_insert")
+    test_db.exec_driver_sql("update books set series_id = 100 where series_id = 1")
+    test_db.exec_driver_sql("PRAGMA foreign_keys = OFF")
+    errors = verify_schema()
+    assert errors.__len__() == 3
+    assert errors[0] == "Index ix_books_series_id does not exist"
+    assert errors[1].__contains__("books_fts_insert")
+    assert errors[2].__contains__("missing row of series")
+
+
+def test_migrate_database(test_no_db):
+    test_no_db.exec_driver_sql(
+        "create table authors (author_id INTEGER NOT NULL PRIMARY KEY, name VARCHAR NOT NULL UNIQUE)")
+    test_no_db.exec_driver_sql(
+        "create table series (series_id INTEGER NOT NULL PRIMARY KEY, name VARCHAR NOT NULL, author_id INTEGER NOT NULL)")
+    test_no_db.exec_driver_sql(
+        "create table books (isbn INTEGER NOT NULL PRIMARY KEY UNIQUE, series_id INTEGER, series_index FLOAT, title VARCHAR)")
+    test_no_db.exec_driver_sql(
+        "create table statistics (isbn INTEGER NOT NULL PRIMARY KEY UNIQUE, chapters INTEGER, pages INTEGER, released VARCHAR, finished VARCHAR, speed INTEGER, time FLOAT)")
+    load_library_from_json("./tests/test_library.json")
+    create_views(VIEWS_LOCATION)
+    before = get_books_info("", "", "", "")
+    test_no_db.exec_driver_sql(
+        "insert into series select 100, name, author_id from series where series_id = 1")
+    test_no_db.exec_driver_sql(
+        "update books set series_id = 100 where series_id = 1")
+    migrate_database()
+    migrate_database()
+    assert get_books_info("", "", "", "") == before
+    assert test_no_db.exec_driver_sql(
+        "PRAGMA foreign_key_list(series)").all().__len__() == 1
+    assert test_no_db.exec_driver_sql(
+        "PRAGMA foreign_key_list(books)").all().__len__() == 1
+    indexes = [row[1] for row in test_no_db.exec_driver_sql(
+        "select type, name from sqlite_master where type = 'index'")]
+    assert "ux_series_author_id_name" in indexes
+    assert "ix_books_series_id" in indexes
+    assert check_tables(["select * from 'All Info'"]).__len__() == 0
+    assert search_books("weir").__len__() == 3
+    assert verify_schema() == []
+
+
+def test_migrate_database_dates(test_no_db):
+    test_no_db.exec_driver_sql(
+        "create table statistics (isbn INTEGER NOT NULL PRIMARY KEY UNIQUE, chapters INTEGER, pages INTEGER, released VARCHAR, finished VARCHAR, speed INTEGER, time FLOAT)")
+    test_no_db.exec_driver_sql(
+        "insert into statistics (isbn, released, finished) values (1, '2011/09/27', '20XX'), (2, '14.11.2017', '2023-06-20T21:15:00')")
+    assert check_tables(["statistics"]) == []
+    assert verify_schema().__contains__(
+        "Table statistics is missing generated column released_day, run the migration")
+    migrate_database()
+    assert test_no_db.exec_driver_sql("select released, finished, released_day, finished_day from statistics order by isbn").all() == [
+        ("2011-09-27", "20XX", 15244, None), ("2017-11-14", "2023-06-20", 17484, 19528)]
+    assert verify_schema() == []
+
+
+def test_series_lookups_use_indexes(test_empty_db):
+    for query in ["select series_id from series where name = 'Name' and author_id = 1",
+                  "select count(*) from series where author_id = 1",
+                  "select count(*) from books where series_id = 1"]:
+        plan = test_empty_db.exec_driver_sql(
+            f"explain query plan {query}").all()
+        assert plan[0][3].__contains__("USING COVERING INDEX") or plan[0][3].__contains__("USING INDEX")
+
+
+def test_load_library_from_files(test_empty_db, tmp_path, capfd):
+    with open(LIBRARY_LOCATION, "r") as file:
+        books = json.load(file)["books"]
+    location = tmp_path / "books.jsonl"
+    location.write_text("".join(json.dumps(dict(b, isbn=b["isbn"] + 1 if b["isbn"] != None else None)) + "\n"
+                                for b in books) + '{"isbn": "x"}\n')
+    assert load_library_from_files([LIBRARY_LOCATION, str(location)], 1, shard_lines=2) == books.__len__() * 2
+    isbns = [b["isbn"] for b in books if b["isbn"] != None]
+    assert sorted(b.isbn for b in get_books_info("", "", "", "")) == sorted(
+        isbns + [isbn + 1 for isbn in isbns])
+    assert capfd.readouterr()[0].__contains__(f"Skipped {location}:{books.__len__() + 1}:")
+
+
 def test_load_library_from_json(test_empty_db):
     result = get_books_info("", "", "", "")
     before = result.__len__()
@@ -31,8 +133,140 @@ def test_load_library_from_json(test_empty_db):
     assert before < after
 
 
+def test_load_library_from_json_twice(test_empty_db, capfd):
+    load_library_from_json(LIBRARY_LOCATION)
+    before = get_books_info("", "", "", "").__len__()
+    load_library_from_json(LIBRARY_LOCATION)
+    after = get_books_info("", "", "", "").__len__()
+    assert before == after
+    out = capfd.readouterr()
+    assert out[0].__contains__("rows/s).")
+
+
+def test_load_library_from_json_updates(test_db):
+    test_db.exec_driver_sql(
+        "update books set title = 'Changed' where isbn = 9780593135204")
+    test_db.exec_driver_sql(
+        "update statistics set time = null where isbn = 9780593135204")
+    load_library_from_json("./tests/test_library.json")
+    book = [b for b in get_books_info("", "", "", "")
+            if b.isbn == 9780593135204][0]
+    assert book.title == "Project Hail Mary"
+    assert book.time != None
+
+
+@pytest.mark.parametrize("batch_size", [(1), (2), (100)])
+def test_bulk_insert_books(test_empty_db, batch_size):
+    books = [Book("Author A", "Series A", 1, "Title 1", 1, 10, 100, "2000-01-01", None, None, None),
+             Book("Author A", "Series A", 2, "Title 2", 2, 10, 100, "2001-01-01", None, None, None),
+             Book("Author A", "Series B", 3, "Title 3", 1, 10, 100, "2002-01-01", None, None, None),
+             Book("Author B", "Series A", 4, "Title 4", 1, 10, 100, "2003-01-01", None, None, None),
+             Book("Author B", "Series A", 4, "Duplicate", 1, 10, 100, "2003-01-01", None, None, None)]
+    assert bulk_insert_books(books, batch_size) == books.__len__()
+    assert get_max_author_id() == 2
+    assert get_max_series_id() == 3
+    assert get_series_id("Series A", get_author_id("Author B")) == 3
+    result = get_books_info("", "", "", "")
+    assert result.__len__() == 4
+    assert [b.title for b in result if b.isbn == 4] == ["Title 4"]
+    assert bulk_insert_books(books, batch_size, policy=MERGE_OVERWRITE) == books.__len__()
+    assert get_max_series_id() == 3
+    assert [b.title for b in get_books_info("", "", "", "") if b.isbn == 4] == ["Duplicate"]
+
+
+@pytest.mark.parametrize("page_size", [(1), (2), (3), (500)])
+def test_iter_books_info(test_empty_db, page_size):
+    load_library_from_json(LIBRARY_LOCATION)
+    expected = [(b.released, b.isbn) for b in get_books_info("", "", "", "")]
+    assert expected == sorted(expected, key=lambda x: (x[0] or "", x[1]))
+    books = list(iter_books_info("", "", "", "", page_size=page_size))
+    assert [(b.released, b.isbn) for b in books] == expected
+    resumed = list(iter_books_info("", "", "", "", page_size=page_size,
+                                   after=books_cursor(books[9])))
+    assert [(b.released, b.isbn) for b in resumed] == expected[10:]
+    assert count_books_info("", "", "", "") == expected.__len__()
+
+
+@pytest.mark.parametrize("isbn, author, series, title, count", [("", "Weir", "", "", 3), (978055, "", "", "", 1), ("", "", "", "Unknown", 0)])
+def test_count_books_info(test_db, isbn, author, series, title, count):
+    assert count_books_info(isbn, author, series, title) == count
+    assert list(iter_books_info(isbn, author, series, title, page_size=1)) == get_books_info(
+        isbn, author, series, title)
+
+
 @pytest.mark.parametrize("query", [("select * from 'Unread Series by Date'")])
 def test_create_views(test_empty_db, query):
     assert check_tables([query]).__len__() == 1
     create_views(VIEWS_LOCATION)
     assert check_tables([query]).__len__() == 0
+
+
+def write_views(path, views):
+    path.write_text(json.dumps({"views": [{"description": "", "view": view} for view in views]}))
+    return str(path)
+
+
+def schema_version(connection):
+    return connection.exec_driver_sql("PRAGMA schema_version").scalar()
+
+
+def test_create_views_unchanged(test_empty_db):
+    assert create_views(VIEWS_LOCATION) == ViewsSummary(6, 0, 0, 0)
+    version = schema_version(test_empty_db)
+    assert create_views(VIEWS_LOCATION) == ViewsSummary(0, 0, 0, 6)
+    assert schema_version(test_empty_db) == version
+    assert create_views(VIEWS_LOCATION, refresh=True) == ViewsSummary(0, 6, 0, 0)
+    assert check_tables(["select * from 'All Info'"]) == []
+
+
+def test_create_views_changes(test_empty_db, tmp_path):
+    location = write_views(tmp_path / "views.json", [
+        "create view if not exists 'Book list' as select isbn, title from books",
+        "create view Titles as select title from 'Book list'",
+        "create view [Old] as select 1"])
+    assert create_views(location) == ViewsSummary(3, 0, 0, 0)
+    test_empty_db.exec_driver_sql("drop view Titles")
+    location = write_views(tmp_path / "views.json", [
+        "create view Titles as select title from \"Book list\" order by title",
+        "create view 'Book list' as select isbn, title from books"])
+    assert create_views(location) == ViewsSummary(1, 0, 1, 1)
+    names = [name for (name,) in test_empty_db.exec_driver_sql(
+        "select name from view_hashes order by name")]
+    assert names == ["Book list", "Titles"]
+    assert check_tables(["select * from Titles", "select * from Old"]) == [
+        "select * from Old: no such table: Old"]
+
+
+def test_create_views_rolled_back(test_empty_db, tmp_path):
+    create_views(VIEWS_LOCATION)
+    location = write_views(tmp_path / "views.json", [
+        "create view 'All Info' as select isbn from books",
+        "create view Broken as select missing from books"])
+    with pytest.raises(Exception):
+        create_views(location)
+    assert check_tables(["select * from 'Unread Series by Date'", "select released from 'All Info'"]) == []
+
+
+def test_order_views(tmp_path):
+    location = write_views(tmp_path / "views.json", [
+        "create view c as select * from \"b\" join [a]",
+        "create view b as select * from a",
+        "create view a as select 1",
+        "create view d as select 1 as abc"])
+    views = load_view_definitions(location)
+    assert views[0].dependencies == {"a", "b"}
+    assert views[3].dependencies == set()
+    assert [view.name for view in order_views(views)] == ["a", "b", "c", "d"]
+
+
+def test_order_views_cycle(tmp_path):
+    location = write_views(tmp_path / "views.json", [
+        "create view a as select * from b",
+        "create view b as select * from a"])
+    with pytest.raises(graphlib.CycleError):
+        order_views(load_view_definitions(location))
+
+
+def test_load_view_definitions_errors(tmp_path):
+    with pytest.raises(ValueError):
+        load_view_definitions(write_views(tmp_path / "views.json", ["drop table books"]))
@@ -1,6 +1,7 @@
+import datetime
 import pytest
-from .test_fixtures import test_no_db, test_empty_db
-from reading_statistics.sqlite import insert_statistics, get_statistics_isbn, get_statistics_chapters, get_statistics_pages, get_statistics_released, get_statistics_finished, get_statistics_speed, get_statistics_time, update_statistics_isbn, update_statistics_chapters, update_statistics_pages, update_statistics_released, update_statistics_finished, update_statistics_speed, update_statistics_time, delete_statistics_isbn
+from .test_fixtures import test_no_db, test_empty_db, test_db
+from reading_statistics.sqlite import insert_statistics, get_statistics_isbn, get_statistics_chapters, get_statistics_pages, get_statistics_released, get_statistics_finished, get_statistics_speed, get_statistics_time, update_statistics_isbn, update_statistics_chapters, update_statistics_pages, update_statistics_released, update_statistics_finished, update_statistics_speed, update_statistics_time, delete_statistics_isbn, books_finished_between, books_released_between, update_book_fields
 
 
 @pytest.mark.parametrize("isbn", [(123456789)])
@@ -122,3 +123,26 @@ def test_delete_statistics_isbn(test_empty_db, isbn):
     assert get_statistics_isbn(isbn) != None
     delete_statistics_isbn(isbn)
     assert get_statistics_isbn(isbn) == None
+
+
+def test_statistics_dates_normalized(test_empty_db):
+    insert_statistics(1, released="27.09.2011", finished="20XX")
+    assert (get_statistics_released(1), get_statistics_finished(1)) == ("2011-09-27", "20XX")
+    update_statistics_finished(1, "2023/06/20")
+    assert get_statistics_finished(1) == "2023-06-20"
+    update_book_fields(1, released="2011-09-28T10:00:00")
+    assert get_statistics_released(1) == "2011-09-28"
+
+
+def test_books_finished_between(test_db):
+    assert [b.isbn for b in books_finished_between("2023-01-01", "2023-12-31")] == [9780553448122, 9780593135204]
+    assert [b.title for b in books_finished_between("2023-06-20", "2023-06-20")] == ["Artemis"]
+    assert books_finished_between("2024-01-01", "2024-12-31") == []
+    assert [b.isbn for b in books_released_between(datetime.date(2011, 1, 1), "2017-11-14")] == [9780804139021, 9780553448122]
+
+
+@pytest.mark.parametrize("column", [("finished_day"), ("released_day")])
+def test_date_ranges_use_indexes(test_empty_db, column):
+    plan = test_empty_db.exec_driver_sql(
+        f"explain query plan select isbn from statistics where {column} between 19358 and 19722").all()
+    assert plan[0][3].__contains__(f"USING INDEX ix_statistics_{column}")
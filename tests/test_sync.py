@@ -0,0 +1,52 @@
+import json
+import pytest
+from .test_fixtures import test_no_db, test_empty_db, test_db
+from reading_statistics.batch import main
+from reading_statistics.sqlite import sync_library_from_json, get_book, get_books_info
+
+LIBRARY = "./tests/test_library.json"
+
+
+def write_library(path, books):
+    with open(path, "w") as file:
+        json.dump({"books": books}, file)
+    return str(path)
+
+
+def test_sync_library_from_json(test_empty_db, tmp_path, capfd):
+    with open(LIBRARY, "r") as file:
+        books = json.load(file)["books"]
+    assert sync_library_from_json(LIBRARY) == (3, 0, 0, 0)
+    assert sync_library_from_json(LIBRARY) == (0, 0, 0, 3)
+    books[0]["title"] = "Changed"
+    removed = books.pop(1)
+    books.append(dict(removed, isbn=1234567890))
+    changed = write_library(tmp_path / "library.json", books)
+    assert sync_library_from_json(changed) == (1, 1, 1, 1)
+    assert get_book(books[0]["isbn"]).title == "Changed"
+    assert get_book(removed["isbn"]) == None
+    assert get_book(1234567890).title == removed["title"]
+    out = capfd.readouterr()
+    assert out[0].__contains__(
+        "Synced 1 added, 1 updated, 1 deleted and 1 unchanged books in ")
+
+
+def test_sync_library_from_json_loaded(test_db, tmp_path):
+    # Books loaded without a hash are rewritten once, only synced ones are ever deleted
+    assert sync_library_from_json(LIBRARY) == (0, 3, 0, 0)
+    assert sync_library_from_json(LIBRARY) == (0, 0, 0, 3)
+    empty = write_library(tmp_path / "library.json", [])
+    assert sync_library_from_json(empty) == (0, 0, 3, 0)
+    assert get_books_info("", "", "", "") == []
+
+
+def test_sync_library_from_json_errors(test_no_db, capfd):
+    assert sync_library_from_json(LIBRARY) == None
+    out = capfd.readouterr()
+    assert out[0].startswith("\nAt least one table is corrupted.")
+
+
+def test_sync_command(test_empty_db, capfd):
+    assert main(["sync", LIBRARY]) == 0
+    out = capfd.readouterr()
+    assert out[0].__contains__("Synced 3 added")